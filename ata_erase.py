@@ -0,0 +1,159 @@
+# ata_erase.py
+import re
+import time
+import asyncio
+
+# Security password used for the duration of the erase. The erase itself
+# clears it again, so it never outlives the job.
+DEFAULT_PASSWORD = "p"
+DEFAULT_TICK_SECONDS = 1.0
+# Progress is estimated from elapsed time, so it is held below 100% until
+# the drive actually reports completion.
+MAX_ESTIMATED_PERCENT = 99
+
+
+class AtaEraseError(Exception):
+    """The drive cannot be erased or hdparm reported a failure."""
+
+
+def parse_security(identify_text):
+    """
+    Extracts the Security section of `hdparm -I` output:
+    support/state flags and the advertised erase times in minutes.
+    """
+    match = re.search(r"^Security:\s*$(.*?)(?=^\S|\Z)", identify_text, re.M | re.S)
+    section = match.group(1) if match else ""
+
+    def flag(name):
+        m = re.search(rf"^\s*(not\s+)?{name}\b", section, re.M)
+        return bool(m) and not m.group(1)
+
+    def minutes(label):
+        m = re.search(rf"(>?)(\d+)min for {label}", section)
+        return int(m.group(2)) if m else None
+
+    return {
+        "supported": flag("supported"),
+        "enabled": flag("enabled"),
+        "locked": flag("locked"),
+        "frozen": flag("frozen"),
+        "enhancedSupported": bool(re.search(r"^\s*supported: enhanced erase", section, re.M)),
+        "eraseMinutes": minutes("SECURITY ERASE UNIT"),
+        "enhancedEraseMinutes": minutes("ENHANCED SECURITY ERASE UNIT"),
+    }
+
+
+class CommandRunner:
+    """Starts external commands. Injectable so the job can run against a fake hdparm."""
+
+    async def start(self, *args):
+        """Starts `args` and returns an asyncio-style process (wait(), communicate(), returncode)."""
+        return await asyncio.create_subprocess_exec(
+            *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+
+    async def run(self, *args):
+        """Runs `args` to completion. Returns (returncode, stdout, stderr) as text."""
+        proc = await self.start(*args)
+        out, err = await proc.communicate()
+        return proc.returncode, (out or b"").decode(errors="replace"), (err or b"").decode(errors="replace")
+
+
+class AtaEraseJob:
+    """
+    ATA Security Erase (NIST 800-88 Purge) as an asyncio job.
+
+    Reads the drive's advertised erase time from IDENTIFY up front, prefers
+    the enhanced erase when supported, and reports time-based progress and
+    an ETA while hdparm waits on the drive. Several jobs can be gathered on
+    one event loop.
+    """
+
+    def __init__(self, drive_path, runner=None, progress=None, password=DEFAULT_PASSWORD,
+                 enhanced=None, tick_seconds=DEFAULT_TICK_SECONDS):
+        self.drive_path = drive_path
+        self.runner = runner or CommandRunner()
+        self.progress = progress or (lambda message, value: None)
+        self.password = password
+        self.enhanced = enhanced
+        self.tick_seconds = tick_seconds
+
+    async def _hdparm(self, *args):
+        code, out, err = await self.runner.run("hdparm", *args, self.drive_path)
+        if code != 0:
+            raise AtaEraseError(f"hdparm {' '.join(args)} failed.\n\nSTDERR:\n{err or 'No error details'}")
+        return out
+
+    async def identify(self):
+        return parse_security(await self._hdparm("-I"))
+
+    async def run(self, cancel_event=None):
+        """Runs the erase and returns a details dict for the certificate."""
+        self.progress("Reading drive security capabilities...", 0)
+        security = await self.identify()
+        if not security["supported"]:
+            raise AtaEraseError("Drive does not support the ATA Security feature set.")
+        if security["frozen"]:
+            raise AtaEraseError("Drive security is frozen. Suspend and resume the machine (or hot-plug "
+                                "the drive) to unfreeze it, then try again.")
+        if security["locked"]:
+            raise AtaEraseError("Drive is locked with an unknown password.")
+
+        enhanced = security["enhancedSupported"] if self.enhanced is None else self.enhanced
+        estimate_min = security["enhancedEraseMinutes"] if enhanced else security["eraseMinutes"]
+        estimate = estimate_min * 60 if estimate_min else None
+        name = "ENHANCED SECURITY ERASE" if enhanced else "SECURITY ERASE"
+
+        if cancel_event is not None and cancel_event.is_set():
+            raise AtaEraseError("Cancelled before the erase was issued.")
+        self.progress("Setting security password...", 0)
+        await self._hdparm("--user-master", "u", "--security-set-pass", self.password)
+
+        if cancel_event is not None and cancel_event.is_set():
+            await self._hdparm("--user-master", "u", "--security-disable", self.password)
+            raise AtaEraseError("Cancelled before the erase was issued; security password removed again.")
+
+        erase_flag = "--security-erase-enhanced" if enhanced else "--security-erase"
+        self.progress(f"Issuing {name} UNIT...", 0)
+        proc = await self.runner.start("hdparm", "--user-master", "u", erase_flag, self.password, self.drive_path)
+        communicate = asyncio.ensure_future(proc.communicate())
+        start = time.monotonic()
+        while True:
+            done, _ = await asyncio.wait([communicate], timeout=self.tick_seconds)
+            if done:
+                break
+            self.progress(*self._progress_message(name, time.monotonic() - start, estimate, cancel_event))
+        _, err = communicate.result()
+        elapsed = time.monotonic() - start
+        if proc.returncode != 0:
+            err = (err or b"").decode(errors="replace")
+            raise AtaEraseError(f"{name} failed. Drive may not support it or is frozen.\n\n"
+                                f"STDERR:\n{err or 'No error details'}")
+
+        self.progress(f"{name} complete.", 100)
+        return {
+            "purgeMethod": "ata-enhanced-security-erase" if enhanced else "ata-security-erase",
+            "advertisedMinutes": estimate_min,
+            "seconds": round(elapsed, 1),
+        }
+
+    @staticmethod
+    def _progress_message(name, elapsed, estimate, cancel_event):
+        if cancel_event is not None and cancel_event.is_set():
+            note = " - cannot be interrupted once issued"
+        else:
+            note = ""
+        if not estimate:
+            return f"{name}: {int(elapsed // 60)}m elapsed (drive gives no estimate){note}", 0
+        pct = min(MAX_ESTIMATED_PERCENT, int(elapsed / estimate * 100))
+        remaining = max(0, estimate - elapsed)
+        return f"{name}: ~{pct}%, about {int(remaining // 60)}m {int(remaining % 60)}s left{note}", pct
+
+
+async def erase_many(jobs, cancel_event=None):
+    """Runs several AtaEraseJobs concurrently; returns their results or exceptions in order."""
+    return await asyncio.gather(*(job.run(cancel_event) for job in jobs), return_exceptions=True)
+
+
+def secure_erase(drive_path, progress=None, cancel_event=None, runner=None):
+    """Synchronous entry point for wiping_core. Returns the details dict; raises AtaEraseError."""
+    return asyncio.run(AtaEraseJob(drive_path, runner=runner, progress=progress).run(cancel_event))
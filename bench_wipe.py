@@ -0,0 +1,273 @@
+# bench_wipe.py
+"""
+Benchmarks the overwrite engine without a real drive.
+
+Runs wiping_core.wipe_drive against sparse files, tmpfs (/dev/shm) files
+and, when running as root, loop devices, sweeping chunk size, data source,
+buffered/direct I/O, producers and queue depth. Every configuration runs in
+its own child process so CPU time, peak RSS and syscall counts are its own.
+
+    python3 bench_wipe.py run --size 512M --output results.json
+    python3 bench_wipe.py run --baseline baseline.json      # run and compare
+    python3 bench_wipe.py compare baseline.json results.json --threshold 10
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import datetime
+import itertools
+import resource
+import subprocess
+import tempfile
+
+TARGETS = ("sparse", "tmpfs", "loop")
+DEFAULT_THRESHOLD = 10.0  # percent drop in MB/s counted as a regression
+MB = 1000 * 1000
+
+
+def parse_size(text):
+    """'512M', '4K', '1G' or a plain byte count."""
+    text = text.strip().upper()
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def _proc_io():
+    """Syscall and byte counters from /proc/self/io (None where unavailable)."""
+    try:
+        with open("/proc/self/io") as f:
+            return {key: int(value) for key, value in (line.split(": ") for line in f.read().splitlines())}
+    except (OSError, ValueError):
+        return None
+
+
+def run_one(config):
+    """Runs one configuration in this process and returns its measurements."""
+    import wiping_core
+
+    before_usage = resource.getrusage(resource.RUSAGE_SELF)
+    before_io = _proc_io()
+    start = time.monotonic()
+    result = wiping_core.wipe_drive(
+        config["path"], "overwrite", None,
+        data_source=config["dataSource"],
+        direct_io=config["io"] == "direct",
+        producers=config["producers"],
+        queue_depth=config["queueDepth"],
+        chunk_size=config["chunkSize"],
+        verify=None,
+        checkpoint_interval=None,
+    )
+    seconds = time.monotonic() - start
+    after_usage = resource.getrusage(resource.RUSAGE_SELF)
+    after_io = _proc_io()
+
+    cpu = (after_usage.ru_utime - before_usage.ru_utime) + (after_usage.ru_stime - before_usage.ru_stime)
+    measurement = {
+        "ok": bool(result[0]),
+        "message": result[1],
+        "seconds": round(seconds, 3),
+        "MBps": round(config["size"] / seconds / MB, 1) if result[0] and seconds > 0 else 0.0,
+        "cpuPercent": round(100.0 * cpu / seconds, 1) if seconds > 0 else 0.0,
+        "peakRssKB": after_usage.ru_maxrss,
+    }
+    if before_io and after_io:
+        measurement["writeSyscalls"] = after_io["syscw"] - before_io["syscw"]
+        measurement["readSyscalls"] = after_io["syscr"] - before_io["syscr"]
+    if len(result) > 2:
+        io = result[2].get("io", {})
+        measurement["ioMode"] = io.get("mode")
+        passes = result[2].get("passes") or [{}]
+        measurement["generatorSeconds"] = passes[0].get("generatorSeconds")
+        measurement["writeLatency"] = passes[0].get("telemetry", {}).get("writeLatency")
+    return measurement
+
+
+class Target:
+    """A wipe target of `size` bytes: created on enter, removed on exit."""
+
+    def __init__(self, kind, size, directory):
+        self.kind = kind
+        self.size = size
+        self.directory = directory
+        self.path = None
+        self._backing = None
+
+    def available(self):
+        if self.kind == "tmpfs":
+            return os.path.isdir("/dev/shm")
+        if self.kind == "loop":
+            return os.geteuid() == 0 and shutil.which("losetup") is not None
+        return True
+
+    def __enter__(self):
+        directory = "/dev/shm" if self.kind == "tmpfs" else self.directory
+        fd, backing = tempfile.mkstemp(prefix="bench-wipe-", suffix=".img", dir=directory)
+        os.ftruncate(fd, self.size)  # sparse until the wipe writes it
+        os.close(fd)
+        self._backing = backing
+        self.path = backing
+        if self.kind == "loop":
+            self.path = subprocess.run(["losetup", "-f", "--show", backing], check=True,
+                                       capture_output=True, text=True).stdout.strip()
+        return self
+
+    def __exit__(self, *exc):
+        if self.kind == "loop" and self.path:
+            subprocess.run(["losetup", "-d", self.path], stderr=subprocess.DEVNULL)
+        if self._backing:
+            os.remove(self._backing)
+
+
+def sweep(args):
+    """Yields every configuration in the cross product of the sweep options."""
+    for target, chunk, source, io, producers, queue_depth in itertools.product(
+            args.targets, args.chunk_sizes, args.sources, args.io, args.producers, args.queue_depths):
+        yield {"target": target, "chunkSize": chunk, "dataSource": source, "io": io,
+               "producers": producers, "queueDepth": queue_depth, "size": args.size}
+
+
+def config_key(config):
+    return "/".join(str(config[k]) for k in ("target", "chunkSize", "dataSource", "io", "producers", "queueDepth"))
+
+
+def run_sweep(args):
+    results = []
+    for config in sweep(args):
+        target = Target(config["target"], config["size"], args.dir)
+        if not target.available():
+            print(f"skip  {config_key(config)} (target not available)", file=sys.stderr)
+            continue
+        runs = []
+        for _ in range(args.repeat):
+            with target:
+                child = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "_child", json.dumps(dict(config, path=target.path))],
+                    capture_output=True, text=True)
+            try:
+                if child.returncode != 0:
+                    raise ValueError
+                runs.append(json.loads(child.stdout.strip().splitlines()[-1]))
+            except (ValueError, IndexError):
+                # A failed run still has the fields the summary and compare() read
+                runs.append({"ok": False, "MBps": 0.0,
+                             "message": child.stderr.strip()[-500:] or f"exit status {child.returncode}"})
+        # The best run is reported: it is the one least disturbed by the rest of the machine.
+        best = max(runs, key=lambda r: r.get("MBps", 0))
+        entry = dict(config, key=config_key(config), runs=len(runs), **best)
+        results.append(entry)
+        print(f"{entry['MBps']:>9.1f} MB/s  cpu {entry.get('cpuPercent', 0):>5.1f}%  "
+              f"rss {entry.get('peakRssKB', 0) // 1024:>5} MB  {entry['key']}"
+              + ("" if entry["ok"] else f"  FAILED: {entry['message']}"), file=sys.stderr)
+    return {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "host": platform.node(),
+            "kernel": platform.release(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "size": args.size,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Matches configurations by key and returns one row per configuration in
+    both files, with `regression` set where MB/s dropped by more than
+    `threshold` percent or a run that used to succeed now fails.
+    """
+    old = {r["key"]: r for r in baseline["results"]}
+    rows = []
+    for new in current["results"]:
+        before = old.get(new["key"])
+        if before is None:
+            continue
+        change = (100.0 * (new["MBps"] - before["MBps"]) / before["MBps"]) if before["MBps"] else 0.0
+        rows.append({
+            "key": new["key"],
+            "baselineMBps": before["MBps"],
+            "MBps": new["MBps"],
+            "changePercent": round(change, 1),
+            "regression": (before["ok"] and not new["ok"]) or change < -threshold,
+        })
+    return rows
+
+
+def print_comparison(rows, threshold):
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else ""
+        print(f"{row['baselineMBps']:>9.1f} -> {row['MBps']:>9.1f} MB/s  {row['changePercent']:>+7.1f}%  "
+              f"{row['key']}  {flag}")
+    regressions = sum(1 for row in rows if row["regression"])
+    print(f"{len(rows)} configurations compared, {regressions} regressed by more than {threshold}%.")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the wipe engine against file-backed targets.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run a benchmark sweep")
+    run.add_argument("--size", type=parse_size, default=parse_size("256M"), help="target size (default 256M)")
+    run.add_argument("--targets", type=lambda s: s.split(","), default=["sparse", "tmpfs"],
+                     help=f"comma-separated, from {', '.join(TARGETS)} (loop needs root)")
+    run.add_argument("--chunk-sizes", type=lambda s: [parse_size(x) for x in s.split(",")],
+                     default=[parse_size("1M"), parse_size("4M")])
+    run.add_argument("--sources", type=lambda s: s.split(","), default=["zero", "aes-256-ctr"])
+    run.add_argument("--io", type=lambda s: s.split(","), default=["buffered", "direct"])
+    run.add_argument("--producers", type=lambda s: [int(x) for x in s.split(",")], default=[1])
+    run.add_argument("--queue-depths", type=lambda s: [int(x) for x in s.split(",")], default=[1, 4])
+    run.add_argument("--repeat", type=int, default=1, help="runs per configuration; the best is kept")
+    run.add_argument("--dir", default=tempfile.gettempdir(), help="directory for sparse/loop backing files")
+    run.add_argument("--output", help="write the results as JSON")
+    run.add_argument("--baseline", help="compare against a saved results file")
+    run.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+    cmp_parser = commands.add_parser("compare", help="compare two results files")
+    cmp_parser.add_argument("baseline")
+    cmp_parser.add_argument("current")
+    cmp_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+    child = commands.add_parser("_child")  # internal: one configuration in a fresh process
+    child.add_argument("config")
+
+    args = parser.parse_args(argv)
+    if args.command == "_child":
+        print(json.dumps(run_one(json.loads(args.config))))
+        return 0
+
+    if args.command == "compare":
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        return 1 if print_comparison(compare(baseline, current, args.threshold), args.threshold) else 0
+
+    unknown = set(args.targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown target(s): {', '.join(sorted(unknown))}")
+    report = run_sweep(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        return 1 if print_comparison(compare(baseline, report, args.threshold), args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+# block_io.py
+import os
+import errno
+import mmap
+import stat
+import fcntl
+import struct
+
+# From <linux/fs.h>
+BLKSSZGET = 0x1268   # logical sector size (int)
+BLKPBSZGET = 0x127B  # physical sector size (unsigned int)
+
+DEFAULT_LOGICAL_BLOCK = 512
+# O_DIRECT wants buffers aligned to the logical block size; a page covers
+# every block size seen in practice and is what mmap hands out anyway.
+PAGE_SIZE = mmap.PAGESIZE
+
+
+def get_block_sizes(fd):
+    """Returns (logical, physical) block sizes for an open device or file."""
+    st = os.fstat(fd)
+    if stat.S_ISBLK(st.st_mode):
+        try:
+            logical = struct.unpack("i", fcntl.ioctl(fd, BLKSSZGET, b"\0" * 4))[0]
+            physical = struct.unpack("I", fcntl.ioctl(fd, BLKPBSZGET, b"\0" * 4))[0]
+            return logical, max(logical, physical)
+        except OSError:
+            pass
+    # Regular files (images, tests): the filesystem block size is the best hint.
+    return DEFAULT_LOGICAL_BLOCK, max(DEFAULT_LOGICAL_BLOCK, st.st_blksize or DEFAULT_LOGICAL_BLOCK)
+
+
+def align_up(value, alignment):
+    return -(-value // alignment) * alignment
+
+
+def align_down(value, alignment):
+    return value - value % alignment
+
+
+class AlignedBuffer:
+    """A page-aligned, anonymous mmap buffer usable for O_DIRECT writes."""
+
+    def __init__(self, size, alignment=PAGE_SIZE):
+        self.size = size
+        self._map = mmap.mmap(-1, align_up(max(size, 1), max(alignment, PAGE_SIZE)))
+        self.view = memoryview(self._map)[:size]
+
+    def close(self):
+        self.view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            pass  # a slice of the view is still alive; the map goes when it does
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_for_write(path, direct=False):
+    """
+    Opens `path` for positioned writes. Returns (fd, direct_used).
+
+    Filesystems without O_DIRECT support (tmpfs, some FUSE mounts) reject the
+    flag with EINVAL; those fall back to a buffered descriptor.
+    """
+    flags = os.O_WRONLY
+    if direct and hasattr(os, "O_DIRECT"):
+        try:
+            return os.open(path, flags | os.O_DIRECT), True
+        except OSError as e:
+            if e.errno != errno.EINVAL:
+                raise
+    return os.open(path, flags), False
+
+
+def write_fully(fd, view, offset):
+    """pwrite()s all of `view` at `offset`, retrying short writes. Returns bytes written."""
+    written = 0
+    while written < len(view):
+        n = os.pwrite(fd, view[written:], offset + written)
+        if n == 0:
+            raise OSError(errno.ENOSPC, "No space left on device", None)
+        written += n
+    return written
+
+
+def write_unaligned_tail(path, view, offset):
+    """
+    Writes a tail that is not a multiple of the logical block size through a
+    separate buffered descriptor, since O_DIRECT cannot express it.
+    """
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        write_fully(fd, view, offset)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    return len(view)
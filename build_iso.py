@@ -1,18 +1,62 @@
 import pycdlib
 import os
 import sys
+import hashlib
 
-def create_bootable_iso():
+import build_pipeline
+
+def _source_entries(source_dir):
+    """The (local path, ISO path, Rock Ridge name, is_dir) entries to add, hidden files and directories excluded."""
+    entries = []
+    for root, dirs, files in os.walk(source_dir):
+        # NEW: In-place modification to exclude hidden directories from the walk
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+
+        rel_path = os.path.relpath(root, source_dir)
+        iso_path = '/' + rel_path.replace('\\', '/')
+        if iso_path == '/.':
+            iso_path = '/'
+
+        for d in dirs:
+            entries.append((os.path.join(root, d), os.path.join(iso_path, d).upper(), d, True))
+
+        # NEW: Explicitly skip any hidden files
+        for f in sorted(f for f in files if not f.startswith('.')):
+            entries.append((os.path.join(root, f), os.path.join(iso_path, f).upper(), f, False))
+    return entries
+
+def _entries_digest(entries, cache):
+    """Hash of the layout and file contents, to tell whether the ISO is already up to date."""
+    files = [local for local, _, _, is_dir in entries if not is_dir]
+    contents = dict(zip(files, cache.digests(files, "sha256")))
+    digest = hashlib.sha256()
+    for local, iso_path, rr_name, is_dir in entries:
+        digest.update(f"{iso_path}\0{rr_name}\0{'' if is_dir else contents[local]}\n".encode())
+    return digest.hexdigest()
+
+def create_bootable_iso(verbose=False, force=False):
     """
     Assembles the files from the 'iso_root' directory into a bootable ISO.
+    Does nothing if the ISO was already built from the same files, unless `force`.
     """
     iso_output_file = 'secure_wiper.iso'
+    stamp_file = iso_output_file + '.digest'
     source_dir = 'iso_root'
 
     if not os.path.isdir(source_dir):
         print(f"Error: Source directory '{source_dir}' not found.", file=sys.stderr)
         sys.exit(1)
 
+    entries = _source_entries(source_dir)
+    cache = build_pipeline.ChecksumCache(os.path.join(build_pipeline.StageCache().directory, "checksums.json"))
+    digest = _entries_digest(entries, cache)
+    cache.save()
+    if not force and os.path.exists(iso_output_file) and os.path.exists(stamp_file):
+        with open(stamp_file) as f:
+            if f.read().strip() == digest:
+                print(f"'{iso_output_file}' is up to date with '{source_dir}'.")
+                return
+
     iso = pycdlib.PyCdlib()
 
     iso.new(
@@ -24,29 +68,16 @@ def create_bootable_iso():
 
     print(f"Adding files from '{source_dir}' to the ISO...")
 
-    for root, dirs, files in os.walk(source_dir):
-        # NEW: In-place modification to exclude hidden directories from the walk
-        dirs[:] = [d for d in dirs if not d.startswith('.')]
-        
-        rel_path = os.path.relpath(root, source_dir)
-        iso_path = '/' + rel_path.replace('\\', '/')
-        if iso_path == '/.':
-            iso_path = '/'
-
-        for d in dirs:
-            iso_compliant_path = os.path.join(iso_path, d).upper()
-            iso.add_directory(iso_compliant_path, rr_name=d)
-        
-        for f in files:
-            # NEW: Explicitly skip any hidden files
-            if f.startswith('.'):
-                print(f"  - Skipping hidden file: {os.path.join(root, f)}")
-                continue
-
-            local_file_path = os.path.join(root, f)
-            iso_compliant_path = os.path.join(iso_path, f).upper()
-            iso.add_file(local_file_path, iso_compliant_path, rr_name=f)
-            print(f"  - Added {local_file_path}")
+    # os.walk lists a directory before its contents, so parents are always added first
+    for local_path, iso_compliant_path, rr_name, is_dir in entries:
+        if is_dir:
+            iso.add_directory(iso_compliant_path, rr_name=rr_name)
+        else:
+            iso.add_file(local_path, iso_compliant_path, rr_name=rr_name)
+            if verbose:
+                print(f"  - Added {local_path}")
+    file_count = sum(1 for entry in entries if not entry[3])
+    print(f"  - Added {file_count} files in {len(entries) - file_count} directories")
 
     # Add the El Torito boot information
     print("Making the ISO bootable...")
@@ -66,7 +97,10 @@ def create_bootable_iso():
     iso.write(iso_output_file)
 
     iso.close()
+    with open(stamp_file, 'w') as f:
+        f.write(digest + '\n')
     print("\nSuccess! Bootable ISO created at:", iso_output_file)
 
 if __name__ == "__main__":
-    create_bootable_iso()
\ No newline at end of file
+    create_bootable_iso(verbose='-v' in sys.argv[1:] or '--verbose' in sys.argv[1:],
+                        force='--force' in sys.argv[1:])
\ No newline at end of file
@@ -0,0 +1,467 @@
+# build_pipeline.py
+"""
+Incremental build of the live ISO. Every stage is cached under
+build-cache/<stage>/<key>/, where the key is a hash of the stage's inputs,
+and only stages whose inputs changed are rebuilt:
+
+    base      the Debian ISO tree and its unpacked root filesystem   <- ISO contents
+    system    the root filesystem after the chroot setup (apt, login) <- base, setup script
+    squashfs  filesystem.squashfs with the wiper app installed        <- system, app files, profile
+    iso       the hybrid ISO, with md5sum.txt                         <- base, squashfs
+
+Changing only the app rebuilds squashfs and iso; the unpacking and the apt
+install are reused. md5sum.txt is computed across a process pool, and
+per-file digests are cached by inode, size and mtime, so unchanged (and
+hard-linked) files are never read twice. The dev profile compresses with
+zstd instead of xz. Stage timings are printed and appended to a JSON-lines
+history.
+
+    sudo python3 build_pipeline.py --iso debian-live.iso --app dist/wiper_app --profile dev
+    python3 build_pipeline.py checksum some/tree     # md5sum.txt for any tree, no root needed
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import datetime
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+CACHE_DIR_ENV = "BUILD_CACHE_DIR"
+DEFAULT_CACHE_DIR = "build-cache"
+PIPELINE_VERSION = 1  # bump to invalidate every cached stage
+CHECKSUM_FILE = "md5sum.txt"
+HASH_CHUNK = 1024 * 1024
+ISOHYBRID_MBR = "/usr/lib/ISOLINUX/isohdpfx.bin"
+# mksquashfs options per build profile: xz for releases, zstd for fast dev iterations
+COMPRESSION_PROFILES = {
+    "release": ["-comp", "xz", "-b", "1M"],
+    "dev": ["-comp", "zstd", "-Xcompression-level", "3", "-b", "1M"],
+}
+# Cached builds kept per stage; older ones are removed after a successful build
+KEEP_PER_STAGE = 2
+
+# Run inside the chroot of the system stage. Its text is part of that
+# stage's cache key, so editing it rebuilds the root filesystem.
+SETUP_SCRIPT = """#!/bin/bash
+set -e
+export DEBIAN_FRONTEND=noninteractive
+
+# FIX #3: Disable the original CD-ROM repository to prevent 'file:/' errors
+echo "--- Disabling local CD-ROM repository ---"
+# This file is generated by live-build and points to the CD-ROM
+[ -f /etc/apt/sources.list.d/live.sources ] && rm /etc/apt/sources.list.d/live.sources
+
+echo "--- Configuring APT sources for '{distro}' ---"
+cat > /etc/apt/sources.list <<EOF
+deb http://deb.debian.org/debian/ {distro} main contrib non-free non-free-firmware
+deb http://deb.debian.org/debian/ {distro}-updates main contrib non-free non-free-firmware
+deb http://security.debian.org/debian-security/ {distro}-security main contrib non-free non-free-firmware
+EOF
+
+echo "--- Installing minimal GUI and tools ---"
+apt-get update
+apt-get install -y --no-install-recommends \\
+  xserver-xorg \\
+  xinit \\
+  openbox \\
+  python3-tk \\
+  hdparm \\
+  util-linux
+
+echo "--- Configuring automatic login and GUI startup ---"
+mkdir -p /etc/systemd/system/getty@tty1.service.d
+cat > /etc/systemd/system/getty@tty1.service.d/autologin.conf <<AUTOLOGIN
+[Service]
+ExecStart=
+ExecStart=-/sbin/agetty --autologin user --noclear %I $TERM
+AUTOLOGIN
+
+cat >> /home/user/.profile <<PROFILE
+if [ -z "$DISPLAY" ] && [ "$(tty)" = "/dev/tty1" ]; then
+  startx
+fi
+PROFILE
+
+cat > /home/user/.xinitrc <<XINITRC
+#!/bin/sh
+openbox &
+exec /usr/local/bin/{binary}
+XINITRC
+chmod +x /home/user/.xinitrc
+chown user:user /home/user/.xinitrc /home/user/.profile
+
+echo "--- Cleaning up ---"
+apt-get clean
+rm -f /etc/resolv.conf
+"""
+
+
+def _run(cmd, privileged=False):
+    """Runs a build command; privileged ones go through sudo unless we already are root."""
+    if privileged and os.geteuid() != 0:
+        cmd = ["sudo"] + cmd
+    subprocess.run(cmd, check=True)
+
+
+def _remove(path):
+    if not os.path.lexists(path):
+        return
+    try:
+        shutil.rmtree(path)
+    except PermissionError:
+        _run(["rm", "-rf", path], privileged=True)
+
+
+def _write_atomically(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+# ----------------------------------------------------------------------
+# Checksums (no root needed)
+# ----------------------------------------------------------------------
+
+def _hash_file(job):
+    path, algorithm = job
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ChecksumCache:
+    """
+    Per-file digests keyed by device, inode, size and mtime: a file that has
+    not changed, or is a hard link to one already hashed, is not read again.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self._entries = json.load(f)
+            except ValueError:
+                self._entries = {}
+
+    @staticmethod
+    def _key(path, algorithm):
+        st = os.stat(path)
+        return f"{algorithm}:{st.st_dev}:{st.st_ino}:{st.st_size}:{st.st_mtime_ns}"
+
+    def digests(self, paths, algorithm="md5", workers=None):
+        """Digests of `paths` in order; the uncached ones are hashed in parallel."""
+        keys = [self._key(path, algorithm) for path in paths]
+        missing = [i for i, key in enumerate(keys) if key not in self._entries]
+        jobs = [(paths[i], algorithm) for i in missing]
+        if len(jobs) > 1 and workers != 1:
+            workers = workers or os.cpu_count() or 1
+            with ProcessPoolExecutor(workers) as pool:
+                results = list(pool.map(_hash_file, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+        else:
+            results = [_hash_file(job) for job in jobs]
+        for i, digest in zip(missing, results):
+            self._entries[keys[i]] = digest
+        self.hits += len(paths) - len(missing)
+        self.misses += len(missing)
+        return [self._entries[key] for key in keys]
+
+    def save(self):
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            _write_atomically(self.path, json.dumps(self._entries))
+
+
+def list_files(root, exclude=()):
+    """Regular files under `root` (no symlinks), as sorted paths relative to it."""
+    found = []
+    for directory, dirs, files in os.walk(root):
+        dirs.sort()
+        for name in files:
+            path = os.path.join(directory, name)
+            rel_path = os.path.relpath(path, root)
+            if rel_path not in exclude and os.path.isfile(path) and not os.path.islink(path):
+                found.append(rel_path)
+    return sorted(found)
+
+
+def write_checksums(root, cache, workers=None):
+    """Writes root/md5sum.txt in the format of `md5sum ./path`. Returns the number of files."""
+    rel_paths = list_files(root, exclude={CHECKSUM_FILE})
+    digests = cache.digests([os.path.join(root, p) for p in rel_paths], "md5", workers)
+    _write_atomically(os.path.join(root, CHECKSUM_FILE),
+                      "".join(f"{digest}  ./{rel_path}\n" for digest, rel_path in zip(digests, rel_paths)))
+    return len(rel_paths)
+
+
+def tree_digest(path, cache, workers=None):
+    """A content hash of a file or directory tree: names, modes, symlink targets and file contents."""
+    if os.path.isfile(path):
+        return cache.digests([path], "sha256", workers)[0]
+    entries = []
+    for directory, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(dirs + files):
+            full = os.path.join(directory, name)
+            entries.append((os.path.relpath(full, path), os.lstat(full).st_mode,
+                            os.readlink(full) if os.path.islink(full) else None))
+    files = [os.path.join(path, rel) for rel, _, target in entries
+             if target is None and os.path.isfile(os.path.join(path, rel))]
+    contents = dict(zip(files, cache.digests(files, "sha256", workers)))
+    digest = hashlib.sha256()
+    for rel, mode, target in entries:
+        digest.update(f"{rel}\0{mode:o}\0{target or contents.get(os.path.join(path, rel), '')}\n".encode())
+    return digest.hexdigest()
+
+
+def link_tree(src, dest, skip=()):
+    """
+    Stages a copy of `src` at `dest` made of hard links, so nothing is
+    copied; files whose relative path is in `skip` are left out.
+    """
+    for directory, dirs, files in os.walk(src):
+        rel_dir = os.path.relpath(directory, src)
+        target_dir = os.path.normpath(os.path.join(dest, rel_dir))
+        os.makedirs(target_dir, exist_ok=True)
+        for name in files + [d for d in dirs if os.path.islink(os.path.join(directory, d))]:
+            rel_path = os.path.normpath(os.path.join(rel_dir, name))
+            if rel_path in skip:
+                continue
+            source, target = os.path.join(directory, name), os.path.join(target_dir, name)
+            if os.path.islink(source):
+                os.symlink(os.readlink(source), target)
+                continue
+            try:
+                os.link(source, target)
+            except OSError:
+                shutil.copy2(source, target)  # another filesystem, or links not allowed
+
+
+# ----------------------------------------------------------------------
+# Stage cache
+# ----------------------------------------------------------------------
+
+class StageCache:
+    """Stage outputs under <directory>/<stage>/<key>/, plus the timing of every stage run."""
+
+    def __init__(self, directory=None, clock=time.perf_counter):
+        self.directory = directory or os.environ.get(CACHE_DIR_ENV) or os.path.abspath(DEFAULT_CACHE_DIR)
+        self.clock = clock
+        self.timings = []
+
+    def key(self, stage, inputs):
+        data = json.dumps({"stage": stage, "version": PIPELINE_VERSION, "inputs": inputs}, sort_keys=True)
+        return hashlib.sha256(data.encode()).hexdigest()[:16]
+
+    def run(self, stage, inputs, build):
+        """
+        The output directory of `stage` for `inputs`. build(directory) is only
+        called on a cache miss, into a scratch directory that becomes the
+        cached output once it returns.
+        """
+        started = self.clock()
+        output = os.path.join(self.directory, stage, self.key(stage, inputs))
+        cached = os.path.exists(os.path.join(output, ".complete"))
+        if not cached:
+            scratch = f"{output}.partial"
+            _remove(scratch)
+            _remove(output)
+            os.makedirs(scratch)
+            build(scratch)
+            _write_atomically(os.path.join(scratch, ".complete"), json.dumps(inputs, indent=2))
+            os.replace(scratch, output)
+        os.utime(output)  # most recently used, for prune()
+        self.timings.append({"stage": stage, "key": os.path.basename(output), "cached": cached,
+                             "seconds": round(self.clock() - started, 3)})
+        return output
+
+    def prune(self, stage, keep=KEEP_PER_STAGE):
+        """Removes all but the `keep` most recently used outputs of `stage`."""
+        stage_dir = os.path.join(self.directory, stage)
+        if not os.path.isdir(stage_dir):
+            return
+        outputs = sorted((os.path.join(stage_dir, name) for name in os.listdir(stage_dir)),
+                         key=os.path.getmtime, reverse=True)
+        for path in outputs[keep:]:
+            _remove(path)
+
+
+# ----------------------------------------------------------------------
+# Live ISO stages (need root, squashfs-tools and xorriso)
+# ----------------------------------------------------------------------
+
+def build_base(cache, iso_path, checksums):
+    def build(out):
+        tree = os.path.join(out, "iso")
+        _run(["xorriso", "-osirrox", "on", "-indev", iso_path, "-extract", "/", tree])
+        _run(["chmod", "-R", "u+w", tree])  # the extracted tree keeps the ISO's read-only modes
+        _run(["unsquashfs", "-q", "-d", os.path.join(out, "rootfs"),
+              os.path.join(tree, "live", "filesystem.squashfs")], privileged=True)
+    return cache.run("base", {"iso": tree_digest(iso_path, checksums)}, build)
+
+
+def distro_codename(base):
+    with open(os.path.join(base, "rootfs", "etc", "os-release")) as f:
+        for line in f:
+            if line.startswith("VERSION_CODENAME="):
+                return line.split("=", 1)[1].strip().strip('"')
+    raise RuntimeError("Cannot find VERSION_CODENAME in the ISO's os-release.")
+
+
+def build_system(cache, base, codename, binary_name):
+    script = SETUP_SCRIPT.format(distro=codename, binary=binary_name)
+
+    def build(out):
+        rootfs = os.path.join(out, "rootfs")
+        # A real copy: the chroot changes files in place, which must not reach the base cache
+        _run(["cp", "-a", os.path.join(base, "rootfs"), rootfs], privileged=True)
+        script_path = os.path.join(out, "setup_chroot.sh")
+        with open(script_path, "w") as f:
+            f.write(script)
+        _run(["install", "-m", "755", script_path, os.path.join(rootfs, "setup_chroot.sh")], privileged=True)
+        mounted = []
+        try:
+            for name in ("dev", "proc", "sys"):
+                _run(["mount", "--bind", f"/{name}", os.path.join(rootfs, name)], privileged=True)
+                mounted.append(os.path.join(rootfs, name))
+            _run(["cp", "/etc/resolv.conf", os.path.join(rootfs, "etc")], privileged=True)
+            _run(["chroot", rootfs, "/setup_chroot.sh"], privileged=True)
+        finally:
+            for path in reversed(mounted):
+                _run(["umount", path], privileged=True)
+        _run(["rm", "-f", os.path.join(rootfs, "setup_chroot.sh")], privileged=True)
+    return cache.run("system", {"base": os.path.basename(base), "script": hashlib.sha256(script.encode()).hexdigest()},
+                     build)
+
+
+def build_squashfs(cache, system, app_path, profile, checksums):
+    name = os.path.basename(os.path.normpath(app_path))
+
+    def build(out):
+        staging = os.path.join(out, "staging")
+        # Hard links: nothing is copied, and only new entries are added below,
+        # so the cached system tree is never modified through them.
+        _run(["cp", "-al", os.path.join(system, "rootfs"), staging], privileged=True)
+        if os.path.isdir(app_path):
+            # A one-dir build goes to /opt and is linked into /usr/local/bin
+            _run(["mkdir", "-p", os.path.join(staging, "opt")], privileged=True)
+            _run(["cp", "-a", app_path, os.path.join(staging, "opt", name)], privileged=True)
+            _run(["ln", "-sf", f"/opt/{name}/{name}", os.path.join(staging, "usr", "local", "bin", name)],
+                 privileged=True)
+        else:
+            _run(["install", "-m", "755", app_path, os.path.join(staging, "usr", "local", "bin", name)],
+                 privileged=True)
+        _run(["mksquashfs", staging, os.path.join(out, "filesystem.squashfs"), "-noappend", "-quiet"]
+             + COMPRESSION_PROFILES[profile], privileged=True)
+        _remove(staging)
+    return cache.run("squashfs", {"system": os.path.basename(system), "app": tree_digest(app_path, checksums),
+                                  "name": name, "compression": COMPRESSION_PROFILES[profile]}, build)
+
+
+def build_iso_image(cache, base, squashfs, checksums, workers=None):
+    def build(out):
+        tree = os.path.join(out, "tree")
+        squashfs_path = os.path.join("live", "filesystem.squashfs")
+        link_tree(os.path.join(base, "iso"), tree, skip={squashfs_path, CHECKSUM_FILE})
+        try:
+            os.link(os.path.join(squashfs, "filesystem.squashfs"), os.path.join(tree, squashfs_path))
+        except OSError:
+            shutil.copy2(os.path.join(squashfs, "filesystem.squashfs"), os.path.join(tree, squashfs_path))
+        write_checksums(tree, checksums, workers)
+        _run(["xorriso", "-as", "mkisofs", "-quiet", "-o", os.path.join(out, "image.iso"),
+              "-isohybrid-mbr", ISOHYBRID_MBR, "-c", "isolinux/boot.cat", "-b", "isolinux/isolinux.bin",
+              "-no-emul-boot", "-boot-load-size", "4", "-boot-info-table", tree])
+        _remove(tree)
+    return cache.run("iso", {"base": os.path.basename(base), "squashfs": os.path.basename(squashfs)}, build)
+
+
+def report_timings(timings, history_path=None, **fields):
+    """Prints the stage timings and appends them to a JSON-lines history."""
+    print(f"{'stage':<10} {'result':<8} {'seconds':>9}  key")
+    for t in timings:
+        print(f"{t['stage']:<10} {'cached' if t['cached'] else 'built':<8} {t['seconds']:>9.1f}  {t['key']}")
+    total = sum(t["seconds"] for t in timings)
+    print(f"{'total':<10} {'':<8} {total:>9.1f}")
+    if history_path:
+        os.makedirs(os.path.dirname(os.path.abspath(history_path)), exist_ok=True)
+        record = dict(fields, finishedAt=datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                      stages=timings, totalSeconds=round(total, 3))
+        with open(history_path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+def build_live_iso(iso_path, app_path, profile="release", output_dir=".", output_name=None,
+                   cache_dir=None, workers=None, history_path=None):
+    """Runs the four stages and links the ISO to the output path. Returns that path."""
+    cache = StageCache(cache_dir)
+    checksums = ChecksumCache(os.path.join(cache.directory, "checksums.json"))
+    binary_name = os.path.basename(os.path.normpath(app_path))
+    try:
+        base = build_base(cache, iso_path, checksums)
+        codename = distro_codename(base)
+        print(f"✅ Detected Debian version: {codename}")
+        system = build_system(cache, base, codename, binary_name)
+        squashfs = build_squashfs(cache, system, app_path, profile, checksums)
+        image = build_iso_image(cache, base, squashfs, checksums, workers)
+    finally:
+        checksums.save()
+    output = os.path.join(output_dir, output_name or f"{binary_name}-{codename}-live.iso")
+    if os.path.exists(output):
+        os.remove(output)
+    try:
+        os.link(os.path.join(image, "image.iso"), output)
+    except OSError:
+        shutil.copy2(os.path.join(image, "image.iso"), output)
+    for stage in ("base", "system", "squashfs", "iso"):
+        cache.prune(stage)
+    report_timings(cache.timings, history_path, profile=profile, output=output,
+                   checksumCacheHits=checksums.hits, checksumCacheMisses=checksums.misses)
+    return output
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["checksum"]:
+        parser = argparse.ArgumentParser(prog="build_pipeline.py checksum",
+                                         description="Write md5sum.txt for a directory tree.")
+        parser.add_argument("root")
+        parser.add_argument("--workers", type=int, help="hashing processes (default: one per CPU)")
+        parser.add_argument("--cache", help="per-file digest cache (default: <build cache>/checksums.json)")
+        args = parser.parse_args(argv[1:])
+        cache = ChecksumCache(args.cache or os.path.join(StageCache().directory, "checksums.json"))
+        started = time.perf_counter()
+        count = write_checksums(args.root, cache, args.workers)
+        cache.save()
+        print(f"{count} files in {time.perf_counter() - started:.2f}s "
+              f"({cache.misses} hashed, {cache.hits} from cache).")
+        return 0
+
+    parser = argparse.ArgumentParser(description="Build the live ISO from cached stages.")
+    parser.add_argument("--iso", required=True, help="the official Debian live ISO")
+    parser.add_argument("--app", required=True, help="the PyInstaller build: one-dir directory or executable")
+    parser.add_argument("--profile", choices=sorted(COMPRESSION_PROFILES), default="release",
+                        help="release: xz squashfs; dev: zstd, much faster to build")
+    parser.add_argument("--output-dir", default=".")
+    parser.add_argument("--output", help="ISO file name (default: <app>-<codename>-live.iso)")
+    parser.add_argument("--cache-dir", help=f"stage cache (default: ${CACHE_DIR_ENV} or ./{DEFAULT_CACHE_DIR})")
+    parser.add_argument("--workers", type=int, help="checksum processes (default: one per CPU)")
+    parser.add_argument("--timings", help="append stage timings to this JSON-lines file")
+    args = parser.parse_args(argv)
+    output = build_live_iso(args.iso, args.app, args.profile, args.output_dir, args.output, args.cache_dir,
+                            args.workers, args.timings)
+    print(f"\n🎉 ISO ready: {os.path.abspath(output)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
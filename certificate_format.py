@@ -0,0 +1,137 @@
+# certificate_format.py
+import json
+import base64
+
+import merkle
+
+# Current format: the signature covers the canonical JSON bytes, which are
+# stored in the certificate itself, so verifying never depends on how a
+# reader re-serialises the data (key order, indentation, float formatting).
+CANONICAL_FORMAT = "canonical-json-v1"
+# Certificates from before the canonical format signed json.dumps(data, indent=4).
+LEGACY_FORMAT = "legacy-indent4"
+# A session's certificates are leaves of a Merkle tree whose root is signed
+# once; each certificate carries its inclusion proof in "batch".
+MERKLE_FORMAT = "merkle-batch-v1"
+
+# Fields that describe the signature rather than being signed
+SIGNATURE_FIELDS = ("signature", "signatureFormat", "signatureAlgorithm", "signedPayload", "batch")
+
+
+class MalformedCertificate(ValueError):
+    """The file is not a certificate this tool can check."""
+
+
+class PayloadMismatch(ValueError):
+    """The readable fields of a certificate differ from what was signed."""
+
+
+def canonical_bytes(data):
+    """Sorted keys, no whitespace, ASCII only: the same bytes for the same data."""
+    return json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=True).encode("ascii")
+
+
+def attach_signature(cert_data, sign, algorithm=None):
+    """
+    Signs the canonical form of `cert_data` with `sign(bytes) -> base64 str`
+    and returns a new dict with the signature fields added.
+    """
+    payload = canonical_bytes(cert_data)
+    signed = dict(cert_data)
+    signed["signatureFormat"] = CANONICAL_FORMAT
+    if algorithm:
+        signed["signatureAlgorithm"] = algorithm
+    signed["signedPayload"] = base64.b64encode(payload).decode("ascii")
+    signed["signature"] = sign(payload)
+    return signed
+
+
+def batch_message(root_hex, size):
+    """The bytes actually signed for a batch: its Merkle root and leaf count."""
+    return b"hddreset-merkle-batch-v1\n" + canonical_bytes({"root": root_hex, "size": size})
+
+
+def is_batch_manifest(data):
+    """True for a session's BATCH-*.json manifest (written next to its certificates)."""
+    return isinstance(data, dict) and "leaves" in data and "root" in data and "signature" in data
+
+
+def attach_batch_signature(cert_datas, sign, algorithm=None):
+    """
+    Signs a whole session with one signature over the Merkle root of the
+    certificates' canonical payloads.
+
+    Returns (signed certificates, batch summary). Every certificate holds
+    its payload, the root signature and its inclusion proof, so it can still
+    be verified on its own.
+    """
+    payloads = [canonical_bytes(data) for data in cert_datas]
+    leaves = [merkle.leaf_hash(payload) for payload in payloads]
+    root, proofs = merkle.root_and_proofs(leaves)
+    root_hex = root.hex()
+    signature = sign(batch_message(root_hex, len(leaves)))
+    signed = []
+    for index, (data, payload, proof) in enumerate(zip(cert_datas, payloads, proofs)):
+        cert = dict(data)
+        cert["signatureFormat"] = MERKLE_FORMAT
+        if algorithm:
+            cert["signatureAlgorithm"] = algorithm
+        cert["signedPayload"] = base64.b64encode(payload).decode("ascii")
+        cert["batch"] = {"root": root_hex, "size": len(leaves), "index": index, "proof": [p.hex() for p in proof]}
+        cert["signature"] = signature
+        signed.append(cert)
+    summary = {
+        "signatureFormat": MERKLE_FORMAT,
+        "signatureAlgorithm": algorithm,
+        "root": root_hex,
+        "size": len(leaves),
+        "signature": signature,
+        "leaves": [{"reportID": data.get("reportID"), "leafHash": leaf.hex()} for data, leaf in zip(cert_datas, leaves)],
+    }
+    return signed, summary
+
+
+def signed_message(data):
+    """
+    Returns (message_bytes, signature_bytes, format) for a parsed certificate.
+
+    For the canonical format the message is the stored payload, and the
+    visible fields must match it exactly (PayloadMismatch otherwise): the
+    signature would otherwise vouch for data nobody sees.
+    """
+    if not isinstance(data, dict) or "signature" not in data:
+        raise MalformedCertificate("No 'signature' field found.")
+    try:
+        signature = base64.b64decode(data["signature"], validate=True)
+    except (TypeError, ValueError):
+        raise MalformedCertificate("Signature is not valid base64.")
+
+    if "signedPayload" not in data:
+        unsigned = {k: v for k, v in data.items() if k != "signature"}
+        return json.dumps(unsigned, indent=4).encode("utf-8"), signature, LEGACY_FORMAT
+
+    fmt = data.get("signatureFormat")
+    if fmt not in (CANONICAL_FORMAT, MERKLE_FORMAT):
+        raise MalformedCertificate(f"Unknown signature format: {fmt}")
+    try:
+        payload = base64.b64decode(data["signedPayload"], validate=True)
+        signed_data = json.loads(payload)
+    except (TypeError, ValueError):
+        raise MalformedCertificate("signedPayload is not base64-encoded JSON.")
+    visible = {k: v for k, v in data.items() if k not in SIGNATURE_FIELDS}
+    if signed_data != visible:
+        raise PayloadMismatch("Certificate fields differ from the signed payload.")
+    if fmt == CANONICAL_FORMAT:
+        return payload, signature, fmt
+
+    # Batch: the proof must lead from this payload to the root that was signed.
+    try:
+        batch = data["batch"]
+        proof = [bytes.fromhex(p) for p in batch["proof"]]
+        computed = merkle.root_from_proof(merkle.leaf_hash(payload), batch["index"], batch["size"], proof)
+        claimed = batch["root"]
+    except (KeyError, TypeError, ValueError) as e:
+        raise MalformedCertificate(f"Malformed batch inclusion proof: {e}")
+    if computed.hex() != claimed:
+        raise PayloadMismatch("Inclusion proof does not lead to the signed batch root.")
+    return batch_message(claimed, batch["size"]), signature, fmt
@@ -1,15 +1,13 @@
 # certificate_generator.py
+import re
 import json
 import hashlib
 import base64
 from datetime import datetime
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import padding
-from cryptography.hazmat.primitives import serialization
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
 import os
 import sys
+import sqlite3
+import certificate_format
 
 # NEW: Helper function to find bundled files
 def resource_path(relative_path):
@@ -19,13 +17,12 @@ def resource_path(relative_path):
         base_path = sys._MEIPASS
     except Exception:
         # If not bundled, the base path is the directory of this script
-        base_path = os.path.abspath(".")
+        base_path = os.path.dirname(os.path.abspath(__file__))
 
     return os.path.join(base_path, relative_path)
 
-def create_certificate(drive_info, wipe_method, wipe_status):
-    """Generates and signs a wipe certificate in JSON and PDF format."""
-    # ... (This function does not need to change) ...
+def _certificate_data(drive_info, wipe_method, wipe_status):
+    """The unsigned certificate contents for one drive."""
     timestamp = datetime.utcnow().isoformat() + "Z"
     
     cert_data = {
@@ -44,67 +41,172 @@ def create_certificate(drive_info, wipe_method, wipe_status):
             "details": wipe_status[1]
         }
     }
+    # Engine statistics (data source, throughput, pass plan, ...) ride along as a
+    # third element; they never replace the method, standard or status above.
+    if len(wipe_status) > 2 and wipe_status[2]:
+        wipe_details = cert_data["wipeDetails"]
+        wipe_details.update({key: value for key, value in wipe_status[2].items() if key not in wipe_details})
+    return cert_data
 
-    cert_json = json.dumps(cert_data, indent=4).encode('utf-8')
-    signature = _sign_data(cert_json)
-    cert_data['signature'] = signature
+# Where certificates are written: WIPER_CERTIFICATE_DIR (e.g. a mounted USB
+# stick) or the current directory, which on the live image is RAM. Every
+# certificate is also recorded in the wipe history (see wipe_history).
+CERTIFICATE_DIR_ENV = "WIPER_CERTIFICATE_DIR"
 
-    # In the bootable environment, save to a known location if possible (like a mounted USB)
-    # For now, we save to the current directory, which will be in RAM.
-    filename_base = cert_data['reportID']
+def _output_dir(output_dir):
+    output_dir = output_dir or os.environ.get(CERTIFICATE_DIR_ENV) or ""
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    return output_dir
+
+def _record_history(cert_datas, manifest=None):
+    """Adds certificates to the wipe history; a failure there never loses the certificate files."""
+    import wipe_history
+    try:
+        wipe_history.record(cert_datas, manifest)
+    except (OSError, sqlite3.Error) as e:
+        print(f"⚠️ Could not record the wipe history: {e}")
+
+def _write_certificate(cert_data, pdf, pdf_worker=None, output_dir=""):
+    # Serials can contain characters that are not valid in file names (e.g. "N/A")
+    filename_base = os.path.join(output_dir, re.sub(r'[^\w.-]', '_', cert_data['reportID']))
+    # Drives without a serial wiped in the same second share a report ID;
+    # never let one session's certificate overwrite another's.
+    base, n = filename_base, 1
+    while os.path.exists(f"{filename_base}.json"):
+        filename_base = f"{base}-{n}"
+        n += 1
     json_path = f"{filename_base}.json"
-    pdf_path = f"{filename_base}.pdf"
+    pdf_path = f"{filename_base}.pdf" if pdf else None
 
     with open(json_path, 'w') as f:
         json.dump(cert_data, f, indent=4)
 
-    _create_pdf_report(cert_data, pdf_path)
+    if pdf and pdf_worker:
+        # The path is returned now; the file appears once the worker gets to it
+        pdf_worker.submit(_create_pdf_report, cert_data, pdf_path)
+    elif pdf:
+        _create_pdf_report(cert_data, pdf_path)
     
     return json_path, pdf_path
 
+def create_certificate(drive_info, wipe_method, wipe_status, pdf=True, pdf_worker=None, output_dir=None):
+    """
+    Generates and signs a wipe certificate in JSON and PDF format.
+    With pdf=False only the JSON is written (pdf_path is None) and
+    reportlab is never imported; with a pdf_reports.PdfWorker the PDF is
+    rendered in the background.
+    """
+    signer = _signer()
+    # The exact signed bytes travel with the certificate (see certificate_format)
+    cert_data = certificate_format.attach_signature(
+        _certificate_data(drive_info, wipe_method, wipe_status), signer.sign, signer.algorithm)
+    paths = _write_certificate(cert_data, pdf, pdf_worker, _output_dir(output_dir))
+    _record_history([cert_data])
+    return paths
+
+def create_certificates(entries, pdf=True, session_report=False, pdf_worker=None, output_dir=None):
+    """
+    Batch-signs the certificates of a multi-drive session: `entries` is a list
+    of (drive_info, wipe_method, wipe_status). The certificates become leaves
+    of a Merkle tree whose root is signed once; each one carries its
+    inclusion proof and stays individually verifiable.
+
+    With pdf=False no per-drive PDFs are written; session_report=True adds
+    one consolidated PDF for the whole session. PDFs go to `pdf_worker`
+    when one is given. Files go to `output_dir` (default: see
+    CERTIFICATE_DIR_ENV).
+
+    Returns ([(json_path, pdf_path), ...], batch_manifest_path,
+    session_report_path). A single entry is signed on its own and has no
+    manifest.
+    """
+    signer = _signer()
+    cert_datas = [_certificate_data(*entry) for entry in entries]
+    summary = manifest_path = None
+    if len(entries) == 1:
+        signed = [certificate_format.attach_signature(cert_datas[0], signer.sign, signer.algorithm)]
+    else:
+        signed, summary = certificate_format.attach_batch_signature(cert_datas, signer.sign, signer.algorithm)
+    output_dir = _output_dir(output_dir)
+    paths = [_write_certificate(cert_data, pdf, pdf_worker, output_dir) for cert_data in signed]
+    if summary:
+        # The manifest lets a whole session be checked with one signature verification.
+        summary["certificates"] = [json_path for json_path, _ in paths]
+        manifest_path = os.path.join(output_dir, f"BATCH-{summary['root'][:16]}.json")
+        with open(manifest_path, 'w') as f:
+            json.dump(summary, f, indent=4)
+
+    report_path = None
+    if session_report:
+        import pdf_reports
+        report_path = os.path.join(output_dir, f"SESSION-{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}.pdf")
+        if pdf_worker:
+            pdf_worker.submit(pdf_reports.write_session_report, signed, report_path, summary)
+        else:
+            pdf_reports.write_session_report(signed, report_path, summary)
+    _record_history(signed, summary)
+    return paths, manifest_path, report_path
+
+
+# Which key signs certificates: the bundled one unless WIPER_PRIVATE_KEY names another.
+PRIVATE_KEY_ENV = "WIPER_PRIVATE_KEY"
+
+class _Signer:
+    """A parsed private key and its signature scheme (RSA-PSS/SHA-256 or Ed25519)."""
+
+    def __init__(self, private_key):
+        from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+        self.private_key = private_key
+        if isinstance(private_key, ed25519.Ed25519PrivateKey):
+            self.algorithm = "ed25519"
+        elif isinstance(private_key, rsa.RSAPrivateKey):
+            self.algorithm = "rsa-pss-sha256"
+        else:
+            raise ValueError(f"Unsupported signing key type: {type(private_key).__name__}")
+
+    def sign(self, data):
+        """Returns the base64 signature of `data`."""
+        if self.algorithm == "ed25519":
+            signature = self.private_key.sign(data)
+        else:
+            from cryptography.hazmat.primitives import hashes
+            from cryptography.hazmat.primitives.asymmetric import padding
+            signature = self.private_key.sign(
+                data,
+                padding.PSS(
+                    mgf=padding.MGF1(hashes.SHA256()),
+                    salt_length=padding.PSS.MAX_LENGTH
+                ),
+                hashes.SHA256()
+            )
+        return base64.b64encode(signature).decode('utf-8')
+
+_signers = {}
+
+def _signer():
+    """The signer for the configured key, parsed once per process."""
+    # Imported on first use so that starting the app does not pay for cryptography
+    from cryptography.hazmat.primitives import serialization
 
-def _sign_data(data):
-    """Signs data with the private key and returns a base64 signature."""
     # MODIFIED: Use the helper function to find the key
-    private_key_path = resource_path("private_key.pem")
+    private_key_path = os.environ.get(PRIVATE_KEY_ENV) or resource_path("private_key.pem")
+    if private_key_path not in _signers:
+        with open(private_key_path, "rb") as key_file:
+            private_key = serialization.load_pem_private_key(
+                key_file.read(),
+                password=None,
+            )
+        _signers[private_key_path] = _Signer(private_key)
+    return _signers[private_key_path]
 
-    with open(private_key_path, "rb") as key_file:
-        private_key = serialization.load_pem_private_key(
-            key_file.read(),
-            password=None,
-        )
-    
-    signature = private_key.sign(
-        data,
-        padding.PSS(
-            mgf=padding.MGF1(hashes.SHA256()),
-            salt_length=padding.PSS.MAX_LENGTH
-        ),
-        hashes.SHA256()
-    )
-    return base64.b64encode(signature).decode('utf-8')
+def _sign_data(data):
+    """Signs data with the private key and returns a base64 signature."""
+    return _signer().sign(data)
 
 
 def _create_pdf_report(cert_data, output_path):
-    """Creates a simple PDF report from the certificate data."""
-    # ... (This function does not need to change) ...
-    c = canvas.Canvas(output_path, pagesize=letter)
-    width, height = letter
-    
-    c.drawString(72, height - 72, "Secure Data Erasure Certificate")
-    c.line(72, height - 80, width - 72, height - 80)
-    
-    y_pos = height - 120
-    for key, value in cert_data.items():
-        if key == 'signature': continue
-        if isinstance(value, dict):
-            c.drawString(90, y_pos, f"{key}:")
-            y_pos -= 20
-            for sub_key, sub_value in value.items():
-                c.drawString(108, y_pos, f"{sub_key}: {sub_value}")
-                y_pos -= 15
-        else:
-            c.drawString(90, y_pos, f"{key}: {value}")
-            y_pos -= 20
-            
-    c.save()
\ No newline at end of file
+    """Creates the PDF report for one certificate (wrapped, paginated)."""
+    # Imported here: reportlab is slow to import and headless runs may skip PDFs
+    import pdf_reports
+    pdf_reports.write_certificate_pdf(cert_data, output_path)
\ No newline at end of file
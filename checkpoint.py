@@ -0,0 +1,202 @@
+# checkpoint.py
+import os
+import re
+import json
+import time
+import datetime
+
+# Journals live on persistent media (the boot USB stick, a small reserved
+# partition...), never on the drive being wiped. There is no default: on the
+# live ISO the working directory is RAM, which a crash or power loss wipes
+# along with the journal, so checkpointing is off until a directory is set.
+CHECKPOINT_DIR_ENV = "WIPER_CHECKPOINT_DIR"
+DEFAULT_INTERVAL = 30.0  # seconds between durable checkpoints
+JOURNAL_VERSION = 1
+NOT_CONFIGURED = (f"Checkpointing is off: set {CHECKPOINT_DIR_ENV} to a directory on persistent media "
+                  "(e.g. the boot USB stick) to make overwrites resumable after a crash.")
+
+
+def default_directory():
+    """The configured journal directory, or None when checkpointing is not set up."""
+    return os.environ.get(CHECKPOINT_DIR_ENV) or None
+
+
+def journal_key(serial, size, drive_path=None):
+    """Drive serial and size identify the drive even if its /dev name changes between boots."""
+    ident = serial or os.path.realpath(drive_path or "unknown")
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", f"{ident}-{size}").strip("_")
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+def _write_atomically(path, data):
+    """Write-to-temp, fsync, rename, fsync the directory: a crash leaves the old or the new file."""
+    directory = os.path.dirname(path)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+class CheckpointStore:
+    """A directory of JSON journals, one per drive being wiped."""
+
+    def __init__(self, directory=None):
+        self.directory = directory or default_directory()
+        if not self.directory:
+            raise ValueError(NOT_CONFIGURED)
+
+    def path_for(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def load(self, key):
+        """The journal for `key`, or None if there is none (or it is unreadable)."""
+        try:
+            with open(self.path_for(key)) as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return record if record.get("version") == JOURNAL_VERSION else None
+
+    def save(self, key, record):
+        os.makedirs(self.directory, exist_ok=True)
+        _write_atomically(self.path_for(key), json.dumps(record, indent=2))
+
+    def discard(self, key):
+        try:
+            os.remove(self.path_for(key))
+        except FileNotFoundError:
+            pass
+
+
+class CheckpointJournal:
+    """
+    Durable progress of one overwrite: the pass in progress, the data source
+    and seed it writes, and the byte ranges known to be on the medium.
+
+    The caller fsyncs the device before calling mark(), so every range
+    recorded here survives a power loss. mark() only writes when
+    `interval` seconds have passed, unless forced.
+    """
+
+    def __init__(self, store, key, record, interval=DEFAULT_INTERVAL, clock=time.monotonic):
+        self.store = store
+        self.key = key
+        self.record = record
+        self.interval = interval
+        self.clock = clock
+        self._last = None
+
+    @classmethod
+    def start(cls, store, key, drive_path, size, passes, data_source, chunk_size,
+              interval=DEFAULT_INTERVAL, resume=False, plan=None):
+        """
+        Opens the journal for a wipe. With `resume`, a journal for the same
+        drive and plan is continued; otherwise any old one is replaced.
+        `plan` is the wipe plan's description (see wipe_plans).
+        """
+        record = store.load(key) if resume else None
+        if record is not None and not (record["sizeBytes"] == size and record["passes"] == passes
+                                       and record["dataSource"] == data_source and record.get("plan") == plan):
+            record = None  # a different wipe; its progress does not apply
+        if record is None:
+            record = {
+                "version": JOURNAL_VERSION,
+                "drivePath": drive_path,
+                "sizeBytes": size,
+                "passes": passes,
+                "dataSource": data_source,
+                "plan": plan,
+                "chunkSize": chunk_size,
+                "pass": 1,
+                "seed": None,
+                "writtenRanges": [],
+                "durableBytes": 0,
+                "createdAt": _now(),
+                "updatedAt": None,
+                "sessions": [],
+            }
+        record["sessions"].append({
+            "startedAt": _now(),
+            "drivePath": drive_path,
+            "resumedPass": record["pass"] if record["durableBytes"] or record["pass"] > 1 else None,
+            "resumedRanges": [list(r) for r in record["writtenRanges"]],
+        })
+        journal = cls(store, key, record, interval)
+        journal.mark(record["pass"], record["writtenRanges"], record["seed"], force=True)
+        return journal
+
+    @property
+    def resumed(self):
+        return len(self.record["sessions"]) > 1 and bool(self.record["sessions"][-1]["resumedPass"])
+
+    def done_ranges(self, pass_number):
+        """Ranges already written in `pass_number` by an earlier session."""
+        if self.record["pass"] != pass_number:
+            return []
+        return [tuple(r) for r in self.record["writtenRanges"]]
+
+    def due(self):
+        return self._last is None or self.clock() - self._last >= self.interval
+
+    def mark(self, pass_number, ranges, seed=None, force=False):
+        """Records that `ranges` of `pass_number` are durably written."""
+        if not force and not self.due():
+            return False
+        self.record.update({
+            "pass": pass_number,
+            "seed": seed.hex() if isinstance(seed, (bytes, bytearray)) else seed,
+            "writtenRanges": [list(r) for r in ranges],
+            "durableBytes": sum(end - start for start, end in ranges),
+            "updatedAt": _now(),
+        })
+        self.store.save(self.key, self.record)
+        self._last = self.clock()
+        return True
+
+    def seed_for(self, pass_number):
+        """The seed an interrupted pass was written with, to continue the same stream."""
+        if self.record["pass"] != pass_number or not self.record["seed"]:
+            return None
+        return bytes.fromhex(self.record["seed"])
+
+    def summary(self):
+        """What the certificate records about earlier, interrupted sessions."""
+        sessions = self.record["sessions"]
+        resumed = [s for s in sessions if s["resumedPass"]]
+        return {
+            "resumed": bool(resumed),
+            "sessions": len(sessions),
+            "firstStartedAt": sessions[0]["startedAt"],
+            "resumes": [{"startedAt": s["startedAt"], "pass": s["resumedPass"],
+                         "carriedOverRanges": s["resumedRanges"]} for s in resumed],
+        }
+
+    def finish(self):
+        """The wipe completed: the journal is no longer needed."""
+        self.store.discard(self.key)
+
+
+def describe_pending(store, key):
+    """A short summary of an interrupted wipe for the UI to offer resuming, or None."""
+    record = store.load(key)
+    if record is None or (record["pass"] == 1 and not record["durableBytes"]):
+        return None
+    size = record["sizeBytes"] or 1
+    return {
+        "pass": record["pass"],
+        "passes": record["passes"],
+        "percent": round(100.0 * record["durableBytes"] / size, 1),
+        "updatedAt": record["updatedAt"],
+        "dataSource": record["dataSource"],
+        "plan": (record.get("plan") or {}).get("name"),
+    }
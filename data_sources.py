@@ -0,0 +1,261 @@
+# data_sources.py
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Keystream generators are positioned by byte offset, so any part of a pass
+# can be regenerated later from the seed alone (verification, resume, and
+# filling one buffer from several threads all rely on this).
+KEY_SIZE = 32
+NONCE_SIZE = 8
+SEED_SIZE = KEY_SIZE + NONCE_SIZE
+
+# Below this size splitting a fill across threads costs more than it saves.
+MIN_THREAD_SLICE = 256 * 1024
+
+
+class DataSource:
+    """Base class for overwrite data. Subclasses fill buffers in place."""
+    name = "base"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._seconds = 0.0
+
+    def fill(self, view, offset):
+        """Fills the writable memoryview `view` with the data for device `offset`."""
+        start = time.perf_counter()
+        self._fill(view, offset)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._bytes += len(view)
+            self._seconds += elapsed
+
+    def _fill(self, view, offset):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def replica(self):
+        """
+        Returns a new source producing the same data, used to regenerate what
+        was written for verification. None if the data cannot be reproduced.
+        """
+        return None
+
+    def describe(self):
+        """Returns the generator name and measured throughput for the wipe result."""
+        with self._lock:
+            generated, seconds = self._bytes, self._seconds
+        throughput = (generated / seconds / (1024 * 1024)) if seconds > 0 else None
+        return {
+            "name": self.name,
+            "bytesGenerated": generated,
+            "generatorSeconds": round(seconds, 3),
+            "throughputMBps": round(throughput, 1) if throughput else None,
+        }
+
+
+class ZeroSource(DataSource):
+    """All-zero data (NIST Clear final pass)."""
+    name = "zero"
+
+    def __init__(self):
+        super().__init__()
+        self._zeros = b""
+
+    def replica(self):
+        return ZeroSource()
+
+    def _fill(self, view, offset):
+        if len(self._zeros) < len(view):
+            self._zeros = bytes(len(view))
+        view[:] = self._zeros[:len(view)]
+
+
+class PatternSource(DataSource):
+    """
+    A byte pattern repeated across the device (fixed passes of DoD or
+    Gutmann-style plans). The repeated pattern is built once per pass;
+    every chunk is a slice of it starting at the chunk's phase.
+    """
+
+    def __init__(self, pattern, size=0):
+        super().__init__()
+        if not pattern:
+            raise ValueError("Pattern must not be empty.")
+        self.pattern = bytes(pattern)
+        self.name = f"pattern-{self.pattern.hex()}"
+        self._buffer = b""
+        self._ensure(size)
+
+    def _ensure(self, size):
+        # len(pattern) bytes of slack so a slice can start at any phase
+        if len(self._buffer) < size + len(self.pattern):
+            self._buffer = self.pattern * -(-(size + len(self.pattern)) // len(self.pattern))
+
+    def replica(self):
+        return PatternSource(self.pattern)
+
+    def _fill(self, view, offset):
+        self._ensure(len(view))
+        phase = offset % len(self.pattern)
+        view[:] = memoryview(self._buffer)[phase:phase + len(view)]
+
+    def describe(self):
+        info = super().describe()
+        info["pattern"] = self.pattern.hex()
+        return info
+
+
+class UrandomSource(DataSource):
+    """Kernel RNG. Reads straight into the buffer when /dev/urandom is available."""
+    name = "urandom"
+
+    def __init__(self):
+        super().__init__()
+        try:
+            self._dev = open("/dev/urandom", "rb", buffering=0)
+        except OSError:
+            self._dev = None
+
+    def _fill(self, view, offset):
+        if self._dev is None:
+            view[:] = os.urandom(len(view))
+            return
+        filled = 0
+        while filled < len(view):
+            filled += self._dev.readinto(view[filled:])
+
+    def close(self):
+        if self._dev is not None:
+            self._dev.close()
+            self._dev = None
+
+
+class KeystreamSource(DataSource):
+    """
+    CSPRNG output from a stream cipher keyed once per pass from os.urandom.
+
+    AES-256-CTR is the default since it runs on AES-NI; ChaCha20 is faster on
+    CPUs without AES instructions.
+    """
+    CIPHERS = ("aes-256-ctr", "chacha20")
+
+    def __init__(self, cipher="aes-256-ctr", seed=None, threads=1):
+        super().__init__()
+        # Imported here so that listing drives never pays for cryptography.
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+        if cipher not in self.CIPHERS:
+            raise ValueError(f"Unknown keystream cipher: {cipher}")
+        if seed is None:
+            seed = os.urandom(SEED_SIZE)
+        if len(seed) != SEED_SIZE:
+            raise ValueError(f"Keystream seed must be {SEED_SIZE} bytes.")
+
+        self.name = cipher
+        self.seed = bytes(seed)
+        self.threads = max(1, int(threads))
+        self._key = self.seed[:KEY_SIZE]
+        self._nonce = self.seed[KEY_SIZE:]
+        self._Cipher, self._algorithms, self._modes = Cipher, algorithms, modes
+        self._block = 16 if cipher == "aes-256-ctr" else 64
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(self.threads) if self.threads > 1 else None
+
+    def _encryptor(self, block_index):
+        if self.name == "aes-256-ctr":
+            counter = self._nonce + block_index.to_bytes(8, "big")
+            return self._Cipher(self._algorithms.AES(self._key), self._modes.CTR(counter)).encryptor()
+        # The ChaCha20 block counter is only 32 bits wide, so the high bits of
+        # the block index go into the nonce. _fill never crosses such a boundary.
+        nonce = (block_index & 0xFFFFFFFF).to_bytes(4, "little") + self._nonce + (block_index >> 32).to_bytes(4, "little")
+        return self._Cipher(self._algorithms.ChaCha20(self._key, nonce), mode=None).encryptor()
+
+    def _zeros(self, size):
+        zeros = getattr(self._local, "zeros", b"")
+        if len(zeros) < size:
+            zeros = self._local.zeros = bytes(size)
+        return zeros
+
+    def _generate(self, view, offset):
+        """Encrypts zeros into `view`, i.e. writes the keystream for [offset, offset + len)."""
+        pos = 0
+        while pos < len(view):
+            block_index, skip = divmod(offset + pos, self._block)
+            size = len(view) - pos
+            if self.name == "chacha20":
+                boundary = ((block_index >> 32) + 1) << 32
+                size = min(size, (boundary - block_index) * self._block - skip)
+            encryptor = self._encryptor(block_index)
+            if skip:
+                encryptor.update(bytes(skip))
+            target = view[pos:pos + size]
+            zeros = memoryview(self._zeros(size))[:size]
+            try:
+                encryptor.update_into(zeros, target)
+            except ValueError:
+                # Older cryptography releases want block_size - 1 bytes of slack.
+                head = max(0, size - self._block + 1)
+                if head:
+                    encryptor.update_into(zeros[:head], target)
+                target[head:] = encryptor.update(zeros[head:])
+            pos += size
+
+    def _fill(self, view, offset):
+        if self._pool is None or len(view) < MIN_THREAD_SLICE * 2:
+            self._generate(view, offset)
+            return
+        parts = min(self.threads, len(view) // MIN_THREAD_SLICE)
+        step = -(-len(view) // parts)
+        step += -step % 4096
+        futures = [
+            self._pool.submit(self._generate, view[start:start + step], offset + start)
+            for start in range(0, len(view), step)
+        ]
+        for future in futures:
+            future.result()
+
+    def replica(self):
+        return KeystreamSource(self.name, seed=self.seed, threads=self.threads)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def describe(self):
+        info = super().describe()
+        info["threads"] = self.threads
+        return info
+
+
+def keystream_available():
+    """True if the cryptography package can provide a keystream generator."""
+    try:
+        import cryptography.hazmat.primitives.ciphers  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def get_data_source(name="auto", seed=None, threads=1):
+    """
+    Returns a fresh data source for one pass.
+
+    'auto' and 'keystream' pick AES-256-CTR, falling back to urandom when the
+    cryptography package is not available.
+    """
+    if name in ("auto", "keystream"):
+        name = "aes-256-ctr" if keystream_available() else "urandom"
+    if name == "zero":
+        return ZeroSource()
+    if name == "urandom":
+        return UrandomSource()
+    if name in KeystreamSource.CIPHERS:
+        return KeystreamSource(name, seed=seed, threads=threads)
+    raise ValueError(f"Unknown data source: {name}")
@@ -0,0 +1,148 @@
+# device_offload.py
+import os
+import errno
+import stat
+import time
+import fcntl
+import ctypes
+import struct
+
+import block_io
+import drive_inventory
+
+# From <linux/fs.h>; each takes a uint64_t range[2] = {start, length}.
+BLKDISCARD = 0x1277
+BLKSECDISCARD = 0x127D
+BLKZEROOUT = 0x127F
+
+# From <linux/falloc.h>
+FALLOC_FL_KEEP_SIZE = 0x01
+FALLOC_FL_PUNCH_HOLE = 0x02
+
+# Size of each ioctl range. The kernel splits it into device-sized commands;
+# this only sets how often progress is reported and cancellation is checked.
+DEFAULT_RANGE_SIZE = 256 * 1024 * 1024
+
+# errno values meaning "this device/filesystem does not do that"
+_UNSUPPORTED_ERRNOS = (errno.EOPNOTSUPP, errno.EINVAL, errno.ENOTTY)
+
+# Whether a primitive guarantees zeroes on read-back. Devices are free to
+# return old data after a discard, and a secure discard only promises the
+# data is gone (eMMC and some SSDs read back 0xFF), so both are checked.
+DETERMINISTIC = {"zeroout": True, "secdiscard": False, "discard": False, "punch-hole": True}
+
+
+class OffloadUnsupported(Exception):
+    """The device rejected the primitive; the caller should try another."""
+
+
+def device_limits(path, inventory=None):
+    """The offload limits a block device advertises in sysfs (all 0 if unknown)."""
+    device = (inventory or drive_inventory.default_inventory()).get(path)
+    return {
+        "write_zeroes_max_bytes": device.write_zeroes_max_bytes if device else 0,
+        "discard_max_bytes": device.discard_max_bytes if device else 0,
+        "discard_granularity": device.discard_granularity if device else 0,
+    }
+
+
+def candidate_primitives(path, inventory=None):
+    """
+    Returns the offload primitives worth trying for `path`, best first.
+    Plain discard comes last since it does not promise zeroes.
+
+    Regular files get punch-hole. Block devices get BLKZEROOUT if they
+    advertise WRITE ZEROES / WRITE SAME, and the discard variants if they
+    advertise discard support at all.
+    """
+    if stat.S_ISREG(os.stat(path).st_mode):
+        return ["punch-hole"]
+    limits = device_limits(path, inventory)
+    primitives = []
+    if limits["write_zeroes_max_bytes"] > 0:
+        primitives.append("zeroout")
+    if limits["discard_max_bytes"] > 0:
+        primitives.extend(["secdiscard", "discard"])
+    return primitives
+
+
+_libc = None
+
+
+def _fallocate(fd, mode, offset, length):
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(None, use_errno=True)
+        _libc.fallocate.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_longlong, ctypes.c_longlong]
+    if _libc.fallocate(fd, mode, offset, length) != 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+
+
+def _issue(fd, primitive, offset, length):
+    if primitive == "punch-hole":
+        _fallocate(fd, FALLOC_FL_PUNCH_HOLE | FALLOC_FL_KEEP_SIZE, offset, length)
+        return
+    request = {"zeroout": BLKZEROOUT, "secdiscard": BLKSECDISCARD, "discard": BLKDISCARD}[primitive]
+    fcntl.ioctl(fd, request, struct.pack("QQ", offset, length))
+
+
+def run_primitive(path, primitive, total_size, progress=None, cancel_event=None, range_size=DEFAULT_RANGE_SIZE):
+    """
+    Applies `primitive` to [0, total_size) in large ranges.
+
+    Raises OffloadUnsupported if the first range is rejected as unsupported.
+    Returns the number of bytes covered, which is less than total_size only
+    when cancelled. The sub-sector tail of an odd-sized device is left to the
+    caller.
+    """
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        logical, _ = block_io.get_block_sizes(fd)
+        end = total_size if primitive == "punch-hole" else block_io.align_down(total_size, logical)
+        range_size = block_io.align_down(range_size, logical) or logical
+        offset = 0
+        while offset < end:
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            length = min(range_size, end - offset)
+            try:
+                _issue(fd, primitive, offset, length)
+            except OSError as e:
+                if offset == 0 and e.errno in _UNSUPPORTED_ERRNOS:
+                    raise OffloadUnsupported(f"{primitive}: {e.strerror}")
+                raise
+            offset += length
+            if progress is not None:
+                progress(offset)
+        os.fsync(fd)
+        return offset
+    finally:
+        os.close(fd)
+
+
+def offload_wipe(path, total_size, progress=None, cancel_event=None, inventory=None):
+    """
+    Tries each supported primitive in turn until one covers the device.
+
+    Returns a details dict with the primitive used, the ones that were
+    rejected and timing. offloadMethod is None if nothing was usable; the
+    caller then falls back to a streaming overwrite.
+    """
+    rejected = []
+    for primitive in candidate_primitives(path, inventory):
+        start = time.monotonic()
+        try:
+            covered = run_primitive(path, primitive, total_size, progress, cancel_event)
+        except OffloadUnsupported as e:
+            rejected.append(str(e))
+            continue
+        return {
+            "offloadMethod": primitive,
+            "deterministicZeroes": DETERMINISTIC[primitive],
+            "bytesCovered": covered,
+            "seconds": round(time.monotonic() - start, 3),
+            "rejected": rejected,
+            "limits": device_limits(path, inventory) if primitive != "punch-hole" else None,
+        }
+    return {"offloadMethod": None, "rejected": rejected}
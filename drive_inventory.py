@@ -0,0 +1,238 @@
+# drive_inventory.py
+import os
+import re
+import threading
+
+SECTOR = 512  # /sys/block/*/size is always in 512-byte units
+
+# Chunk size bounds for the overwrite engine
+MIN_CHUNK = 1024 * 1024
+MAX_CHUNK = 8 * 1024 * 1024
+# Outstanding writes for non-rotational devices
+MAX_QUEUE_DEPTH = 8
+
+_PCI_ADDRESS = re.compile(r'^[0-9a-f]{4}:[0-9a-f]{2}:[0-9a-f]{2}\.[0-7]$')
+
+
+class BlockDevice:
+    """One whole-disk block device as described by /sys/block/<name>."""
+    __slots__ = (
+        "name", "path", "sys_path", "size", "logical_block_size", "physical_block_size",
+        "rotational", "removable", "max_sectors_kb", "nr_requests", "discard_granularity",
+        "discard_max_bytes", "write_zeroes_max_bytes", "transport", "model", "serial",
+        "controller", "partitions",
+    )
+
+    def __init__(self, **fields):
+        for slot in self.__slots__:
+            setattr(self, slot, fields.get(slot))
+
+    def __repr__(self):
+        return f"BlockDevice({self.path}, {format_size(self.size)}, {self.transport})"
+
+    def as_drive_info(self):
+        """The dict shape list_physical_drives has always returned, plus the extra fields."""
+        return {
+            'path': self.path,
+            'model': self.model or 'N/A',
+            'size': format_size(self.size),
+            'serial': self.serial or 'N/A',
+            'size_bytes': self.size,
+            'rotational': self.rotational,
+            'transport': self.transport,
+        }
+
+    def tune(self):
+        """
+        Picks I/O parameters for the overwrite engine from the queue limits:
+        a few maximum-sized requests per chunk, aligned to the physical block,
+        and concurrent writes only for non-rotational devices.
+        """
+        request = max((self.max_sectors_kb or 0) * 1024, 128 * 1024)
+        chunk = min(MAX_CHUNK, max(MIN_CHUNK, request * 4))
+        alignment = self.physical_block_size or SECTOR
+        chunk -= chunk % alignment
+        if self.rotational:
+            queue_depth = 1
+        else:
+            queue_depth = min(MAX_QUEUE_DEPTH, max(2, (self.nr_requests or 16) // 8))
+        return {"chunk_size": chunk, "alignment": alignment, "queue_depth": queue_depth}
+
+
+def format_size(size):
+    """Human-readable size in lsblk's style (e.g. 931.5G)."""
+    if size is None:
+        return 'N/A'
+    value = float(size)
+    for unit in ("B", "K", "M", "G", "T", "P"):
+        if value < 1024 or unit == "P":
+            break
+        value /= 1024
+    text = f"{value:.1f}".rstrip("0").rstrip(".")
+    return f"{text}{unit}"
+
+
+def _read(path, default=None):
+    try:
+        with open(path, "rb") as f:
+            return f.read().decode("utf-8", "replace").strip()
+    except OSError:
+        return default
+
+
+def _read_int(path, default=None):
+    value = _read(path)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _transport(name, sys_path):
+    if name.startswith("nvme"):
+        return "nvme"
+    for marker, transport in (("/usb", "usb"), ("/ata", "sata"), ("virtio", "virtio"),
+                              ("/mmc", "mmc"), ("/host", "scsi")):
+        if marker in sys_path:
+            return transport
+    return "unknown"
+
+
+def _serial(dev_dir):
+    serial = _read(os.path.join(dev_dir, "device", "serial"))
+    if serial:
+        return serial
+    # SCSI/SATA: VPD page 0x80 (Unit Serial Number), 4-byte header
+    try:
+        with open(os.path.join(dev_dir, "device", "vpd_pg80"), "rb") as f:
+            page = f.read()
+        serial = page[4:4 + page[3]].decode("ascii", "replace").strip() if len(page) > 4 else ""
+        if serial:
+            return serial
+    except OSError:
+        pass
+    return _read(os.path.join(dev_dir, "serial"))
+
+
+def controller_key(name, sys_path):
+    """The PCI function nearest to the device (HBA, AHCI, USB host; each NVMe is its own)."""
+    controller = None
+    for part in sys_path.split(os.sep):
+        if _PCI_ADDRESS.match(part):
+            controller = part
+    return f"pci:{controller}" if controller else f"standalone:{name}"
+
+
+def read_device(name, sys_root="/sys", dev_root="/dev"):
+    """Builds a BlockDevice from /sys/block/<name>, or None if it does not exist."""
+    dev_dir = os.path.join(sys_root, "block", name)
+    if not os.path.isdir(dev_dir):
+        return None
+    sys_path = os.path.realpath(dev_dir)
+    queue = os.path.join(dev_dir, "queue")
+    model = _read(os.path.join(dev_dir, "device", "model"))
+    partitions = sorted(
+        os.path.join(dev_root, entry) for entry in os.listdir(dev_dir)
+        if os.path.exists(os.path.join(dev_dir, entry, "partition"))
+    )
+    return BlockDevice(
+        name=name,
+        path=os.path.join(dev_root, name),
+        sys_path=sys_path,
+        size=(_read_int(os.path.join(dev_dir, "size"), 0) or 0) * SECTOR,
+        logical_block_size=_read_int(os.path.join(queue, "logical_block_size"), SECTOR),
+        physical_block_size=_read_int(os.path.join(queue, "physical_block_size"), SECTOR),
+        rotational=_read(os.path.join(queue, "rotational")) == "1",
+        removable=_read(os.path.join(dev_dir, "removable")) == "1",
+        max_sectors_kb=_read_int(os.path.join(queue, "max_sectors_kb")),
+        nr_requests=_read_int(os.path.join(queue, "nr_requests")),
+        discard_granularity=_read_int(os.path.join(queue, "discard_granularity"), 0),
+        discard_max_bytes=_read_int(os.path.join(queue, "discard_max_bytes"), 0),
+        write_zeroes_max_bytes=_read_int(os.path.join(queue, "write_zeroes_max_bytes"), 0),
+        transport=_transport(name, sys_path),
+        model=model.strip() if model else None,
+        serial=_serial(dev_dir),
+        controller=controller_key(name, sys_path),
+        partitions=partitions,
+    )
+
+
+class Inventory:
+    """
+    Cached view of the physical block devices in /sys/block.
+
+    Every query compares a cheap signature (device names, sizes, major:minor,
+    disk sequence numbers and partition entries) with the one the cache was
+    built from, so hot-plugging, swapping, resizing or repartitioning a drive
+    invalidates it without re-reading every attribute on each refresh.
+    """
+
+    def __init__(self, sys_root="/sys", dev_root="/dev"):
+        self.sys_root = sys_root
+        self.dev_root = dev_root
+        self._lock = threading.Lock()
+        self._signature = None
+        self._devices = {}
+
+    def _names(self):
+        block_dir = os.path.join(self.sys_root, "block")
+        try:
+            names = sorted(os.listdir(block_dir))
+        except OSError:
+            return []
+        # Loop, RAM, device-mapper and md devices all live under devices/virtual.
+        return [n for n in names
+                if "/devices/virtual/" not in os.path.realpath(os.path.join(block_dir, n))]
+
+    def _current_signature(self, names):
+        signature = []
+        for n in names:
+            dev_dir = os.path.join(self.sys_root, "block", n)
+            # diskseq (Linux 5.15+) changes whenever a new disk appears, even in
+            # the same sdX slot; without it, fall back to the serial number.
+            diskseq = _read(os.path.join(dev_dir, "diskseq"))
+            try:
+                entries = tuple(sorted(e for e in os.listdir(dev_dir) if e.startswith(n)))
+            except OSError:
+                entries = ()
+            signature.append((n, _read(os.path.join(dev_dir, "size")), _read(os.path.join(dev_dir, "dev")),
+                              diskseq if diskseq is not None else _serial(dev_dir), entries))
+        return tuple(signature)
+
+    def invalidate(self):
+        with self._lock:
+            self._signature = None
+
+    def devices(self):
+        """All physical whole-disk devices with a non-zero size."""
+        names = self._names()
+        signature = self._current_signature(names)
+        with self._lock:
+            if signature != self._signature:
+                devices = (read_device(n, self.sys_root, self.dev_root) for n in names)
+                self._devices = {d.path: d for d in devices if d is not None and d.size}
+                self._signature = signature
+            return list(self._devices.values())
+
+    def get(self, path):
+        """The record for a whole-disk device node, or None (partitions, image files, unknown)."""
+        name = os.path.basename(os.path.realpath(path))
+        for device in self.devices():
+            if device.name == name:
+                return device
+        return None
+
+
+_default = None
+
+
+def default_inventory():
+    """The process-wide inventory rooted at /sys."""
+    global _default
+    if _default is None:
+        _default = Inventory()
+    return _default
+
+
+def get_device(path):
+    return default_inventory().get(path)
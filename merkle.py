@@ -0,0 +1,87 @@
+# merkle.py
+"""
+Merkle tree hashing as in RFC 6962 (Certificate Transparency), section 2.1:
+leaves and interior nodes are hashed with different one-byte prefixes, and a
+tree of n leaves splits at the largest power of two smaller than n.
+"""
+import hashlib
+
+
+def leaf_hash(data):
+    return hashlib.sha256(b"\x00" + data).digest()
+
+
+def node_hash(left, right):
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+
+def _split(n):
+    """Largest power of two smaller than n (n > 1)."""
+    k = 1
+    while k * 2 < n:
+        k *= 2
+    return k
+
+
+def root(hashes):
+    """Root over a list of leaf hashes."""
+    if not hashes:
+        return hashlib.sha256(b"").digest()
+    if len(hashes) == 1:
+        return hashes[0]
+    k = _split(len(hashes))
+    return node_hash(root(hashes[:k]), root(hashes[k:]))
+
+
+def inclusion_proof(index, hashes):
+    """Audit path for leaf `index`, ordered from the leaf up to the root."""
+    if len(hashes) <= 1:
+        return []
+    k = _split(len(hashes))
+    if index < k:
+        return inclusion_proof(index, hashes[:k]) + [root(hashes[k:])]
+    return inclusion_proof(index - k, hashes[k:]) + [root(hashes[:k])]
+
+
+def root_and_proofs(hashes):
+    """
+    The root and every leaf's audit path in one O(n log n) walk, instead of
+    calling inclusion_proof() (O(n) each) for every leaf of a batch.
+    """
+    if len(hashes) <= 1:
+        return root(hashes), [[] for _ in hashes]
+    k = _split(len(hashes))
+    left_root, left_proofs = root_and_proofs(hashes[:k])
+    right_root, right_proofs = root_and_proofs(hashes[k:])
+    for proof in left_proofs:
+        proof.append(right_root)
+    for proof in right_proofs:
+        proof.append(left_root)
+    return node_hash(left_root, right_root), left_proofs + right_proofs
+
+
+def root_from_proof(leaf, index, size, proof):
+    """
+    Recomputes the root from a leaf hash and its audit path (RFC 9162,
+    2.1.3.2). Raises ValueError if the path has the wrong length.
+    """
+    if not 0 <= index < size:
+        raise ValueError("Leaf index outside the tree.")
+    fn, sn = index, size - 1
+    result = leaf
+    for sibling in proof:
+        if sn == 0:
+            raise ValueError("Inclusion proof is too long.")
+        if fn % 2 == 1 or fn == sn:
+            result = node_hash(sibling, result)
+            if fn % 2 == 0:
+                while fn % 2 == 0 and fn != 0:
+                    fn >>= 1
+                    sn >>= 1
+        else:
+            result = node_hash(result, sibling)
+        fn >>= 1
+        sn >>= 1
+    if sn != 0:
+        raise ValueError("Inclusion proof is too short.")
+    return result
@@ -0,0 +1,246 @@
+# nvme_sanitize.py
+import os
+import re
+import time
+import fcntl
+import ctypes
+import struct
+
+# struct nvme_admin_cmd from <linux/nvme_ioctl.h> (72 bytes, no padding)
+_ADMIN_CMD = struct.Struct("=BBHIIIQQII6III")
+NVME_IOCTL_ADMIN_CMD = 0xC0484E41  # _IOWR('N', 0x41, struct nvme_admin_cmd)
+
+# Admin opcodes
+OPC_GET_LOG_PAGE = 0x02
+OPC_IDENTIFY = 0x06
+OPC_FORMAT_NVM = 0x80
+OPC_SANITIZE = 0x84
+
+LOG_SANITIZE_STATUS = 0x81
+NSID_ALL = 0xFFFFFFFF
+
+# Sanitize actions (CDW10 SANACT)
+SANACT_EXIT_FAILURE = 1
+SANACT_BLOCK_ERASE = 2
+SANACT_CRYPTO_ERASE = 4
+
+# Format NVM Secure Erase Settings (CDW10 SES)
+SES_USER_DATA_ERASE = 1
+SES_CRYPTO_ERASE = 2
+
+# Sanitize Status log, SSTAT bits 2:0
+SSTAT_NEVER = 0
+SSTAT_COMPLETED = 1
+SSTAT_IN_PROGRESS = 2
+SSTAT_FAILED = 3
+SSTAT_COMPLETED_NO_DEALLOC = 4
+
+DEFAULT_POLL_SECONDS = 2.0
+FORMAT_TIMEOUT_MS = 4 * 60 * 60 * 1000
+
+# Purge actions in order of preference: crypto erase takes seconds, the
+# others scale with capacity.
+ACTIONS = ("sanitize-crypto", "sanitize-block", "format-crypto", "format-erase")
+
+
+class NvmeError(Exception):
+    """An admin command failed or the controller reported a sanitize failure."""
+
+
+class AdminTransport:
+    """
+    Issues NVMe admin commands. The sanitizer only talks to this interface,
+    so it can run against real hardware or, in the tests, a simulated controller.
+    """
+
+    def admin(self, opcode, nsid=0, cdw10=0, cdw11=0, cdw12=0, cdw13=0, cdw14=0, cdw15=0,
+              data_len=0, timeout_ms=0):
+        """Returns (status, result_dword, data_bytes). Status 0 means success."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class IoctlTransport(AdminTransport):
+    """Admin commands through NVME_IOCTL_ADMIN_CMD on a controller or namespace node."""
+
+    def __init__(self, path):
+        self.fd = os.open(path, os.O_RDONLY)
+
+    def admin(self, opcode, nsid=0, cdw10=0, cdw11=0, cdw12=0, cdw13=0, cdw14=0, cdw15=0,
+              data_len=0, timeout_ms=0):
+        data = ctypes.create_string_buffer(data_len) if data_len else None
+        addr = ctypes.addressof(data) if data is not None else 0
+        cmd = bytearray(_ADMIN_CMD.pack(opcode, 0, 0, nsid, 0, 0, 0, addr, 0, data_len,
+                                        cdw10, cdw11, cdw12, cdw13, cdw14, cdw15, timeout_ms, 0))
+        status = fcntl.ioctl(self.fd, NVME_IOCTL_ADMIN_CMD, cmd, True)
+        result = _ADMIN_CMD.unpack(bytes(cmd))[-1]
+        return status, result, data.raw if data is not None else b""
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def parse_controller_identify(data):
+    """Picks the purge-related fields out of an Identify Controller page."""
+    oacs = struct.unpack_from("<H", data, 256)[0]
+    sanicap = struct.unpack_from("<I", data, 328)[0]
+    return {
+        "serial": data[4:24].decode("ascii", "replace").strip(),
+        "model": data[24:64].decode("ascii", "replace").strip(),
+        "formatSupported": bool(oacs & 0x2),
+        "cryptoErase": bool(sanicap & 0x1),
+        "blockErase": bool(sanicap & 0x2),
+        "overwrite": bool(sanicap & 0x4),
+        "formatCryptoErase": bool(data[524] & 0x4),
+    }
+
+
+def parse_sanitize_status(data):
+    """Decodes the Sanitize Status log page (LID 0x81)."""
+    sprog, sstat = struct.unpack_from("<HH", data, 0)
+    estimates = struct.unpack_from("<III", data, 8)
+    return {
+        "progress": sprog / 65536.0,
+        "status": sstat & 0x7,
+        "globalDataErased": bool(sstat & 0x100),
+        # Seconds; 0xFFFFFFFF means the controller gives no estimate
+        "estimates": {
+            "overwrite": estimates[0],
+            "blockErase": estimates[1],
+            "cryptoErase": estimates[2],
+        },
+    }
+
+
+def controller_path(path):
+    """/dev/nvme0n1 -> /dev/nvme0; other paths are returned unchanged."""
+    match = re.match(r"^(/dev/nvme\d+)n\d+(p\d+)?$", path)
+    return match.group(1) if match else path
+
+
+def namespace_id(path):
+    match = re.match(r"^/dev/nvme\d+n(\d+)", path)
+    return int(match.group(1)) if match else 1
+
+
+class NvmeSanitizer:
+    """
+    Drives an NVMe purge (NIST 800-88 Purge) through an AdminTransport:
+    identify, pick an action, issue Sanitize or Format NVM, and for Sanitize
+    poll the Sanitize Status log for real progress until it completes.
+    """
+
+    def __init__(self, transport, nsid=1, poll_seconds=DEFAULT_POLL_SECONDS, sleep=time.sleep):
+        self.transport = transport
+        self.nsid = nsid
+        self.poll_seconds = poll_seconds
+        self.sleep = sleep
+
+    def _admin(self, what, opcode, **kwargs):
+        status, result, data = self.transport.admin(opcode, **kwargs)
+        if status != 0:
+            raise NvmeError(f"{what} failed with NVMe status 0x{status:04x} "
+                            f"(SCT {(status >> 8) & 0x7}, SC 0x{status & 0xFF:02x})")
+        return result, data
+
+    def identify(self):
+        _, data = self._admin("Identify Controller", OPC_IDENTIFY, cdw10=1, data_len=4096)
+        return parse_controller_identify(data)
+
+    def sanitize_status(self):
+        numd = 512 // 4 - 1
+        _, data = self._admin("Get Log Page (Sanitize Status)", OPC_GET_LOG_PAGE, nsid=NSID_ALL,
+                              cdw10=LOG_SANITIZE_STATUS | (numd << 16), data_len=512)
+        return parse_sanitize_status(data)
+
+    def _current_format(self):
+        """Format NVM CDW10 bits that keep the namespace's LBA format and protection settings."""
+        _, ns = self._admin("Identify Namespace", OPC_IDENTIFY, nsid=self.nsid, cdw10=0, data_len=4096)
+        flbas, dps = ns[26], ns[29]
+        return ((flbas & 0xF)             # LBAF
+                | (flbas & 0x10)          # MSET
+                | ((dps & 0x7) << 5)      # PI
+                | ((dps & 0x8) << 5)      # PIL
+                | (((flbas >> 5) & 0x3) << 12))  # LBAFU
+
+    @staticmethod
+    def choose_action(caps):
+        """The fastest purge action the controller supports, or None."""
+        supported = {
+            "sanitize-crypto": caps["cryptoErase"],
+            "sanitize-block": caps["blockErase"],
+            "format-crypto": caps["formatSupported"] and caps["formatCryptoErase"],
+            "format-erase": caps["formatSupported"],
+        }
+        return next((action for action in ACTIONS if supported[action]), None)
+
+    def run(self, progress=None, action=None, cancel_event=None):
+        """Runs the purge and returns a details dict for the certificate."""
+        progress = progress or (lambda message, value: None)
+        caps = self.identify()
+        action = action or self.choose_action(caps)
+        if action is None:
+            raise NvmeError("Controller supports neither Sanitize nor Format NVM.")
+        details = {"purgeMethod": f"nvme-{action}", "controller": {"model": caps["model"], "serial": caps["serial"]}}
+
+        if action.startswith("format-"):
+            ses = SES_CRYPTO_ERASE if action == "format-crypto" else SES_USER_DATA_ERASE
+            progress(f"Issuing NVMe Format NVM ({action})...", 10)
+            start = time.monotonic()
+            self._admin("Format NVM", OPC_FORMAT_NVM, nsid=self.nsid, cdw10=self._current_format() | (ses << 9),
+                        timeout_ms=FORMAT_TIMEOUT_MS)
+            details["seconds"] = round(time.monotonic() - start, 1)
+            progress("NVMe Format NVM complete.", 100)
+            return details
+
+        status = self.sanitize_status()
+        if status["status"] == SSTAT_IN_PROGRESS:
+            progress("A sanitize operation is already running; monitoring it...", 0)
+        else:
+            sanact = SANACT_CRYPTO_ERASE if action == "sanitize-crypto" else SANACT_BLOCK_ERASE
+            progress(f"Issuing NVMe Sanitize ({action})...", 0)
+            self._admin("Sanitize", OPC_SANITIZE, cdw10=sanact)
+
+        start = time.monotonic()
+        estimate_key = "cryptoErase" if action == "sanitize-crypto" else "blockErase"
+        while True:
+            status = self.sanitize_status()
+            if status["status"] in (SSTAT_COMPLETED, SSTAT_COMPLETED_NO_DEALLOC):
+                break
+            if status["status"] == SSTAT_FAILED:
+                raise NvmeError("Controller reports the sanitize operation failed. The drive stays in "
+                                "sanitize failure mode until a new sanitize (or Exit Failure Mode) succeeds.")
+            if cancel_event is not None and cancel_event.is_set():
+                # Sanitize cannot be aborted; it even resumes after a power cycle.
+                raise NvmeError("Stopped monitoring; the sanitize operation continues on the controller.")
+            pct = int(status["progress"] * 100)
+            estimate = status["estimates"][estimate_key]
+            message = f"NVMe Sanitize: {pct}%"
+            if estimate not in (0, 0xFFFFFFFF):
+                remaining = max(0, estimate - (time.monotonic() - start))
+                message += f" (about {int(remaining // 60)}m {int(remaining % 60)}s left)"
+            progress(message, pct)
+            self.sleep(self.poll_seconds)
+
+        details["seconds"] = round(time.monotonic() - start, 1)
+        details["globalDataErased"] = status["globalDataErased"]
+        progress("NVMe Sanitize complete.", 100)
+        return details
+
+
+def purge(drive_path, progress=None, transport=None, action=None, cancel_event=None,
+          poll_seconds=DEFAULT_POLL_SECONDS):
+    """Purges an NVMe drive. Returns the details dict; raises NvmeError on failure."""
+    own_transport = transport is None
+    if own_transport:
+        transport = IoctlTransport(controller_path(drive_path))
+    try:
+        sanitizer = NvmeSanitizer(transport, nsid=namespace_id(drive_path), poll_seconds=poll_seconds)
+        return sanitizer.run(progress, action=action, cancel_event=cancel_event)
+    finally:
+        if own_transport:
+            transport.close()
@@ -0,0 +1,290 @@
+# pdf_reports.py
+"""
+PDF rendering for wipe certificates: one report per drive, or one
+consolidated report for a whole session with a summary table up front.
+
+The static part of the page (title, rules, footer) is drawn once per
+document into a reportlab form and stamped onto every page; its geometry is
+computed once per process. Long values are wrapped to the page width and
+carry on onto a new page instead of running off the bottom.
+"""
+import json
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+
+import certificate_format
+
+TITLE = "Secure Data Erasure Certificate"
+SESSION_TITLE = "Secure Data Erasure - Session Report"
+FOOTER = "Erased in accordance with NIST SP 800-88 Rev. 1"
+
+FONT = "Helvetica"
+BOLD = "Helvetica-Bold"
+FONT_SIZE = 10
+LEADING = 14
+MARGIN = 72
+# Columns of the session summary table: (heading, certificate field, share of the width)
+SUMMARY_COLUMNS = (
+    ("#", None, 0.05),
+    ("Drive", ("driveInfo", "path"), 0.15),
+    ("Serial", ("driveInfo", "serial"), 0.2),
+    ("Method", ("wipeDetails", "method"), 0.13),
+    ("Status", ("wipeDetails", "status"), 0.12),
+    ("Report ID", ("reportID",), 0.35),
+)
+
+
+@lru_cache(maxsize=None)
+def _template(title):
+    """Page size and the positions of the static page elements, computed once per title."""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    width, height = letter
+    return {
+        "pagesize": letter,
+        "width": width,
+        "height": height,
+        "title": (title, (width - stringWidth(title, BOLD, 14)) / 2, height - MARGIN + 10),
+        "rule_y": height - MARGIN,
+        "footer": (FOOTER, MARGIN, MARGIN / 2),
+        "top": height - MARGIN - 30,
+        "bottom": MARGIN,
+    }
+
+
+class _Document:
+    """A canvas plus a cursor that wraps text and starts new pages as needed."""
+
+    def __init__(self, output_path, title):
+        from reportlab.pdfgen import canvas
+        self.t = _template(title)
+        self.c = canvas.Canvas(output_path, pagesize=self.t["pagesize"])
+        self.c.setTitle(title)
+        self.page = 0
+        self._define_template()
+        self._start_page()
+
+    def _define_template(self):
+        c, t = self.c, self.t
+        c.beginForm("page")
+        text, x, y = t["title"]
+        c.setFont(BOLD, 14)
+        c.drawString(x, y, text)
+        c.line(MARGIN, t["rule_y"], t["width"] - MARGIN, t["rule_y"])
+        c.line(MARGIN, t["bottom"] - 10, t["width"] - MARGIN, t["bottom"] - 10)
+        text, x, y = t["footer"]
+        c.setFont(FONT, 8)
+        c.drawString(x, y, text)
+        c.endForm()
+
+    def _start_page(self):
+        if self.page:
+            self.c.showPage()
+        self.page += 1
+        self.c.doForm("page")
+        # "Page n of" + a form holding the total, which is only known at save()
+        self.c.setFont(FONT, 8)
+        label = f"Page {self.page} of "
+        x = self.t["width"] - MARGIN - 40
+        self.c.drawString(x, MARGIN / 2, label)
+        self.c.saveState()
+        self.c.translate(x + self.c.stringWidth(label, FONT, 8), MARGIN / 2)
+        self.c.doForm("pagecount")
+        self.c.restoreState()
+        self.y = self.t["top"]
+
+    def new_page(self):
+        self._start_page()
+
+    def ensure(self, height):
+        """Starts a new page unless `height` points still fit on this one."""
+        if self.y - height < self.t["bottom"]:
+            self._start_page()
+            return True
+        return False
+
+    def wrap(self, text, width, font=FONT, first_width=None):
+        return _wrap(str(text), font, width, first_width)
+
+    def heading(self, text):
+        self.ensure(2 * LEADING)
+        self.y -= 6
+        self.c.setFont(BOLD, FONT_SIZE + 1)
+        self.c.drawString(MARGIN, self.y, text)
+        self.y -= LEADING
+
+    def field(self, label, value, indent=18):
+        """'label: value', wrapped with a hanging indent; splits across pages."""
+        x = MARGIN + indent
+        width = self.t["width"] - MARGIN - x
+        # Continuation lines are indented, so they get the narrower width
+        lines = self.wrap(f"{label}: {value}", width - 12, first_width=width)
+        for i, line in enumerate(lines):
+            self.ensure(LEADING)
+            self.c.setFont(FONT, FONT_SIZE)
+            self.c.drawString(x + (12 if i else 0), self.y, line)
+            self.y -= LEADING
+
+    def table(self, columns, rows):
+        """Draws rows of cell strings; wrapped cells grow the row, the header repeats on every page."""
+        usable = self.t["width"] - 2 * MARGIN
+        widths = [share * usable for _, share in columns]
+
+        def header():
+            self.c.setFont(BOLD, FONT_SIZE)
+            x = MARGIN
+            for (name, _), w in zip(columns, widths):
+                self.c.drawString(x, self.y, name)
+                x += w
+            self.c.line(MARGIN, self.y - 4, MARGIN + usable, self.y - 4)
+            self.y -= LEADING + 2
+
+        self.ensure(2 * LEADING)
+        header()
+        for row in rows:
+            cells = [self.wrap(value, w - 4) for value, w in zip(row, widths)]
+            height = max(len(lines) for lines in cells) * LEADING
+            if self.ensure(height):
+                header()
+            self.c.setFont(FONT, FONT_SIZE)
+            x = MARGIN
+            for lines, w in zip(cells, widths):
+                for i, line in enumerate(lines):
+                    self.c.drawString(x, self.y - i * LEADING, line)
+                x += w
+            self.y -= height
+
+    def save(self):
+        self.c.beginForm("pagecount")
+        self.c.setFont(FONT, 8)
+        self.c.drawString(0, 0, str(self.page))
+        self.c.endForm()
+        self.c.save()
+
+
+def _wrap(text, font, width, first_width=None):
+    """
+    Greedy word wrap to `width` points (`first_width` for the first line).
+    Words wider than a line (seeds, hashes, compact JSON) are broken where
+    they reach the edge instead of running off the page.
+    """
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    space = stringWidth(" ", font, FONT_SIZE)
+    lines = []
+    for paragraph in text.split("\n"):
+        line, used = "", 0.0
+        for word in paragraph.split():
+            limit = first_width if first_width and not lines else width
+            word_width = stringWidth(word, font, FONT_SIZE)
+            if line and used + space + word_width <= limit:
+                line, used = f"{line} {word}", used + space + word_width
+                continue
+            if line and word_width > width:
+                # Too long for any line: start it right after the text before it
+                prefix, avail = f"{line} ", limit - used - space
+            else:
+                if line:
+                    lines.append(line)
+                    limit = width
+                prefix, avail = "", limit
+            while word_width > avail:
+                cut, taken = 0, 0.0
+                for ch in word:
+                    ch_width = stringWidth(ch, font, FONT_SIZE)
+                    if taken + ch_width > avail and (cut or prefix):
+                        break
+                    cut, taken = cut + 1, taken + ch_width
+                lines.append((prefix + word[:cut]).rstrip())
+                word, word_width, prefix, avail = word[cut:], word_width - taken, "", width
+            line, used = word, word_width
+        lines.append(line)
+    return lines or [""]
+
+
+def _format_value(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(", ", ": "), default=str)
+    return value
+
+
+def _draw_certificate(doc, cert_data):
+    for key, value in cert_data.items():
+        if key in certificate_format.SIGNATURE_FIELDS:
+            continue
+        if isinstance(value, dict):
+            doc.heading(f"{key}:")
+            for sub_key, sub_value in value.items():
+                doc.field(sub_key, _format_value(sub_value))
+        else:
+            doc.field(key, _format_value(value), indent=0)
+    if "signatureFormat" in cert_data:
+        doc.heading("signature:")
+        doc.field("format", cert_data["signatureFormat"])
+        if cert_data.get("signatureAlgorithm"):
+            doc.field("algorithm", cert_data["signatureAlgorithm"])
+        if "batch" in cert_data:
+            batch = cert_data["batch"]
+            doc.field("batch", f"certificate {batch['index'] + 1} of {batch['size']}, root {batch['root']}")
+
+
+def write_certificate_pdf(cert_data, output_path):
+    """Writes the PDF report for one certificate."""
+    doc = _Document(output_path, TITLE)
+    _draw_certificate(doc, cert_data)
+    doc.save()
+    return output_path
+
+
+def _lookup(cert_data, path):
+    value = cert_data
+    for key in path:
+        value = value.get(key) if isinstance(value, dict) else None
+    return "" if value is None else value
+
+
+def write_session_report(cert_datas, output_path, batch=None):
+    """
+    Writes one PDF for a whole session: a summary table of every drive, the
+    batch signature details if the session was batch-signed, then each
+    certificate starting on its own page.
+    """
+    doc = _Document(output_path, SESSION_TITLE)
+    succeeded = sum(1 for cert in cert_datas if _lookup(cert, ("wipeDetails", "status")) == "Success")
+    doc.field("Drives", f"{len(cert_datas)} ({succeeded} succeeded)", indent=0)
+    if batch:
+        doc.field("Batch root", batch["root"], indent=0)
+        doc.field("Signature algorithm", batch.get("signatureAlgorithm"), indent=0)
+    doc.y -= LEADING
+    columns = [(name, share) for name, _, share in SUMMARY_COLUMNS]
+    rows = [[str(i + 1) if path is None else _lookup(cert, path) for _, path, _ in SUMMARY_COLUMNS]
+            for i, cert in enumerate(cert_datas)]
+    doc.table(columns, rows)
+    for cert in cert_datas:
+        doc.new_page()
+        _draw_certificate(doc, cert)
+    doc.save()
+    return output_path
+
+
+def _report_failure(future):
+    if future.exception() is not None:
+        print(f"❌ PDF report could not be written: {future.exception()}")
+
+
+class PdfWorker:
+    """
+    Renders PDFs on a background thread, in submission order, so writing
+    reports does not hold up the next wipe. submit() returns a Future.
+    """
+
+    def __init__(self):
+        self._pool = ThreadPoolExecutor(1, thread_name_prefix="pdf")
+
+    def submit(self, fn, *args):
+        future = self._pool.submit(fn, *args)
+        future.add_done_callback(_report_failure)
+        return future
+
+    def close(self, wait=True):
+        """Finishes (or with wait=False, abandons) the queued reports."""
+        self._pool.shutdown(wait=wait)
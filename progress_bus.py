@@ -0,0 +1,78 @@
+# progress_bus.py
+import threading
+from collections import OrderedDict
+
+DEFAULT_CAPACITY = 256
+DEFAULT_FPS = 20
+
+
+class ProgressBus:
+    """
+    Bounded, coalescing channel from worker threads to the UI thread.
+
+    Workers post (topic, key, payload) without blocking. Only the latest
+    payload per (topic, key) is kept, so a drive reporting progress a
+    thousand times between two UI frames costs the UI one update. Distinct
+    slots are capped at `capacity`; posts for new slots beyond that are
+    dropped and counted rather than blocking the writer.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._pending = OrderedDict()
+        self.posted = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def post(self, topic, key, payload):
+        """Queues `payload`, replacing any undelivered one for the same slot. Returns False if dropped."""
+        slot = (topic, key)
+        with self._lock:
+            self.posted += 1
+            if slot in self._pending:
+                self.coalesced += 1
+            elif len(self._pending) >= self.capacity:
+                self.dropped += 1
+                return False
+            self._pending[slot] = payload
+        return True
+
+    def drain(self):
+        """Takes everything pending, oldest slot first, as (topic, key, payload) tuples."""
+        with self._lock:
+            pending, self._pending = self._pending, OrderedDict()
+        return [(topic, key, payload) for (topic, key), payload in pending.items()]
+
+
+class TkPump:
+    """
+    Drains a ProgressBus on the Tk main loop with after() at a fixed frame
+    rate and hands each event to handlers[topic](key, payload). Widgets are
+    therefore only ever touched on the main thread.
+    """
+
+    def __init__(self, root, bus, handlers, fps=DEFAULT_FPS):
+        self.root = root
+        self.bus = bus
+        self.handlers = handlers
+        self.interval_ms = max(1, int(1000 / fps))
+        self._after_id = None
+
+    def start(self):
+        if self._after_id is None:
+            self._after_id = self.root.after(self.interval_ms, self._tick)
+
+    def stop(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _tick(self):
+        try:
+            for topic, key, payload in self.bus.drain():
+                handler = self.handlers.get(topic)
+                if handler is not None:
+                    handler(key, payload)
+        finally:
+            self._after_id = self.root.after(self.interval_ms, self._tick)
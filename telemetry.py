@@ -0,0 +1,230 @@
+# telemetry.py
+import os
+import sys
+import json
+import time
+import threading
+import contextlib
+
+# Environment variables that turn the optional outputs on
+TELEMETRY_ENV = "WIPER_TELEMETRY"      # path of a JSON-lines file, or "-" for stderr
+PROFILE_ENV = "WIPER_PROFILE"          # "cprofile", "tracemalloc" or "cprofile,tracemalloc"
+PROFILE_DIR_ENV = "WIPER_PROFILE_DIR"  # where profile dumps go (default: current directory)
+
+DEFAULT_INTERVAL = 0.5   # seconds between progress samples
+DEFAULT_WINDOW = 10.0    # seconds covered by the moving-average rate
+MB = 1000 * 1000
+
+
+class LatencyHistogram:
+    """
+    Per-write latencies in power-of-two microsecond buckets: bucket i holds
+    writes that took less than 2**i us (the last one holds everything slower).
+    """
+
+    BUCKETS = 28  # up to ~134 s
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        micros = int(seconds * 1e6)
+        self.counts[min(self.BUCKETS - 1, micros.bit_length())] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, pct):
+        """Upper bound, in seconds, of the bucket holding the pct-th percentile."""
+        if not self.count:
+            return 0.0
+        wanted = self.count * pct / 100.0
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= wanted:
+                return min(self.max, (1 << i) / 1e6)
+        return self.max
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "meanMs": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "p50Ms": round(self.percentile(50) * 1000, 3),
+            "p99Ms": round(self.percentile(99) * 1000, 3),
+            "maxMs": round(self.max * 1000, 3),
+            # Only non-empty buckets, keyed by their upper bound in microseconds
+            "bucketsUs": {str(1 << i): n for i, n in enumerate(self.counts) if n},
+        }
+
+
+class JsonLinesSink:
+    """Appends one JSON object per line to a file (or stderr for "-")."""
+
+    def __init__(self, path):
+        self._own = path != "-"
+        self._file = open(path, "a", encoding="utf-8") if self._own else sys.stderr
+        self._lock = threading.Lock()
+
+    def emit(self, record):
+        line = json.dumps(record, separators=(",", ":"))
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        if self._own:
+            self._file.close()
+
+
+def sink_from_env():
+    """The JSON-lines sink named by WIPER_TELEMETRY, or None."""
+    path = os.environ.get(TELEMETRY_ENV)
+    return JsonLinesSink(path) if path else None
+
+
+class PassTelemetry:
+    """
+    Throughput, latency and ETA for one pass over a device.
+
+    The pipeline calls record_write() for every write; the progress callback
+    calls update() with the bytes done so far and gets a sample back at most
+    every `interval` seconds (and always at the end), so reporting no longer
+    depends on the device size being a multiple of anything.
+    """
+
+    def __init__(self, total_bytes, label="", sink=None, interval=DEFAULT_INTERVAL,
+                 window=DEFAULT_WINDOW, clock=time.monotonic, start_bytes=0):
+        self.total_bytes = total_bytes
+        self.start_bytes = start_bytes  # already written when a resumed pass starts
+        self.label = label
+        self.sink = sink
+        self.interval = interval
+        self.window = window
+        self.clock = clock
+        self.latency = LatencyHistogram()
+        self.io_seconds = 0.0
+        self.peak_rate = 0.0
+        self._lock = threading.Lock()
+        self._start = clock()
+        self._last_time = self._start
+        self._last_bytes = start_bytes
+        self._history = [(self._start, start_bytes)]
+        self.last_sample = None
+
+    def record_write(self, nbytes, seconds):
+        with self._lock:
+            self.latency.record(seconds)
+            self.io_seconds += seconds
+
+    def _moving_rate(self, now, done):
+        # Drop samples older than the window, but keep one to measure from.
+        while len(self._history) > 1 and now - self._history[1][0] >= self.window:
+            self._history.pop(0)
+        then, then_bytes = self._history[0]
+        self._history.append((now, done))
+        return (done - then_bytes) / (now - then) if now > then else 0.0
+
+    def update(self, done):
+        """Returns a progress sample if one is due, else None."""
+        now = self.clock()
+        finished = done >= self.total_bytes
+        if now - self._last_time < self.interval and not finished:
+            return None
+        instant = (done - self._last_bytes) / (now - self._last_time) if now > self._last_time else 0.0
+        average = self._moving_rate(now, done)
+        self.peak_rate = max(self.peak_rate, instant)
+        self._last_time, self._last_bytes = now, done
+        remaining = self.total_bytes - done
+        sample = {
+            "event": "progress",
+            "pass": self.label,
+            "bytesDone": done,
+            "totalBytes": self.total_bytes,
+            "percent": round(100.0 * done / self.total_bytes, 2) if self.total_bytes else 100.0,
+            "elapsed": round(now - self._start, 3),
+            "instantMBps": round(instant / MB, 1),
+            "averageMBps": round(average / MB, 1),
+            "etaSeconds": round(remaining / average, 1) if average > 0 else None,
+        }
+        self.last_sample = sample
+        if self.sink is not None:
+            self.sink.emit(sample)
+        return sample
+
+    def summary(self, generator_seconds=None):
+        """Totals for the certificate, emitted to the sink as a 'pass' record too."""
+        elapsed = self.clock() - self._start
+        done = self._last_bytes - self.start_bytes
+        with self._lock:
+            result = {
+                "seconds": round(elapsed, 3),
+                "averageMBps": round(done / elapsed / MB, 1) if elapsed > 0 else 0.0,
+                "peakMBps": round(self.peak_rate / MB, 1),
+                "ioSeconds": round(self.io_seconds, 3),
+                "writeLatency": self.latency.as_dict(),
+            }
+        if generator_seconds is not None:
+            result["generatorSeconds"] = round(generator_seconds, 3)
+        if self.sink is not None:
+            self.sink.emit(dict(result, event="pass", label=self.label))
+        return result
+
+
+def format_eta(seconds):
+    """'1h02m', '4m05s', '12s' or '?' when unknown."""
+    if seconds is None:
+        return "?"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+@contextlib.contextmanager
+def profiled(label, report):
+    """
+    Profiles the enclosed block when WIPER_PROFILE asks for it. cProfile stats
+    are dumped to <label>.prof, and tracemalloc's top allocation sites are
+    listed. Paths and peak memory are added to the `report` dict.
+
+    cProfile only sees the calling thread, which for a pass is the writer
+    (queue depth 1) or the supervising loop; generation time is measured
+    separately by the data source.
+    """
+    wanted = {p.strip() for p in os.environ.get(PROFILE_ENV, "").lower().split(",") if p.strip()}
+    if not wanted:
+        yield
+        return
+    out_dir = os.environ.get(PROFILE_DIR_ENV, ".")
+    safe_label = "".join(c if c.isalnum() else "_" for c in label).strip("_") or "wipe"
+    profiler = None
+    if "cprofile" in wanted:
+        import cProfile
+        profiler = cProfile.Profile()
+    if "tracemalloc" in wanted:
+        import tracemalloc
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            path = os.path.join(out_dir, f"{safe_label}.prof")
+            profiler.dump_stats(path)
+            report["cprofile"] = path
+        if "tracemalloc" in wanted:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            report["tracemalloc"] = {
+                "peakBytes": peak,
+                "top": [str(stat) for stat in snapshot.statistics("lineno")[:10]],
+            }
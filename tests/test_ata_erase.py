@@ -0,0 +1,179 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+import ata_erase
+
+
+class FakeHdparm(ata_erase.CommandRunner):
+    """
+    Stands in for hdparm: answers -I with a Security section and makes the
+    erase take `erase_seconds`. Commands are recorded in `calls`;
+    `on_call(args)` runs as each one starts.
+    """
+
+    def __init__(self, erase_seconds=0.0, advertised_minutes=2, supported=True, enhanced=True, frozen=False,
+                 locked=False, fail_erase=False, on_call=None):
+        self.erase_seconds = erase_seconds
+        self.advertised_minutes = advertised_minutes
+        self.supported = supported
+        self.enhanced = enhanced
+        self.frozen = frozen
+        self.locked = locked
+        self.fail_erase = fail_erase
+        self.on_call = on_call
+        self.calls = []
+
+    def identify_text(self):
+        lines = ["", "ATA device, with non-removable media", "Security: ",
+                 "\tMaster password revision code = 65534",
+                 f"\t{'' if self.supported else 'not'}\tsupported", "\tnot\tenabled",
+                 f"\t{'' if self.locked else 'not'}\tlocked", f"\t{'' if self.frozen else 'not'}\tfrozen",
+                 "\tnot\texpired: security count"]
+        if self.enhanced:
+            lines.append("\t\tsupported: enhanced erase")
+        if self.advertised_minutes is not None:
+            lines.append(f"\t{self.advertised_minutes}min for SECURITY ERASE UNIT. "
+                         f"{self.advertised_minutes * 2}min for ENHANCED SECURITY ERASE UNIT.")
+        lines.append("Checksum: correct")
+        return "\n".join(lines) + "\n"
+
+    async def start(self, *args):
+        self.calls.append(args)
+        if self.on_call:
+            self.on_call(args)
+        return _FakeProcess(self, args)
+
+
+class _FakeProcess:
+    def __init__(self, fake, args):
+        self.fake, self.args = fake, args
+        self.returncode = None
+
+    async def communicate(self):
+        if any(a.startswith("--security-erase") for a in self.args):
+            await asyncio.sleep(self.fake.erase_seconds)
+            self.returncode = 5 if self.fake.fail_erase else 0
+            return b"", b"SG_IO: bad/missing sense data" if self.fake.fail_erase else b""
+        self.returncode = 0
+        if "-I" in self.args:
+            return self.fake.identify_text().encode(), b""
+        return b"", b""
+
+    async def wait(self):
+        await self.communicate()
+        return self.returncode
+
+
+def erase(fake, cancel_event=None, **kwargs):
+    messages = []
+    job = ata_erase.AtaEraseJob("/dev/sdz", runner=fake, progress=lambda m, v: messages.append((m, v)), **kwargs)
+    return asyncio.run(job.run(cancel_event)), messages
+
+
+def test_parse_security_section():
+    security = ata_erase.parse_security(FakeHdparm(advertised_minutes=508, frozen=True).identify_text())
+    assert security == {"supported": True, "enabled": False, "locked": False, "frozen": True,
+                        "enhancedSupported": True, "eraseMinutes": 508, "enhancedEraseMinutes": 1016}
+    assert ata_erase.parse_security("no security section")["supported"] is False
+
+
+def test_enhanced_erase_is_preferred():
+    fake = FakeHdparm()
+    details, messages = erase(fake)
+    assert [args[1:-1] for args in fake.calls] == [
+        ("-I",),
+        ("--user-master", "u", "--security-set-pass", "p"),
+        ("--user-master", "u", "--security-erase-enhanced", "p"),
+    ]
+    assert all(args[-1] == "/dev/sdz" for args in fake.calls)
+    assert details["purgeMethod"] == "ata-enhanced-security-erase"
+    assert details["advertisedMinutes"] == 4
+    assert messages[-1] == ("ENHANCED SECURITY ERASE complete.", 100)
+
+
+@pytest.mark.parametrize("fake, enhanced", [(FakeHdparm(enhanced=False), None), (FakeHdparm(), False)])
+def test_normal_erase_without_enhanced_support_or_when_asked(fake, enhanced):
+    details, _ = erase(fake, enhanced=enhanced)
+    assert fake.calls[-1][3] == "--security-erase"
+    assert details == {"purgeMethod": "ata-security-erase", "advertisedMinutes": 2, "seconds": details["seconds"]}
+
+
+@pytest.mark.parametrize("fake, error", [
+    (FakeHdparm(supported=False), "does not support"),
+    (FakeHdparm(frozen=True), "frozen"),
+    (FakeHdparm(locked=True), "locked"),
+])
+def test_unusable_security_state_stops_before_setting_a_password(fake, error):
+    with pytest.raises(ata_erase.AtaEraseError, match=error):
+        erase(fake)
+    assert [args[1] for args in fake.calls] == ["-I"]
+
+
+def test_failed_erase_reports_hdparm_stderr():
+    with pytest.raises(ata_erase.AtaEraseError, match="(?s)SECURITY ERASE failed.*bad/missing sense data"):
+        erase(FakeHdparm(fail_erase=True))
+
+
+def test_cancel_before_issue_sets_no_password():
+    cancel = threading.Event()
+    cancel.set()
+    fake = FakeHdparm()
+    with pytest.raises(ata_erase.AtaEraseError, match="Cancelled before the erase was issued"):
+        erase(fake, cancel)
+    assert [args[1] for args in fake.calls] == ["-I"]
+
+
+def test_cancel_after_setting_the_password_removes_it():
+    cancel = threading.Event()
+    fake = FakeHdparm(on_call=lambda args: cancel.set() if "--security-set-pass" in args else None)
+    with pytest.raises(ata_erase.AtaEraseError, match="password removed again"):
+        erase(fake, cancel)
+    assert fake.calls[-1][1:-1] == ("--user-master", "u", "--security-disable", "p")
+    assert not any("--security-erase" in arg for args in fake.calls for arg in args)
+
+
+def test_progress_ticks_while_the_erase_runs():
+    details, messages = erase(FakeHdparm(erase_seconds=0.25, advertised_minutes=1), tick_seconds=0.02)
+    ticks = [m for m, _ in messages if m.startswith("ENHANCED SECURITY ERASE:")]
+    assert len(ticks) >= 3
+    assert all("about 1m" in m and "s left" in m for m in ticks)
+    assert messages[-1][1] == 100
+    assert details["seconds"] >= 0.2
+
+
+def test_estimated_progress_is_held_below_100():
+    message = ata_erase.AtaEraseJob._progress_message
+    assert message("ERASE", 30, 120, None) == ("ERASE: ~25%, about 1m 30s left", 25)
+    assert message("ERASE", 500, 120, None) == ("ERASE: ~99%, about 0m 0s left", ata_erase.MAX_ESTIMATED_PERCENT)
+
+
+def test_progress_without_an_advertised_time():
+    _, messages = erase(FakeHdparm(erase_seconds=0.1, advertised_minutes=None), tick_seconds=0.02)
+    assert any("drive gives no estimate" in m and v == 0 for m, v in messages)
+
+
+def test_progress_notes_that_an_issued_erase_cannot_be_cancelled():
+    cancel = threading.Event()
+    fake = FakeHdparm(erase_seconds=0.1,
+                      on_call=lambda args: cancel.set() if "--security-erase-enhanced" in args else None)
+    details, messages = erase(fake, cancel, tick_seconds=0.02)
+    assert details["purgeMethod"] == "ata-enhanced-security-erase"
+    assert any("cannot be interrupted" in m for m, _ in messages)
+
+
+def test_erase_many_runs_jobs_concurrently_and_keeps_failures_in_order():
+    fakes = [FakeHdparm(erase_seconds=0.3), FakeHdparm(erase_seconds=0.3, frozen=True), FakeHdparm(erase_seconds=0.3)]
+    jobs = [ata_erase.AtaEraseJob(f"/dev/sd{c}", runner=fake) for c, fake in zip("abc", fakes)]
+    started = time.monotonic()
+    results = asyncio.run(ata_erase.erase_many(jobs))
+    assert time.monotonic() - started < 0.8
+    assert results[0]["purgeMethod"] == results[2]["purgeMethod"] == "ata-enhanced-security-erase"
+    assert isinstance(results[1], ata_erase.AtaEraseError)
+
+
+def test_secure_erase_runs_synchronously():
+    fake = FakeHdparm()
+    assert ata_erase.secure_erase("/dev/sdz", runner=fake)["purgeMethod"] == "ata-enhanced-security-erase"
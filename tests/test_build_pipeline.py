@@ -0,0 +1,241 @@
+import os
+import json
+import hashlib
+
+import pytest
+
+import build_pipeline as bp
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb" if isinstance(data, bytes) else "w") as f:
+        f.write(data)
+    return path
+
+
+def md5(path):
+    with open(path, "rb") as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "tree"
+    for i in range(20):
+        write(str(root / "live" / f"file{i}.bin"), os.urandom(1000 + i))
+    write(str(root / "isolinux" / "isolinux.cfg"), "default live\n")
+    write(str(root / "md5sum.txt"), "stale\n")
+    os.symlink("isolinux.cfg", root / "isolinux" / "link.cfg")
+    return str(root)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_checksum_cache_hashes_once(tree, tmp_path, workers):
+    paths = [os.path.join(tree, "live", f"file{i}.bin") for i in range(20)]
+    cache = bp.ChecksumCache(str(tmp_path / "checksums.json"))
+    assert cache.digests(paths, "md5", workers) == [md5(p) for p in paths]
+    assert (cache.hits, cache.misses) == (0, 20)
+    cache.save()
+
+    reloaded = bp.ChecksumCache(str(tmp_path / "checksums.json"))
+    assert reloaded.digests(paths, "md5", workers) == [md5(p) for p in paths]
+    assert (reloaded.hits, reloaded.misses) == (20, 0)
+
+
+def test_checksum_cache_notices_changes_and_follows_hard_links(tree, tmp_path):
+    path = os.path.join(tree, "live", "file0.bin")
+    cache = bp.ChecksumCache()
+    cache.digests([path])
+    write(path, b"changed")
+    assert cache.digests([path]) == [hashlib.md5(b"changed").hexdigest()]
+    assert cache.misses == 2
+
+    os.link(path, tmp_path / "linked.bin")
+    cache.digests([str(tmp_path / "linked.bin")])
+    assert cache.hits == 1
+    # Algorithms are cached separately
+    assert cache.digests([path], "sha256") == [hashlib.sha256(b"changed").hexdigest()]
+
+
+def test_checksum_cache_ignores_a_corrupt_file(tmp_path):
+    write(str(tmp_path / "checksums.json"), "{not json")
+    assert bp.ChecksumCache(str(tmp_path / "checksums.json")).digests([]) == []
+
+
+def test_write_checksums_matches_md5sum_format(tree):
+    count = bp.write_checksums(tree, bp.ChecksumCache(), workers=2)
+    assert count == 21  # the 20 files and isolinux.cfg; not md5sum.txt itself or the symlink
+    with open(os.path.join(tree, "md5sum.txt")) as f:
+        lines = f.read().splitlines()
+    expected = sorted(bp.list_files(tree, exclude={"md5sum.txt"}))
+    assert [line.split("  ", 1)[1] for line in lines] == [f"./{rel}" for rel in expected]
+    for line in lines:
+        digest, rel = line.split("  ./", 1)
+        assert digest == md5(os.path.join(tree, rel))
+    assert not any("link.cfg" in line or "md5sum.txt" in line for line in lines)
+
+
+def test_link_tree_stages_hard_links(tree, tmp_path):
+    dest = str(tmp_path / "staged")
+    bp.link_tree(tree, dest, skip={os.path.join("live", "file3.bin"), "md5sum.txt"})
+    source = os.path.join(tree, "live", "file0.bin")
+    staged = os.path.join(dest, "live", "file0.bin")
+    assert os.stat(source).st_ino == os.stat(staged).st_ino
+    assert not os.path.exists(os.path.join(dest, "live", "file3.bin"))
+    assert not os.path.exists(os.path.join(dest, "md5sum.txt"))
+    assert os.readlink(os.path.join(dest, "isolinux", "link.cfg")) == "isolinux.cfg"
+    assert len(bp.list_files(dest)) == 20
+
+
+def test_tree_digest_tracks_content_names_modes_and_links(tree):
+    cache = bp.ChecksumCache()
+    digest = bp.tree_digest(tree, cache)
+    assert bp.tree_digest(tree, cache) == digest
+
+    cfg = os.path.join(tree, "isolinux", "isolinux.cfg")
+    write(cfg, "default other\n")
+    changed = bp.tree_digest(tree, cache)
+    assert changed != digest
+
+    os.chmod(cfg, 0o755)
+    assert bp.tree_digest(tree, cache) != changed
+    changed = bp.tree_digest(tree, cache)
+
+    os.remove(os.path.join(tree, "isolinux", "link.cfg"))
+    os.symlink("elsewhere.cfg", os.path.join(tree, "isolinux", "link.cfg"))
+    assert bp.tree_digest(tree, cache) != changed
+
+
+def test_stage_cache_builds_once_per_input(tmp_path):
+    ticks = iter(range(100))
+    cache = bp.StageCache(str(tmp_path / "cache"), clock=lambda: next(ticks))
+    builds = []
+
+    def build(out):
+        builds.append(out)
+        write(os.path.join(out, "result.txt"), "built")
+
+    first = cache.run("demo", {"input": 1}, build)
+    assert cache.run("demo", {"input": 1}, build) == first
+    second = cache.run("demo", {"input": 2}, build)
+    assert second != first and len(builds) == 2
+    with open(os.path.join(first, "result.txt")) as f:
+        assert f.read() == "built"
+    with open(os.path.join(first, ".complete")) as f:
+        assert json.load(f) == {"input": 1}
+    assert [t["cached"] for t in cache.timings] == [False, True, False]
+    assert all(t["seconds"] == 1 for t in cache.timings)
+
+
+def test_stage_cache_does_not_keep_a_failed_build(tmp_path):
+    cache = bp.StageCache(str(tmp_path / "cache"))
+
+    def broken(out):
+        write(os.path.join(out, "half.txt"), "partial")
+        raise RuntimeError("build failed")
+
+    with pytest.raises(RuntimeError):
+        cache.run("demo", {"input": 1}, broken)
+    output = cache.run("demo", {"input": 1}, lambda out: write(os.path.join(out, "ok.txt"), "ok"))
+    assert sorted(os.listdir(output)) == [".complete", "ok.txt"]
+    assert os.listdir(tmp_path / "cache" / "demo") == [os.path.basename(output)]
+
+
+def test_stage_cache_prune_keeps_the_most_recently_used(tmp_path):
+    cache = bp.StageCache(str(tmp_path / "cache"))
+    outputs = [cache.run("demo", {"input": i}, lambda out: None) for i in range(4)]
+    for age, output in enumerate(reversed(outputs)):
+        os.utime(output, (1000 - age, 1000 - age))
+    cache.prune("demo", keep=2)
+    assert sorted(os.listdir(tmp_path / "cache" / "demo")) == sorted(os.path.basename(o) for o in outputs[2:])
+
+
+class FakeCommands:
+    """Stands in for the root-only tools: records commands and produces their outputs."""
+
+    def __init__(self):
+        self.commands = []
+        self.checksums = []
+
+    def __call__(self, cmd, privileged=False):
+        self.commands.append(cmd)
+        if cmd[0] == "mksquashfs":
+            write(cmd[2], f"squashfs of {cmd[1]} with {' '.join(cmd[5:])}")
+        elif cmd[:3] == ["xorriso", "-as", "mkisofs"]:
+            tree = cmd[-1]
+            with open(os.path.join(tree, "md5sum.txt")) as f:
+                self.checksums.append(f.read())
+            write(cmd[cmd.index("-o") + 1], "iso image")
+
+    def tools(self):
+        return [cmd[0] for cmd in self.commands]
+
+
+def test_squashfs_stage_rebuilds_only_for_new_app_or_profile(tmp_path, monkeypatch):
+    fake = FakeCommands()
+    monkeypatch.setattr(bp, "_run", fake)
+    cache = bp.StageCache(str(tmp_path / "cache"))
+    checksums = bp.ChecksumCache()
+    system = str(tmp_path / "cache" / "system" / "0123456789abcdef")
+    app = str(tmp_path / "dist" / "wiper_app")
+    write(os.path.join(app, "wiper_app"), "binary v1")
+
+    first = bp.build_squashfs(cache, system, app, "release", checksums)
+    assert fake.tools() == ["cp", "mkdir", "cp", "ln", "mksquashfs"]
+    assert fake.commands[-1][-4:] == bp.COMPRESSION_PROFILES["release"]
+    assert os.path.exists(os.path.join(first, "filesystem.squashfs"))
+
+    assert bp.build_squashfs(cache, system, app, "release", checksums) == first
+    assert len(fake.commands) == 5
+
+    dev = bp.build_squashfs(cache, system, app, "dev", checksums)
+    assert dev != first and fake.commands[-1][-6:] == bp.COMPRESSION_PROFILES["dev"]
+
+    write(os.path.join(app, "wiper_app"), "binary v2")
+    assert bp.build_squashfs(cache, system, app, "release", checksums) not in (first, dev)
+
+
+def test_iso_stage_swaps_in_the_squashfs_and_checksums_the_tree(tmp_path, monkeypatch):
+    fake = FakeCommands()
+    monkeypatch.setattr(bp, "_run", fake)
+    cache = bp.StageCache(str(tmp_path / "cache"))
+    base = str(tmp_path / "cache" / "base" / "aaaaaaaaaaaaaaaa")
+    old_squashfs = write(os.path.join(base, "iso", "live", "filesystem.squashfs"), "debian squashfs")
+    write(os.path.join(base, "iso", "isolinux", "isolinux.bin"), b"\0" * 2048)
+    write(os.path.join(base, "iso", "md5sum.txt"), "stale\n")
+    squashfs = str(tmp_path / "cache" / "squashfs" / "bbbbbbbbbbbbbbbb")
+    new_squashfs = write(os.path.join(squashfs, "filesystem.squashfs"), "customised squashfs")
+
+    image = bp.build_iso_image(cache, base, squashfs, bp.ChecksumCache(), workers=1)
+    [listing] = fake.checksums
+    assert f"{md5(new_squashfs)}  ./live/filesystem.squashfs\n" in listing
+    assert f"{md5(os.path.join(base, 'iso', 'isolinux', 'isolinux.bin'))}  ./isolinux/isolinux.bin\n" in listing
+    assert "md5sum.txt" not in listing and len(listing.splitlines()) == 2
+    assert sorted(os.listdir(image)) == [".complete", "image.iso"]  # the staging tree is gone
+    with open(old_squashfs) as f:
+        assert f.read() == "debian squashfs"
+
+    assert bp.build_iso_image(cache, base, squashfs, bp.ChecksumCache(), workers=1) == image
+    assert len(fake.checksums) == 1
+
+
+def test_checksum_command(tree, tmp_path, capsys):
+    cache_path = str(tmp_path / "checksums.json")
+    assert bp.main(["checksum", tree, "--cache", cache_path, "--workers", "2"]) == 0
+    assert "21 files" in capsys.readouterr().out
+    assert bp.main(["checksum", tree, "--cache", cache_path]) == 0
+    assert "(0 hashed, 21 from cache)" in capsys.readouterr().out
+
+
+def test_report_timings_appends_history(tmp_path, capsys):
+    history = str(tmp_path / "reports" / "build-timings.jsonl")
+    timings = [{"stage": "base", "key": "k1", "cached": True, "seconds": 0.5},
+               {"stage": "iso", "key": "k2", "cached": False, "seconds": 2.0}]
+    bp.report_timings(timings, history, profile="dev")
+    bp.report_timings(timings, history, profile="release")
+    assert "total" in capsys.readouterr().out
+    with open(history) as f:
+        records = [json.loads(line) for line in f]
+    assert [r["profile"] for r in records] == ["dev", "release"]
+    assert records[0]["totalSeconds"] == 2.5 and records[0]["stages"] == timings
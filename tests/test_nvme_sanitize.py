@@ -0,0 +1,191 @@
+import struct
+import threading
+
+import pytest
+
+import nvme_sanitize as nvme
+
+
+class SimulatedController(nvme.AdminTransport):
+    """
+    An in-memory NVMe controller. A sanitize completes after `sanitize_polls`
+    status reads; `fail_sanitize` makes it end in the failed state instead.
+    `flbas`/`dps` are the namespace's formatted LBA size and protection bytes.
+    """
+
+    def __init__(self, crypto_erase=True, block_erase=True, format_supported=True, format_crypto=True,
+                 sanitize_polls=3, fail_sanitize=False, sstat=nvme.SSTAT_NEVER, flbas=0, dps=0,
+                 estimates=(0xFFFFFFFF, 60, 5), model="SIMULATED NVME", serial="SIM0001"):
+        self.crypto_erase = crypto_erase
+        self.block_erase = block_erase
+        self.format_supported = format_supported
+        self.format_crypto = format_crypto
+        self.sanitize_polls = max(1, sanitize_polls)
+        self.fail_sanitize = fail_sanitize
+        self.flbas, self.dps = flbas, dps
+        self.estimates = estimates
+        self.model, self.serial = model, serial
+        self.sstat = sstat
+        self.polls = 0
+        self.commands = []
+
+    def _identify_controller(self):
+        data = bytearray(4096)
+        data[4:24] = self.serial.encode().ljust(20)[:20]
+        data[24:64] = self.model.encode().ljust(40)[:40]
+        struct.pack_into("<H", data, 256, 0x2 if self.format_supported else 0)
+        struct.pack_into("<I", data, 328, (0x1 if self.crypto_erase else 0) | (0x2 if self.block_erase else 0))
+        data[524] = 0x4 if self.format_crypto else 0
+        return bytes(data)
+
+    def _identify_namespace(self):
+        data = bytearray(4096)
+        data[26], data[29] = self.flbas, self.dps
+        return bytes(data)
+
+    def _sanitize_log(self):
+        data = bytearray(512)
+        if self.sstat == nvme.SSTAT_IN_PROGRESS:
+            self.polls += 1
+            if self.polls >= self.sanitize_polls:
+                self.sstat = nvme.SSTAT_FAILED if self.fail_sanitize else nvme.SSTAT_COMPLETED
+        in_progress = self.sstat == nvme.SSTAT_IN_PROGRESS
+        sprog = int(65535 * self.polls / self.sanitize_polls) if in_progress else 0xFFFF
+        sstat = self.sstat | (0x100 if self.sstat == nvme.SSTAT_COMPLETED else 0)
+        struct.pack_into("<HH", data, 0, sprog, sstat)
+        struct.pack_into("<III", data, 8, *self.estimates)
+        return bytes(data)
+
+    def admin(self, opcode, nsid=0, cdw10=0, cdw11=0, cdw12=0, cdw13=0, cdw14=0, cdw15=0,
+              data_len=0, timeout_ms=0):
+        self.commands.append((opcode, nsid, cdw10))
+        if opcode == nvme.OPC_IDENTIFY:
+            return 0, 0, self._identify_controller() if cdw10 == 1 else self._identify_namespace()
+        if opcode == nvme.OPC_GET_LOG_PAGE and cdw10 & 0xFF == nvme.LOG_SANITIZE_STATUS:
+            return 0, 0, self._sanitize_log()
+        if opcode == nvme.OPC_SANITIZE:
+            sanact = cdw10 & 0x7
+            if (sanact == nvme.SANACT_CRYPTO_ERASE and not self.crypto_erase) or \
+                    (sanact == nvme.SANACT_BLOCK_ERASE and not self.block_erase):
+                return 0x0002, 0, b""  # Invalid Field in Command
+            self.sstat, self.polls = nvme.SSTAT_IN_PROGRESS, 0
+            return 0, 0, b""
+        if opcode == nvme.OPC_FORMAT_NVM:
+            return (0, 0, b"") if self.format_supported else (0x0001, 0, b"")  # Invalid Command Opcode
+        return 0x0001, 0, b""
+
+    def issued(self, opcode):
+        return [cdw10 for op, _, cdw10 in self.commands if op == opcode]
+
+
+def run(controller, nsid=1, **kwargs):
+    messages = []
+    sanitizer = nvme.NvmeSanitizer(controller, nsid=nsid, poll_seconds=0, sleep=lambda seconds: None)
+    details = sanitizer.run(lambda message, value: messages.append((message, value)), **kwargs)
+    return details, messages
+
+
+def test_crypto_sanitize_polls_until_complete():
+    controller = SimulatedController(sanitize_polls=4)
+    details, messages = run(controller)
+    assert details["purgeMethod"] == "nvme-sanitize-crypto"
+    assert details["globalDataErased"] is True
+    assert details["controller"] == {"model": "SIMULATED NVME", "serial": "SIM0001"}
+    assert controller.issued(nvme.OPC_SANITIZE) == [nvme.SANACT_CRYPTO_ERASE]
+    percents = [value for message, value in messages if message.startswith("NVMe Sanitize:")]
+    assert percents == sorted(percents) and len(percents) == 3
+    assert messages[-1] == ("NVMe Sanitize complete.", 100)
+
+
+def test_progress_shows_the_controller_estimate():
+    _, messages = run(SimulatedController(estimates=(0xFFFFFFFF, 600, 300)))
+    assert any("left)" in message for message, _ in messages)
+    _, messages = run(SimulatedController(estimates=(0xFFFFFFFF, 0xFFFFFFFF, 0xFFFFFFFF)))
+    assert not any("left)" in message for message, _ in messages)
+
+
+@pytest.mark.parametrize("caps, expected", [
+    ({}, "sanitize-crypto"),
+    ({"crypto_erase": False}, "sanitize-block"),
+    ({"crypto_erase": False, "block_erase": False}, "format-crypto"),
+    ({"crypto_erase": False, "block_erase": False, "format_crypto": False}, "format-erase"),
+])
+def test_fastest_supported_action_is_chosen(caps, expected):
+    details, _ = run(SimulatedController(**caps))
+    assert details["purgeMethod"] == f"nvme-{expected}"
+
+
+def test_block_erase_sanitize_uses_block_sanact():
+    controller = SimulatedController(crypto_erase=False)
+    run(controller)
+    assert controller.issued(nvme.OPC_SANITIZE) == [nvme.SANACT_BLOCK_ERASE]
+
+
+def test_no_purge_support_is_an_error():
+    controller = SimulatedController(crypto_erase=False, block_erase=False, format_supported=False)
+    with pytest.raises(nvme.NvmeError, match="neither Sanitize nor Format"):
+        run(controller)
+    assert not controller.issued(nvme.OPC_SANITIZE) and not controller.issued(nvme.OPC_FORMAT_NVM)
+
+
+def test_format_keeps_the_namespace_format_and_sets_ses():
+    # LBAF 3, metadata at the end of the LBA (MSET), protection type 1 in the first bytes (PIL)
+    controller = SimulatedController(crypto_erase=False, block_erase=False, flbas=0x13, dps=0x9)
+    details, messages = run(controller, nsid=2)
+    assert details["purgeMethod"] == "nvme-format-crypto"
+    [cdw10] = controller.issued(nvme.OPC_FORMAT_NVM)
+    assert cdw10 & 0xF == 3
+    assert cdw10 & 0x10
+    assert (cdw10 >> 5) & 0x7 == 1
+    assert (cdw10 >> 8) & 0x1 == 1
+    assert (cdw10 >> 9) & 0x7 == nvme.SES_CRYPTO_ERASE
+    assert (nvme.OPC_FORMAT_NVM, 2, cdw10) in controller.commands
+    assert messages[-1] == ("NVMe Format NVM complete.", 100)
+
+
+def test_format_user_data_erase():
+    controller = SimulatedController(crypto_erase=False, block_erase=False, format_crypto=False)
+    run(controller)
+    [cdw10] = controller.issued(nvme.OPC_FORMAT_NVM)
+    assert (cdw10 >> 9) & 0x7 == nvme.SES_USER_DATA_ERASE
+
+
+def test_rejected_command_reports_the_nvme_status():
+    with pytest.raises(nvme.NvmeError, match=r"Sanitize failed with NVMe status 0x0002 \(SCT 0, SC 0x02\)"):
+        run(SimulatedController(crypto_erase=False), action="sanitize-crypto")
+
+
+def test_failed_sanitize_is_an_error():
+    with pytest.raises(nvme.NvmeError, match="sanitize failure mode"):
+        run(SimulatedController(fail_sanitize=True))
+
+
+def test_sanitize_already_running_is_monitored_not_reissued():
+    controller = SimulatedController(sstat=nvme.SSTAT_IN_PROGRESS)
+    details, messages = run(controller)
+    assert controller.issued(nvme.OPC_SANITIZE) == []
+    assert "already running" in messages[0][0]
+    assert details["globalDataErased"] is True
+
+
+def test_cancel_stops_monitoring_only():
+    cancel = threading.Event()
+    cancel.set()
+    controller = SimulatedController(sanitize_polls=10)
+    with pytest.raises(nvme.NvmeError, match="continues on the controller"):
+        run(controller, cancel_event=cancel)
+    assert controller.sstat == nvme.SSTAT_IN_PROGRESS
+
+
+def test_purge_uses_the_given_transport():
+    controller = SimulatedController()
+    details = nvme.purge("/dev/nvme0n1", transport=controller, poll_seconds=0)
+    assert details["purgeMethod"] == "nvme-sanitize-crypto"
+
+
+def test_device_paths():
+    assert nvme.controller_path("/dev/nvme0n1") == "/dev/nvme0"
+    assert nvme.controller_path("/dev/nvme12n3p2") == "/dev/nvme12"
+    assert nvme.controller_path("/dev/sda") == "/dev/sda"
+    assert nvme.namespace_id("/dev/nvme0n3") == 3
+    assert nvme.namespace_id("/dev/sda") == 1
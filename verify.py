@@ -1,12 +1,114 @@
 # verify_certificate.py
+import os
+import csv
+import sys
+import glob
 import json
 import base64
-import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.asymmetric import padding, ed25519
 from cryptography.hazmat.primitives import serialization
 from cryptography.exceptions import InvalidSignature
 
+import certificate_format
+import merkle
+
+# Certificates handed to each worker process at a time
+BULK_CHUNK_SIZE = 64
+
+def load_public_key(public_key_path):
+    with open(public_key_path, "rb") as f:
+        return serialization.load_pem_public_key(f.read())
+
+def verify_bytes(public_key, signature, message):
+    """Raises InvalidSignature unless `signature` is valid for `message` (RSA-PSS or Ed25519 key)."""
+    if isinstance(public_key, ed25519.Ed25519PublicKey):
+        public_key.verify(signature, message)
+        return
+    public_key.verify(
+        signature,
+        message,
+        padding.PSS(
+            mgf=padding.MGF1(hashes.SHA256()),
+            salt_length=padding.PSS.MAX_LENGTH
+        ),
+        hashes.SHA256()
+    )
+
+# Batch roots whose signature was already checked in this process, so the
+# certificates of one session cost one signature check plus cheap hashing.
+# Entries are keyed by the public key's DER bytes, never by object identity.
+_verified_batches = set()
+
+def _key_bytes(public_key):
+    return public_key.public_bytes(serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+
+def check_signature(public_key, data):
+    """
+    Checks a parsed certificate against `public_key`.
+
+    Returns the signature format. Raises InvalidSignature,
+    certificate_format.PayloadMismatch or MalformedCertificate.
+    """
+    message, signature, fmt = certificate_format.signed_message(data)
+    if fmt == certificate_format.MERKLE_FORMAT:
+        cache_key = (_key_bytes(public_key), message, signature)
+        if cache_key not in _verified_batches:
+            verify_bytes(public_key, signature, message)
+            _verified_batches.add(cache_key)
+        return fmt
+    verify_bytes(public_key, signature, message)
+    return fmt
+
+def _manifest_failure(manifest_path, reason):
+    result = {"path": manifest_path, "status": "invalid", "reason": reason,
+              "reportID": None, "format": certificate_format.MERKLE_FORMAT}
+    return dict(total=1, valid=0, invalid=1, malformed=0, results=[result])
+
+def verify_batch_manifest(manifest_path, public_key_path):
+    """
+    Checks a session's BATCH-*.json manifest with a single signature
+    verification: recomputes the Merkle root from the listed leaf hashes and
+    checks each listed certificate's payload hashes to its leaf.
+    Returns the bulk summary dict.
+    """
+    public_key = load_public_key(public_key_path)
+    try:
+        with open(manifest_path, 'rb') as f:
+            manifest = json.loads(f.read())
+    except OSError as e:
+        return _manifest_failure(manifest_path, f"Cannot read file: {e.strerror}")
+    except ValueError:
+        return _manifest_failure(manifest_path, "Not valid JSON.")
+    if not certificate_format.is_batch_manifest(manifest):
+        return _manifest_failure(manifest_path, "Not a batch manifest.")
+    try:
+        leaves = [bytes.fromhex(leaf["leafHash"]) for leaf in manifest["leaves"]]
+    except (KeyError, TypeError, ValueError):
+        return _manifest_failure(manifest_path, "Batch manifest lists malformed leaves.")
+    root_hex = merkle.root(leaves).hex()
+    message = certificate_format.batch_message(root_hex, len(leaves))
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    paths = [os.path.join(base, os.path.basename(p)) for p in manifest.get("certificates", [])]
+    try:
+        if root_hex != manifest["root"]:
+            raise InvalidSignature()
+        verify_bytes(public_key, base64.b64decode(manifest["signature"]), message)
+    except (InvalidSignature, ValueError):
+        results = [{"path": p, "status": "invalid", "reason": "Batch signature is not valid.",
+                    "reportID": None, "format": certificate_format.MERKLE_FORMAT} for p in paths]
+    else:
+        # The signature is known good; each certificate only has to hash to its leaf.
+        _verified_batches.add((_key_bytes(public_key), message, base64.b64decode(manifest["signature"])))
+        results = [classify(p, public_key) for p in paths]
+        for result, leaf in zip(results, manifest["leaves"]):
+            if result["status"] == "valid" and result["reportID"] != leaf.get("reportID"):
+                result["status"], result["reason"] = "invalid", "Certificate is not the one listed in the manifest."
+    counts = {status: sum(1 for r in results if r["status"] == status) for status in ("valid", "invalid", "malformed")}
+    return dict(total=len(results), **counts, results=results)
+
 def verify_certificate(json_path, public_key_path):
     """
     Verifies the digital signature of a JSON wipe certificate.
@@ -19,36 +121,16 @@ def verify_certificate(json_path, public_key_path):
 
     try:
         # 1. Load the public key
-        with open(public_key_path, "rb") as f:
-            public_key = serialization.load_pem_public_key(f.read())
+        public_key = load_public_key(public_key_path)
 
         # 2. Load the JSON certificate data
         with open(json_path, 'r') as f:
             data = json.load(f)
 
-        # 3. Separate the signature from the rest of the data.
-        # The signature must be verified against the original message.
-        if 'signature' not in data:
-            print("❌ ERROR: No 'signature' field found in the JSON file.")
-            return False
-            
-        signature_b64 = data.pop('signature')
-        signature = base64.b64decode(signature_b64)
-
-        # 4. Re-create the original message that was signed.
-        # It must be in the EXACT same format (indentation, encoding).
-        original_message = json.dumps(data, indent=4).encode('utf-8')
-
-        # 5. Perform the verification
-        public_key.verify(
-            signature,
-            original_message,
-            padding.PSS(
-                mgf=padding.MGF1(hashes.SHA256()),
-                salt_length=padding.PSS.MAX_LENGTH
-            ),
-            hashes.SHA256()
-        )
+        # 3. Verify the signature over the exact bytes that were signed: the
+        # canonical payload stored in the certificate, or for older
+        # certificates the indented JSON they were signed as.
+        check_signature(public_key, data)
 
         print("\n✅ SUCCESS: Signature is valid!")
         print("   The certificate is authentic and has not been tampered with.")
@@ -57,7 +139,10 @@ def verify_certificate(json_path, public_key_path):
     except FileNotFoundError as e:
         print(f"❌ ERROR: File not found - {e}")
         return False
-    except InvalidSignature:
+    except certificate_format.MalformedCertificate as e:
+        print(f"❌ ERROR: {e}")
+        return False
+    except (InvalidSignature, certificate_format.PayloadMismatch):
         print("\n❌ FAILED: Invalid Signature!")
         print("   The certificate is NOT authentic or has been TAMPERED with.")
         return False
@@ -65,11 +150,132 @@ def verify_certificate(json_path, public_key_path):
         print(f"❌ An unexpected error occurred: {e}")
         return False
 
+
+# ----------------------------------------------------------------------
+# Bulk verification
+# ----------------------------------------------------------------------
+
+_worker_key = None
+
+def _init_worker(public_key_path):
+    # Each worker parses the PEM once, not once per certificate.
+    global _worker_key
+    _worker_key = load_public_key(public_key_path)
+
+def classify(json_path, public_key=None):
+    """
+    Returns {path, status (valid/invalid/malformed), reason, reportID, format}
+    for one file; a batch manifest gets status "manifest" and is not checked.
+    """
+    result = {"path": json_path, "status": "malformed", "reason": "", "reportID": None, "format": None}
+    try:
+        with open(json_path, 'rb') as f:
+            data = json.loads(f.read())
+        if certificate_format.is_batch_manifest(data):
+            result["status"], result["format"] = "manifest", certificate_format.MERKLE_FORMAT
+            return result
+        if isinstance(data, dict):
+            result["reportID"] = data.get("reportID")
+        result["format"] = check_signature(public_key or _worker_key, data)
+        result["status"] = "valid"
+    except InvalidSignature:
+        result["status"], result["reason"] = "invalid", "Signature does not match the signed data."
+    except certificate_format.PayloadMismatch as e:
+        result["status"], result["reason"] = "invalid", str(e)
+    except (certificate_format.MalformedCertificate, ValueError) as e:
+        result["reason"] = str(e) or "Not valid JSON."
+    except OSError as e:
+        result["reason"] = f"Cannot read file: {e.strerror}"
+    return result
+
+def collect_paths(inputs, pattern="*.json"):
+    """
+    Expands inputs into certificate paths: directories (searched recursively
+    for `pattern`), glob patterns, '@manifest' files listing one path per line,
+    and plain file paths.
+    """
+    paths = []
+    for item in inputs:
+        if item.startswith("@"):
+            with open(item[1:]) as f:
+                base = os.path.dirname(os.path.abspath(item[1:]))
+                paths.extend(os.path.join(base, line.strip()) for line in f
+                             if line.strip() and not line.startswith("#"))
+        elif os.path.isdir(item):
+            paths.extend(sorted(glob.glob(os.path.join(item, "**", pattern), recursive=True)))
+        elif glob.has_magic(item):
+            paths.extend(sorted(glob.glob(item, recursive=True)))
+        else:
+            paths.append(item)
+    # Keep the first occurrence of each file
+    return list(dict.fromkeys(paths))
+
+def verify_many(paths, public_key_path, workers=None):
+    """
+    Verifies `paths` across a process pool. Returns the summary dict; batch
+    manifests found among the paths are listed under "manifests", not counted.
+    """
+    if workers == 1 or len(paths) < BULK_CHUNK_SIZE:
+        public_key = load_public_key(public_key_path)
+        results = [classify(path, public_key) for path in paths]
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(public_key_path,)) as pool:
+            results = list(pool.map(classify, paths, chunksize=BULK_CHUNK_SIZE))
+    manifests = [r["path"] for r in results if r["status"] == "manifest"]
+    results = [r for r in results if r["status"] != "manifest"]
+    counts = {status: sum(1 for r in results if r["status"] == status) for status in ("valid", "invalid", "malformed")}
+    return dict(total=len(results), **counts, results=results, manifests=manifests)
+
+def write_csv(summary, csv_path):
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=["path", "status", "reason", "reportID", "format"])
+        writer.writeheader()
+        writer.writerows(summary["results"])
+
+def bulk_main(argv):
+    parser = argparse.ArgumentParser(description="Verify many wipe certificates in parallel.")
+    parser.add_argument("inputs", nargs="+", help="certificate files, directories, globs or @manifest files")
+    parser.add_argument("--key", default="public_key.pem", help="public key (PEM)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--json", dest="json_path", help="write the full report as JSON")
+    parser.add_argument("--csv", dest="csv_path", help="write one row per certificate as CSV")
+    parser.add_argument("--batch", action="store_true",
+                        help="inputs are BATCH-*.json session manifests: one signature check per session")
+    args = parser.parse_args(argv)
+
+    if args.batch:
+        summary = {"total": 0, "valid": 0, "invalid": 0, "malformed": 0, "results": []}
+        for manifest_path in collect_paths(args.inputs, pattern="BATCH-*.json"):
+            part = verify_batch_manifest(manifest_path, args.key)
+            for field in ("total", "valid", "invalid", "malformed"):
+                summary[field] += part[field]
+            summary["results"].extend(part["results"])
+    else:
+        summary = verify_many(collect_paths(args.inputs), args.key, args.workers)
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(summary, f, indent=4)
+    if args.csv_path:
+        write_csv(summary, args.csv_path)
+
+    for r in summary["results"]:
+        if r["status"] != "valid":
+            print(f"❌ {r['status'].upper()}: {r['path']} - {r['reason']}")
+    if summary.get("manifests"):
+        print(f"ℹ️  Skipped {len(summary['manifests'])} batch manifest(s); check them with --batch.")
+    print(f"\n{summary['total']} certificates: {summary['valid']} valid, "
+          f"{summary['invalid']} invalid, {summary['malformed']} malformed.")
+    return 0 if summary["valid"] == summary["total"] else 1
+
 if __name__ == '__main__':
-    if len(sys.argv) != 3:
+    if len(sys.argv) == 3 and not sys.argv[1].startswith("-") and os.path.isfile(sys.argv[1]) \
+            and sys.argv[2].endswith(".pem"):
+        cert_file = sys.argv[1]
+        key_file = sys.argv[2]
+        sys.exit(0 if verify_certificate(cert_file, key_file) else 1)
+    if len(sys.argv) < 2:
         print("Usage: python3 verify_certificate.py <path_to_certificate.json> <path_to_public_key.pem>")
+        print("       python3 verify_certificate.py [--key public_key.pem] [--json report.json] [--csv report.csv]"
+              " <files, directories, globs or @manifest>...")
         sys.exit(1)
-
-    cert_file = sys.argv[1]
-    key_file = sys.argv[2]
-    verify_certificate(cert_file, key_file)
\ No newline at end of file
+    sys.exit(bulk_main(sys.argv[1:]))
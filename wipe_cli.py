@@ -0,0 +1,297 @@
+# wipe_cli.py
+"""
+Headless entry point for wiping many drives at once, e.g. over SSH or from
+a minimal live image without X.
+
+Drives are picked by selectors (shell-style globs on path, serial or model)
+or by a JSON job file. A dry run prints the matching drives together with a
+confirmation token; the real run needs that token, so exactly the reviewed
+set of drives is erased. Progress and results are streamed to stdout as
+JSON lines; once every drive is done, the certificates of the successful
+wipes are signed as one batch (see certificate_generator.create_certificates).
+
+    python3 wipe_cli.py --list
+    python3 wipe_cli.py --serial 'WD-*' --method overwrite --dry-run
+    python3 wipe_cli.py --serial 'WD-*' --method overwrite --confirm ERASE-1a2b3c4d
+    python3 wipe_cli.py --job decommission.json --confirm ERASE-1a2b3c4d
+
+Job file:
+
+    {
+      "method": "overwrite",
+      "options": {"verify": "sample", "direct_io": true, "plan": "dod-3pass"},
+      "drives": [{"serial": "WD-*"}, {"path": "/dev/nvme*n1", "method": "purge"}]
+    }
+"""
+import os
+import sys
+import json
+import time
+import fnmatch
+import hashlib
+import argparse
+
+import wiping_core
+import progress_bus
+import drive_inventory
+import wipe_plans
+
+METHODS = ("overwrite", "offload", "purge")
+# wipe_drive keyword arguments a job file may set
+WIPE_OPTIONS = ("data_source", "generator_threads", "direct_io", "producers", "queue_depth", "verify",
+                "sample_percent", "resume", "checkpoint_interval", "chunk_size", "plan",
+                "tolerate_bad_sectors", "checkpoint_dir")
+SELECTOR_FIELDS = ("path", "serial", "model")
+OUTPUT_INTERVAL = 0.5  # seconds between progress lines per drive
+# PDF output: one per drive, one consolidated session report, both, or none
+PDF_MODES = ("each", "session", "both", "none")
+
+
+class UsageError(Exception):
+    """Bad selectors, job file or confirmation token."""
+
+
+def emit(event, **fields):
+    """Writes one JSON line to stdout."""
+    sys.stdout.write(json.dumps(dict(fields, event=event), default=str) + "\n")
+    sys.stdout.flush()
+
+
+def matches(drive, selector):
+    """True if every field of `selector` globs the corresponding drive field."""
+    return all(fnmatch.fnmatchcase(str(drive.get(field) or ""), pattern)
+               for field, pattern in selector.items() if field in SELECTOR_FIELDS)
+
+
+def _image_drive(path):
+    """A drive_info dict for an explicitly named image file, which sysfs does not list."""
+    size = os.path.getsize(path)
+    return {"path": path, "model": "Image file", "serial": "N/A", "size": drive_inventory.format_size(size),
+            "size_bytes": size}
+
+
+def select_drives(drives, entries):
+    """
+    Resolves job entries (selector dicts with an optional per-entry method)
+    to [(drive_info, entry), ...]. Each drive is taken once, by the first
+    entry that matches it; an entry that matches nothing is an error.
+    """
+    chosen = {}
+    for entry in entries:
+        if not any(entry.get(field) for field in SELECTOR_FIELDS):
+            raise UsageError(f"Job entry {entry} has no path, serial or model selector.")
+        found = [d for d in drives if matches(d, entry)]
+        path = entry.get("path")
+        if not found and path and not any(c in path for c in "*?[") and os.path.isfile(path):
+            found = [_image_drive(path)]
+        if not found:
+            raise UsageError(f"No drive matches {json.dumps(entry)}.")
+        for drive in found:
+            chosen.setdefault(drive["path"], (drive, entry))
+    return list(chosen.values())
+
+
+def confirmation_token(selection, method_for):
+    """Short token bound to exactly these drives and methods."""
+    digest = hashlib.sha256()
+    for drive, entry in sorted(selection, key=lambda item: item[0]["path"]):
+        digest.update(f"{drive['path']}|{drive.get('serial')}|{drive.get('size_bytes')}|"
+                      f"{method_for(entry)}\n".encode())
+    return f"ERASE-{digest.hexdigest()[:8]}"
+
+
+def load_job(args):
+    """Returns (entries, default method, wipe options) from --job or the command line."""
+    options = {}
+    method = args.method
+    if args.job:
+        with open(args.job) as f:
+            job = json.load(f)
+        entries = job.get("drives") or []
+        method = method or job.get("method")
+        options.update(job.get("options") or {})
+    else:
+        entries = [{field: pattern} for field in SELECTOR_FIELDS for pattern in getattr(args, field) or []]
+    if not entries:
+        raise UsageError("No drives selected. Use --path/--serial/--model or --job.")
+    if args.verify is not None:
+        options["verify"] = None if args.verify == "none" else args.verify
+    if args.data_source is not None:
+        options["data_source"] = args.data_source
+    if args.direct_io is not None:
+        options["direct_io"] = args.direct_io
+    if args.resume:
+        options["resume"] = True
+    if args.tolerate_bad_sectors:
+        options["tolerate_bad_sectors"] = True
+    if args.checkpoint_dir is not None:
+        options["checkpoint_dir"] = args.checkpoint_dir
+    if args.plan is not None:
+        if os.path.isfile(args.plan):
+            with open(args.plan) as f:
+                options["plan"] = json.load(f)
+        else:
+            options["plan"] = args.plan
+    if "plan" in options:
+        # Checked now, so a typo fails the dry run rather than every drive
+        wipe_plans.get_plan(options["plan"])
+    unknown = set(options) - set(WIPE_OPTIONS)
+    if unknown:
+        raise UsageError(f"Unknown wipe option(s): {', '.join(sorted(unknown))}")
+    method = method or "overwrite"
+    for m in [method] + [e["method"] for e in entries if "method" in e]:
+        if m not in METHODS:
+            raise UsageError(f"Unknown wipe method: {m}")
+    return entries, method, options
+
+
+def run_batch(selection, method_for, options, per_controller, pdf, output_dir=None):
+    """
+    Wipes the selected drives in parallel, streaming events. Returns the
+    number of failures. `pdf` is one of PDF_MODES.
+    """
+    bus = progress_bus.ProgressBus()
+    scheduler = wiping_core.WipeScheduler(
+        per_controller=per_controller,
+        on_progress=lambda job: bus.post("progress", job.path, job),
+        on_complete=lambda job: bus.post("complete", job.path, job),
+    )
+    emit("start", drives=[{"path": d["path"], "serial": d.get("serial"), "model": d.get("model"),
+                           "method": method_for(e)} for d, e in selection])
+    for drive, entry in selection:
+        scheduler.submit(drive, method_for(entry), **options)
+
+    failures = 0
+    reported = 0
+    succeeded = []
+    try:
+        while reported < len(selection):
+            time.sleep(OUTPUT_INTERVAL)
+            for topic, path, job in bus.drain():
+                if topic == "progress" and not job.finished:
+                    emit("progress", path=path, status=job.status, progress=job.progress, message=job.message)
+                elif topic == "complete":
+                    reported += 1
+                    failures += 0 if job.result[0] else 1
+                    if job.result[0]:
+                        succeeded.append(job)
+                    emit("result", **_result_fields(job))
+    except KeyboardInterrupt:
+        emit("cancelling", reason="interrupted")
+        scheduler.cancel_all()
+        scheduler.wait()
+        for topic, path, job in bus.drain():
+            # A finished job can still have its last "progress" item queued
+            # next to its "complete" one; only the latter is a result.
+            if topic == "complete" and job.result is not None:
+                if job.result[0]:
+                    succeeded.append(job)
+                emit("result", **_result_fields(job))
+        _emit_certificates(succeeded, pdf, output_dir)
+        raise
+    _emit_certificates(succeeded, pdf, output_dir)
+    return failures
+
+
+def _result_fields(job):
+    fields = {"path": job.path, "status": job.status, "success": bool(job.result[0]), "message": job.result[1]}
+    if len(job.result) > 2:
+        fields["details"] = job.result[2]
+    return fields
+
+
+def _emit_certificates(jobs, pdf, output_dir=None):
+    """Batch-signs the certificates of all successful wipes and reports where they went."""
+    if not jobs:
+        return
+    # Imported only now: signing needs cryptography, PDFs need reportlab.
+    import certificate_generator
+    try:
+        paths, manifest, report = certificate_generator.create_certificates(
+            [(job.drive_info, job.method, job.result) for job in jobs],
+            pdf=pdf in ("each", "both"), session_report=pdf in ("session", "both"), output_dir=output_dir)
+    except Exception as e:
+        emit("certificates", error=str(e), drives=[job.path for job in jobs])
+        return
+    emit("certificates", manifest=manifest, sessionReport=report,
+         certificates=[{"path": job.path, "json": json_path, "pdf": pdf_path}
+                       for job, (json_path, pdf_path) in zip(jobs, paths)])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless multi-drive wiper (JSON-lines output).")
+    parser.add_argument("--list", action="store_true", help="list detected drives as JSON and exit")
+    parser.add_argument("--job", help="JSON job file (see module docstring)")
+    for field in SELECTOR_FIELDS:
+        parser.add_argument(f"--{field}", action="append", metavar="GLOB", help=f"select drives by {field}")
+    parser.add_argument("--method", choices=METHODS, help="default: overwrite")
+    parser.add_argument("--plan", help=f"overwrite pass plan: {', '.join(wipe_plans.PLANS)}, "
+                                       "or a JSON file with a custom list of passes")
+    parser.add_argument("--verify", choices=("sample", "full", "none"))
+    parser.add_argument("--data-source")
+    parser.add_argument("--direct-io", dest="direct_io", action="store_true", default=None)
+    parser.add_argument("--no-direct-io", dest="direct_io", action="store_false")
+    parser.add_argument("--resume", action="store_true", help="continue interrupted overwrites")
+    parser.add_argument("--checkpoint-dir", metavar="DIR",
+                        help="journal overwrite progress here, on persistent media such as the boot USB stick "
+                             "(default: $WIPER_CHECKPOINT_DIR; without either, overwrites are not resumable)")
+    parser.add_argument("--tolerate-bad-sectors", action="store_true",
+                        help="skip unwritable sectors (listed in the certificate) instead of failing")
+    parser.add_argument("--per-controller", type=int, default=wiping_core.DEFAULT_WIPES_PER_CONTROLLER,
+                        help="concurrent wipes per host controller")
+    parser.add_argument("--pdf", choices=PDF_MODES, default="each",
+                        help="PDF per drive, one session report, both, or none (default: each)")
+    parser.add_argument("--no-pdf", dest="pdf", action="store_const", const="none", help="same as --pdf none")
+    parser.add_argument("--output-dir", help="where certificates are written (default: current directory)")
+    parser.add_argument("--sync-history", metavar="DIR",
+                        help="copy the wipe history here when done, e.g. to a USB stick")
+    parser.add_argument("--dry-run", action="store_true", help="show the selection and its confirmation token")
+    parser.add_argument("--confirm", metavar="TOKEN", help="the token printed by --dry-run")
+    args = parser.parse_args(argv)
+
+    drives = wiping_core.list_physical_drives()
+    if args.list:
+        emit("drives", drives=drives)
+        return 0
+
+    try:
+        entries, method, options = load_job(args)
+        selection = select_drives(drives, entries)
+    except (UsageError, OSError, ValueError) as e:
+        emit("error", message=str(e))
+        return 2
+
+    def method_for(entry):
+        return entry.get("method", method)
+
+    token = confirmation_token(selection, method_for)
+    if args.dry_run or args.confirm is None:
+        emit("plan", confirm=token, drives=[{"path": d["path"], "serial": d.get("serial"), "model": d.get("model"),
+                                             "size": d.get("size"), "method": method_for(e)} for d, e in selection],
+             options=options)
+        if not args.dry_run:
+            emit("error", message="Nothing erased: re-run with --confirm " + token)
+            return 2
+        return 0
+    if args.confirm != token:
+        emit("error", message="Confirmation token does not match the selected drives; run --dry-run again.")
+        return 2
+
+    try:
+        failures = run_batch(selection, method_for, options, args.per_controller, pdf=args.pdf,
+                             output_dir=args.output_dir)
+    except KeyboardInterrupt:
+        return 130
+    if args.sync_history:
+        import wipe_history
+        try:
+            with wipe_history.WipeHistory() as history:
+                emit("history", synced=args.sync_history, added=history.sync(args.sync_history))
+        except (OSError, wipe_history.sqlite3.Error) as e:
+            emit("history", error=str(e))
+    emit("summary", drives=len(selection), succeeded=len(selection) - failures, failed=failures)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,531 @@
+# wipe_engine.py
+import os
+import time
+import errno
+import queue
+import bisect
+import threading
+
+import block_io
+
+# Enough buffers for every producer to work on one chunk while the writer
+# holds a couple of contiguous chunks for a single pwritev().
+DEFAULT_RING_SIZE = 4
+MAX_IOV = 16
+_POLL_SECONDS = 0.1
+
+# Write errors a failing medium reports (EREMOTEIO carries SCSI sense data);
+# anything else, such as ENOSPC or EBADF, still ends the pass.
+MEDIUM_ERRORS = (errno.EIO, errno.ENODATA, errno.EREMOTEIO, errno.EILSEQ)
+# Bad-sector budget of a tolerant wipe before the drive is declared hopeless
+DEFAULT_MAX_BAD_BYTES = 16 * 1024 * 1024
+DEFAULT_MAX_RECOVERY_SECONDS = 600.0
+
+
+class WipeCancelled(Exception):
+    """Raised when a pass is stopped through its cancel event."""
+
+
+class CoverageError(RuntimeError):
+    """A pass wrote a byte range twice or left part of the device unwritten."""
+
+
+class TooManyBadSectors(IOError):
+    """A tolerant wipe used up its bad-sector budget: the drive is failing."""
+
+
+class CoverageTracker:
+    """
+    Records the byte ranges written during a pass as sorted, merged intervals
+    and proves at the end that [0, total_size) was written exactly once.
+    """
+
+    def __init__(self, total_size):
+        self.total_size = total_size
+        self._starts = []
+        self._ends = []
+        self._lock = threading.Lock()
+
+    def add(self, offset, size):
+        end = offset + size
+        with self._lock:
+            i = bisect.bisect_right(self._starts, offset)
+            if (i > 0 and self._ends[i - 1] > offset) or (i < len(self._starts) and self._starts[i] < end):
+                raise CoverageError(f"Range {offset}-{end} was written more than once.")
+            # Merge with the neighbours it touches so the list stays short.
+            if i > 0 and self._ends[i - 1] == offset:
+                i -= 1
+                self._ends[i] = end
+            else:
+                self._starts.insert(i, offset)
+                self._ends.insert(i, end)
+            if i + 1 < len(self._starts) and self._starts[i + 1] == self._ends[i]:
+                self._ends[i] = self._ends.pop(i + 1)
+                self._starts.pop(i + 1)
+
+    def contiguous(self):
+        """Bytes written without a gap from offset 0."""
+        with self._lock:
+            return self._ends[0] if self._starts and self._starts[0] == 0 else 0
+
+    def ranges(self):
+        with self._lock:
+            return list(zip(self._starts, self._ends))
+
+    def check_complete(self):
+        ranges = self.ranges()
+        if ranges != [(0, self.total_size)] and not (self.total_size == 0 and not ranges):
+            raise CoverageError(f"Pass left gaps; written ranges: {ranges[:8]}")
+        return {"verified": True, "bytes": self.total_size}
+
+
+class BadSectorMap:
+    """
+    Error-tolerant writing for ageing drives. A write that fails with a
+    medium error is retried in halves down to a single logical sector;
+    sectors that still cannot be written are recorded and skipped. After
+    each successful piece the write size doubles again, so the rest of the
+    chunk goes back to full-size writes once past the bad region.
+
+    The budget is capped by `max_bad_bytes` and by the total time spent
+    recovering (`max_recovery_seconds`), so a hopeless drive fails fast
+    with TooManyBadSectors instead of bisecting for hours.
+    """
+
+    def __init__(self, logical_block, max_bad_bytes=DEFAULT_MAX_BAD_BYTES,
+                 max_recovery_seconds=DEFAULT_MAX_RECOVERY_SECONDS, clock=time.monotonic):
+        self.logical_block = logical_block
+        self.max_bad_bytes = max_bad_bytes
+        self.max_recovery_seconds = max_recovery_seconds
+        self.clock = clock
+        self.recovery_seconds = 0.0
+        self.recovered_writes = 0
+        self._bad = set()
+        self._bad_total = 0  # bytes in self._bad, kept up to date for the budget check
+        self._lock = threading.Lock()
+
+    def write(self, fd, view, offset):
+        """block_io.write_fully(), recovering around medium errors. Returns len(view)."""
+        try:
+            return block_io.write_fully(fd, view, offset)
+        except OSError as e:
+            if e.errno not in MEDIUM_ERRORS:
+                raise
+        self.recover(fd, view, offset)
+        return len(view)
+
+    def recover(self, fd, view, offset):
+        """Writes what can be written of a range whose write just failed."""
+        started = self.clock()
+        try:
+            pos = 0
+            step = max(self.logical_block, block_io.align_down(len(view) // 2, self.logical_block))
+            while pos < len(view):
+                size = min(step, len(view) - pos)
+                try:
+                    block_io.write_fully(fd, view[pos:pos + size], offset + pos)
+                except OSError as e:
+                    if e.errno not in MEDIUM_ERRORS:
+                        raise
+                    if size > self.logical_block:
+                        step = max(self.logical_block, block_io.align_down(size // 2, self.logical_block))
+                        continue
+                    self._record(offset + pos, size)
+                else:
+                    step = min(step * 2, len(view))
+                pos += size
+                self._check_budget(started)
+        finally:
+            with self._lock:
+                self.recovery_seconds += self.clock() - started
+                self.recovered_writes += 1
+
+    def _record(self, offset, size):
+        # Ranges are whole sectors at sector offsets, so a sector that fails
+        # again on a later pass is the same range and is only counted once.
+        with self._lock:
+            if (offset, offset + size) not in self._bad:
+                self._bad.add((offset, offset + size))
+                self._bad_total += size
+
+    def _check_budget(self, started):
+        with self._lock:
+            bad_bytes = self._bad_total
+            spent = self.recovery_seconds + self.clock() - started
+        if bad_bytes > self.max_bad_bytes:
+            raise TooManyBadSectors(errno.EIO, f"more than {self.max_bad_bytes // 1024} KiB of unwritable sectors")
+        if spent > self.max_recovery_seconds:
+            raise TooManyBadSectors(errno.EIO, f"bad-sector recovery took over {self.max_recovery_seconds:.0f}s")
+
+    def ranges(self):
+        """Unwritable (start, end) byte ranges, sorted and merged."""
+        with self._lock:
+            bad = sorted(self._bad)
+        merged = []
+        for start, end in bad:
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return [tuple(r) for r in merged]
+
+    def bad_bytes(self):
+        with self._lock:
+            return self._bad_total
+
+    def describe(self):
+        """The bad-range map for the certificate, in logical block addresses."""
+        ranges = self.ranges()
+        return {
+            "logicalBlockSize": self.logical_block,
+            "unwritableBytes": sum(end - start for start, end in ranges),
+            "badRanges": [{"lba": start // self.logical_block,
+                           "sectors": -(-(end - start) // self.logical_block)} for start, end in ranges],
+            "recoveredWrites": self.recovered_writes,
+            "recoverySeconds": round(self.recovery_seconds, 3),
+        }
+
+
+class BufferRing:
+    """
+    A fixed set of preallocated, page-aligned buffers shared by the producers
+    and the writer. A producer can only fill a chunk once a buffer is free, so
+    memory stays bounded no matter how far generation runs ahead of the disk.
+    """
+
+    def __init__(self, count, size, alignment=block_io.PAGE_SIZE):
+        self.size = size
+        self._buffers = [block_io.AlignedBuffer(size, alignment) for _ in range(count)]
+        self._free = queue.Queue()
+        for buf in self._buffers:
+            self._free.put(buf)
+
+    def __len__(self):
+        return len(self._buffers)
+
+    def acquire(self, stop):
+        """Blocks until a buffer is free. Returns None once `stop` is set."""
+        while not stop.is_set():
+            try:
+                return self._free.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return None
+
+    def release(self, buf):
+        self._free.put(buf)
+
+    def all_free(self):
+        return self._free.qsize() == len(self._buffers)
+
+    def close(self):
+        for buf in self._buffers:
+            buf.close()
+
+
+def plan_chunks(total_size, chunk_size, aligned_size=None):
+    """
+    Yields (offset, size) for a pass. Chunks never straddle `aligned_size`, so
+    an unaligned tail always arrives as a chunk of its own.
+    """
+    if aligned_size is None:
+        aligned_size = total_size
+    offset = 0
+    while offset < total_size:
+        limit = aligned_size if offset < aligned_size else total_size
+        size = min(chunk_size, limit - offset)
+        yield offset, size
+        offset += size
+
+
+def plan_striped_chunks(total_size, chunk_size, aligned_size=None, stripes=1):
+    """
+    Splits the aligned part of the device into `stripes` contiguous regions and
+    yields their chunks round-robin, so that each outstanding write lands in a
+    different region. The unaligned tail, if any, comes last.
+    """
+    if aligned_size is None:
+        aligned_size = total_size
+    stripes = max(1, stripes)
+    region = -(-aligned_size // stripes)
+    # At least one chunk, also when nothing is aligned (a target smaller than a block)
+    region = max(chunk_size, region + -region % chunk_size)
+    cursors = [[start, min(start + region, aligned_size)] for start in range(0, aligned_size, region)]
+    while cursors:
+        for cursor in list(cursors):
+            size = min(chunk_size, cursor[1] - cursor[0])
+            yield cursor[0], size
+            cursor[0] += size
+            if cursor[0] >= cursor[1]:
+                cursors.remove(cursor)
+    if aligned_size < total_size:
+        yield aligned_size, total_size - aligned_size
+
+
+def skip_done(chunks, done_ranges):
+    """
+    Filters planned chunks against byte ranges that are already written (a
+    resumed pass), yielding only the parts still to do. `done_ranges` must be
+    sorted and non-overlapping.
+    """
+    done_ranges = list(done_ranges or ())
+    for offset, size in chunks:
+        end = offset + size
+        # Only a handful of ranges (one per stripe at most), so a scan is fine.
+        for start, stop in done_ranges:
+            if start >= end:
+                break
+            if stop <= offset:
+                continue
+            if start > offset:
+                yield offset, start - offset
+            offset = max(offset, stop)
+            if offset >= end:
+                break
+        if offset < end:
+            yield offset, end - offset
+
+
+class PassPipeline:
+    """
+    Runs one overwrite pass as a producer/consumer pipeline.
+
+    Producer threads generate chunks into ring buffers while the data is
+    written, so the disk is kept busy while the next chunks are generated and
+    throughput approaches the slower of the two instead of their sum.
+
+    With queue_depth 1 the calling thread drains chunks in device order with
+    pwritev(). With a deeper queue the device is split into that many stripes
+    and as many writer threads keep positioned writes outstanding at once.
+    Either way every write is recorded in `coverage`, and timed into
+    `telemetry` (a telemetry.PassTelemetry) when one is given.
+
+    `done_ranges` resumes an interrupted pass: those (start, end) ranges
+    count as written and only the rest of the device is planned.
+
+    With a BadSectorMap as `bad_sectors`, writes that hit a medium error are
+    recovered sector by sector instead of ending the pass; unwritable
+    sectors count as covered and are listed in the map.
+    """
+
+    def __init__(self, fd, total_size, source, ring, aligned_size=None, write_tail=None,
+                 producers=1, progress=None, queue_depth=1, cancel_event=None, telemetry=None,
+                 done_ranges=None, bad_sectors=None):
+        self.fd = fd
+        self.total_size = total_size
+        self.source = source
+        self.ring = ring
+        self.aligned_size = total_size if aligned_size is None else aligned_size
+        self.write_tail = write_tail
+        self.producers = max(1, min(int(producers), len(ring) - 1 or 1))
+        self.progress = progress
+        self.queue_depth = max(1, int(queue_depth))
+        self.cancel_event = cancel_event
+        self.telemetry = telemetry
+        self.bad_sectors = bad_sectors
+        self.coverage = CoverageTracker(total_size)
+        self.done_ranges = [(start, end) for start, end in (done_ranges or ()) if end > start]
+        for start, end in self.done_ranges:
+            self.coverage.add(start, end - start)
+
+        self._chunks = self._plan()
+        # The order in which the ordered writer expects chunks: the same plan again.
+        self._order = self._plan()
+        self._expected = next(self._order, None)
+        self._chunks_lock = threading.Lock()
+        self._filled = queue.Queue()
+        self._stop = threading.Event()
+        self._written_lock = threading.Lock()
+        self._error = None
+        self.written = sum(end - start for start, end in self.done_ranges)
+
+    def _plan(self):
+        if self.queue_depth > 1:
+            chunks = plan_striped_chunks(self.total_size, self.ring.size, self.aligned_size, self.queue_depth)
+        else:
+            chunks = plan_chunks(self.total_size, self.ring.size, self.aligned_size)
+        return skip_done(chunks, self.done_ranges) if self.done_ranges else chunks
+
+    def _next_chunk(self):
+        with self._chunks_lock:
+            return next(self._chunks, None)
+
+    def _produce(self):
+        buf = None
+        try:
+            while not self._stop.is_set():
+                # Claim a buffer before a chunk: the chunk the writer is waiting
+                # for is then always held by a producer that can finish it.
+                buf = self.ring.acquire(self._stop)
+                if buf is None:
+                    break
+                chunk = self._next_chunk()
+                if chunk is None:
+                    break
+                offset, size = chunk
+                self.source.fill(buf.view[:size], offset)
+                self._filled.put((offset, size, buf))
+                buf = None
+        except BaseException as e:
+            self._filled.put(e)
+        finally:
+            if buf is not None:
+                self.ring.release(buf)
+            self._filled.put(None)
+
+    def _write_run(self, run):
+        """Writes a list of contiguous (offset, size, buf) chunks and returns them to the ring."""
+        offset = run[0][0]
+        started = time.perf_counter()
+        try:
+            views = [buf.view[:size] for _, size, buf in run]
+            if offset >= self.aligned_size and self.write_tail is not None:
+                self.write_tail(views[0], offset)
+                self.coverage.add(offset, len(views[0]))
+                return
+            write_fully = block_io.write_fully
+            try:
+                if len(views) == 1:
+                    done = os.pwrite(self.fd, views[0], offset)
+                else:
+                    done = os.pwritev(self.fd, views, offset)
+            except OSError as e:
+                if self.bad_sectors is None or e.errno not in MEDIUM_ERRORS:
+                    raise
+                # Tolerant mode: bisect a failed single chunk straight away; of a
+                # gathered run, retry each chunk and bisect those that fail again.
+                if len(views) == 1:
+                    self.bad_sectors.recover(self.fd, views[0], offset)
+                    done = len(views[0])
+                else:
+                    done, write_fully = 0, self.bad_sectors.write
+            # Short write: finish whatever each view still has outstanding.
+            position = offset
+            for view in views:
+                start = min(len(view), max(0, offset + done - position))
+                if start < len(view):
+                    write_fully(self.fd, view[start:], position + start)
+                position += len(view)
+            for chunk_offset, size, _ in run:
+                self.coverage.add(chunk_offset, size)
+            if self.telemetry is not None:
+                self.telemetry.record_write(position - offset, time.perf_counter() - started)
+        finally:
+            for _, _, buf in run:
+                self.ring.release(buf)
+
+    def _drain(self, pending):
+        """Writes, in plan order, every pending chunk the writer is waiting for."""
+        while self._expected is not None and self._expected[0] in pending:
+            run = []
+            position = self._expected[0]
+            while self._expected is not None and self._expected[0] == position and position in pending \
+                    and len(run) < MAX_IOV:
+                chunk = pending.pop(position)
+                run.append(chunk)
+                position += chunk[1]
+                self._expected = next(self._order, None)
+                if position >= self.aligned_size:
+                    break  # the tail is written on its own
+            self._write_run(run)
+            self.written += position - run[0][0]
+            if self.progress is not None:
+                self.progress(self.written)
+
+    def _write_striped(self):
+        """Writer thread for queue_depth > 1: one positioned write at a time, many threads."""
+        try:
+            while not self._stop.is_set():
+                try:
+                    item = self._filled.get(timeout=_POLL_SECONDS)
+                except queue.Empty:
+                    continue
+                if item is None:
+                    continue
+                if isinstance(item, BaseException):
+                    raise item
+                self._write_run([item])
+                with self._written_lock:
+                    self.written += item[1]
+                    if self.written >= self.total_size:
+                        self._stop.set()
+        except BaseException as e:
+            if self._error is None:
+                self._error = e
+            self._stop.set()
+
+    def _check_cancel(self):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise WipeCancelled("Wipe cancelled.")
+
+    def _run_striped(self, producers):
+        writers = [threading.Thread(target=self._write_striped, daemon=True) for _ in range(self.queue_depth)]
+        for t in writers:
+            t.start()
+        try:
+            while not self._stop.wait(_POLL_SECONDS):
+                self._check_cancel()
+                if self.progress is not None:
+                    self.progress(self.written)
+                if not any(t.is_alive() for t in producers) and self._filled.empty() \
+                        and self.ring.all_free() and self.written < self.total_size:
+                    raise RuntimeError("Producers stopped before the pass was complete.")
+        finally:
+            self._stop.set()
+            for t in writers:
+                t.join()
+        if self._error is not None:
+            raise self._error
+        if self.progress is not None:
+            self.progress(self.written)
+
+    def _run_ordered(self, producers):
+        pending = {}
+        finished = 0
+        try:
+            while self.written < self.total_size:
+                self._check_cancel()
+                try:
+                    item = self._filled.get(timeout=_POLL_SECONDS)
+                except queue.Empty:
+                    continue
+                if isinstance(item, BaseException):
+                    raise item
+                if item is None:
+                    finished += 1
+                else:
+                    pending[item[0]] = item
+                    self._drain(pending)
+                if finished == len(producers) and self.written < self.total_size:
+                    raise RuntimeError("Producers stopped before the pass was complete.")
+        finally:
+            for _, _, buf in pending.values():
+                self.ring.release(buf)
+
+    def run(self):
+        """Runs the pass to completion. Returns the number of bytes written."""
+        if self.written >= self.total_size:
+            self.coverage.check_complete()  # resumed after the last write
+            return self.written
+        producers = [threading.Thread(target=self._produce, daemon=True) for _ in range(self.producers)]
+        for t in producers:
+            t.start()
+        try:
+            if self.queue_depth > 1:
+                self._run_striped(producers)
+            else:
+                self._run_ordered(producers)
+        finally:
+            self._stop.set()
+            for t in producers:
+                t.join()
+            # Anything still queued was filled but never written.
+            while True:
+                try:
+                    item = self._filled.get_nowait()
+                except queue.Empty:
+                    break
+                if isinstance(item, tuple):
+                    self.ring.release(item[2])
+        self.coverage.check_complete()
+        return self.written
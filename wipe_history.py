@@ -0,0 +1,313 @@
+# wipe_history.py
+"""
+Persistent, append-only history of every certificate produced or imported,
+so "was serial X wiped, when, how, and did it succeed?" is an indexed
+lookup instead of a scan of loose files.
+
+Layout of the store directory (WIPER_HISTORY_DIR, default ./wipe-history):
+
+    history.sqlite3              one row per certificate, indexed
+    certificates/ab/abcd....json the signed certificate, stored once by content hash
+    batches/BATCH-<root>.json    batch-signing manifests
+
+Certificates are stored as compact JSON with their key order kept, so both
+canonical and legacy signatures still verify with verify.py. Rows are never
+updated or deleted (the database refuses to), and adding a certificate that
+is already stored is a no-op, so importing the same folder twice or syncing
+two sticks into one is harmless.
+
+    python3 wipe_history.py import ./old-certificates /media/usb/certs
+    python3 wipe_history.py query --serial 'WD-*' --since 2026-01
+    python3 wipe_history.py export --format csv -o history.csv
+    python3 wipe_history.py sync /media/usb/wipe-history
+"""
+import os
+import sys
+import csv
+import glob
+import json
+import shutil
+import sqlite3
+import hashlib
+import argparse
+
+import certificate_format
+
+HISTORY_DIR_ENV = "WIPER_HISTORY_DIR"
+DEFAULT_DIRECTORY = "wipe-history"
+DATABASE_NAME = "history.sqlite3"
+SCHEMA_VERSION = 1
+IMPORT_BATCH = 1000  # certificates per transaction when importing folders
+# Query filters that match with shell-style globs, and the columns they search
+GLOB_FILTERS = ("serial", "model", "method", "status", "path")
+COLUMNS = ("reportID", "timestamp", "serial", "model", "size", "path", "method", "status",
+           "signatureFormat", "batchRoot", "certificate")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS wipes (
+    id INTEGER PRIMARY KEY,
+    contentHash TEXT NOT NULL UNIQUE,
+    reportID TEXT,
+    timestamp TEXT,
+    serial TEXT,
+    model TEXT,
+    size TEXT,
+    path TEXT,
+    method TEXT,
+    status TEXT,
+    signatureFormat TEXT,
+    batchRoot TEXT,
+    certificate TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS wipes_serial ON wipes(serial);
+CREATE INDEX IF NOT EXISTS wipes_model ON wipes(model);
+CREATE INDEX IF NOT EXISTS wipes_timestamp ON wipes(timestamp);
+CREATE INDEX IF NOT EXISTS wipes_method ON wipes(method);
+CREATE INDEX IF NOT EXISTS wipes_status ON wipes(status);
+CREATE TRIGGER IF NOT EXISTS wipes_no_update BEFORE UPDATE ON wipes
+    BEGIN SELECT RAISE(ABORT, 'wipe history is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS wipes_no_delete BEFORE DELETE ON wipes
+    BEGIN SELECT RAISE(ABORT, 'wipe history is append-only'); END;
+"""
+
+
+def default_directory():
+    return os.environ.get(HISTORY_DIR_ENV) or os.path.abspath(DEFAULT_DIRECTORY)
+
+
+def compact_bytes(cert_data):
+    """The stored form: no whitespace, key order kept (legacy signatures depend on it)."""
+    return json.dumps(cert_data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def is_certificate(data):
+    return isinstance(data, dict) and "reportID" in data and "driveInfo" in data and "signature" in data
+
+
+def _row(cert_data, content_hash, relative_path):
+    drive = cert_data.get("driveInfo") or {}
+    wipe = cert_data.get("wipeDetails") or {}
+    return (content_hash, cert_data.get("reportID"), cert_data.get("timestamp"),
+            drive.get("serial"), drive.get("model"), drive.get("size"), drive.get("path"),
+            wipe.get("method"), wipe.get("status"), cert_data.get("signatureFormat"),
+            (cert_data.get("batch") or {}).get("root"), relative_path)
+
+
+def _write_once(path, data):
+    """Writes `data` unless the file already exists (content-addressed, so it is identical)."""
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class WipeHistory:
+    """The history store in `directory`. Use as a context manager or call close()."""
+
+    def __init__(self, directory=None):
+        self.directory = directory or default_directory()
+        os.makedirs(self.directory, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(self.directory, DATABASE_NAME))
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        self.db.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    def _store(self, cert_data):
+        """Writes the certificate file and returns its row (not yet inserted)."""
+        data = compact_bytes(cert_data)
+        content_hash = hashlib.sha256(data).hexdigest()
+        relative_path = os.path.join("certificates", content_hash[:2], f"{content_hash}.json")
+        _write_once(os.path.join(self.directory, relative_path), data)
+        return _row(cert_data, content_hash, relative_path)
+
+    def add_many(self, cert_datas):
+        """Stores certificates in one transaction. Returns how many were new."""
+        rows = [self._store(cert_data) for cert_data in cert_datas]
+        with self.db:
+            before = self.db.total_changes
+            self.db.executemany(
+                f"INSERT OR IGNORE INTO wipes (contentHash, {', '.join(COLUMNS)}) "
+                f"VALUES ({', '.join('?' * (len(COLUMNS) + 1))})", rows)
+            return self.db.total_changes - before
+
+    def add(self, cert_data):
+        """Stores one certificate. Returns True if it was not already in the history."""
+        return self.add_many([cert_data]) == 1
+
+    def add_manifest(self, manifest):
+        """Keeps a batch-signing manifest next to the certificates it covers."""
+        path = os.path.join(self.directory, "batches", f"BATCH-{manifest['root'][:16]}.json")
+        _write_once(path, json.dumps(manifest, indent=4).encode("utf-8"))
+
+    def import_paths(self, inputs):
+        """
+        Bulk-imports certificate files: directories are searched recursively
+        for *.json. Batch manifests are kept too; other JSON is skipped.
+        Returns {"added", "duplicate", "skipped"}.
+        """
+        certificates, skipped, added = [], 0, 0
+        for path in _expand(inputs):
+            try:
+                with open(path, "rb") as f:
+                    data = json.loads(f.read())
+            except (OSError, ValueError):
+                skipped += 1
+                continue
+            if is_certificate(data):
+                certificates.append(data)
+                if len(certificates) % IMPORT_BATCH == 0:
+                    added += self.add_many(certificates[-IMPORT_BATCH:])
+            elif certificate_format.is_batch_manifest(data):
+                self.add_manifest(data)
+            else:
+                skipped += 1
+        added += self.add_many(certificates[len(certificates) - len(certificates) % IMPORT_BATCH:])
+        return {"added": added, "duplicate": len(certificates) - added, "skipped": skipped}
+
+    def query(self, since=None, until=None, limit=None, **globs):
+        """
+        Rows (dicts, newest first) matching every given filter: globs on
+        serial/model/method/status/path, and an ISO timestamp range where a
+        prefix such as "2026-10" works for `since`/`until`.
+        """
+        clauses, params = [], []
+        for field, pattern in globs.items():
+            if field not in GLOB_FILTERS:
+                raise ValueError(f"Unknown filter: {field}")
+            if pattern:
+                clauses.append(f"{field} GLOB ?")
+                params.append(pattern)
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            # "2026-10" should include the whole of October
+            clauses.append("timestamp < ?")
+            params.append(until + "\uffff")
+        sql = f"SELECT {', '.join(COLUMNS)} FROM wipes"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY timestamp DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [dict(row) for row in self.db.execute(sql, params)]
+
+    def load(self, row):
+        """The full signed certificate for a query row."""
+        with open(os.path.join(self.directory, row["certificate"]), "rb") as f:
+            return json.loads(f.read())
+
+    def sync(self, destination):
+        """
+        Copies the store to `destination` (e.g. a USB stick): certificate and
+        manifest files it does not have yet, and the rows it is missing.
+        Returns the number of rows that were new there.
+        """
+        with WipeHistory(destination) as target:
+            for sub in ("certificates", "batches"):
+                for path in glob.glob(os.path.join(self.directory, sub, "**", "*.json"), recursive=True):
+                    relative_path = os.path.relpath(path, self.directory)
+                    dest_path = os.path.join(destination, relative_path)
+                    if not os.path.exists(dest_path):
+                        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+                        shutil.copyfile(path, f"{dest_path}.tmp")
+                        os.replace(f"{dest_path}.tmp", dest_path)
+            rows = self.db.execute(f"SELECT contentHash, {', '.join(COLUMNS)} FROM wipes").fetchall()
+            with target.db:
+                before = target.db.total_changes
+                target.db.executemany(
+                    f"INSERT OR IGNORE INTO wipes (contentHash, {', '.join(COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * (len(COLUMNS) + 1))})", [tuple(row) for row in rows])
+                added = target.db.total_changes - before
+            # Leave a single self-contained database file behind on removable media
+            target.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return added
+
+
+def _expand(inputs):
+    for item in inputs:
+        if os.path.isdir(item):
+            yield from sorted(glob.glob(os.path.join(item, "**", "*.json"), recursive=True))
+        elif glob.has_magic(item):
+            yield from sorted(glob.glob(item, recursive=True))
+        else:
+            yield item
+
+
+def record(cert_datas, manifest=None, directory=None):
+    """Adds freshly generated certificates (and their batch manifest) to the history."""
+    with WipeHistory(directory) as history:
+        if manifest:
+            history.add_manifest(manifest)
+        return history.add_many(cert_datas)
+
+
+def write_rows(rows, fmt, out):
+    if fmt == "json":
+        json.dump(rows, out, indent=4)
+        out.write("\n")
+    else:
+        writer = csv.DictWriter(out, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query and maintain the wipe history store.")
+    parser.add_argument("--dir", help=f"history directory (default: ${HISTORY_DIR_ENV} or ./{DEFAULT_DIRECTORY})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    importer = commands.add_parser("import", help="add existing certificates (files or folders)")
+    importer.add_argument("inputs", nargs="+")
+
+    for name in ("query", "export"):
+        sub = commands.add_parser(name, help="list matching wipes" if name == "query" else "write wipes to a file")
+        for field in GLOB_FILTERS:
+            sub.add_argument(f"--{field}", metavar="GLOB")
+        sub.add_argument("--since", help="ISO timestamp or prefix, e.g. 2026-10")
+        sub.add_argument("--until", help="ISO timestamp or prefix, inclusive")
+        sub.add_argument("--limit", type=int)
+        sub.add_argument("--format", choices=("csv", "json"), default="csv" if name == "export" else "json")
+        sub.add_argument("-o", "--output", help="output file (default: stdout)")
+
+    syncer = commands.add_parser("sync", help="copy the history to another directory, e.g. a USB stick")
+    syncer.add_argument("destination")
+    args = parser.parse_args(argv)
+
+    with WipeHistory(args.dir) as history:
+        if args.command == "import":
+            counts = history.import_paths(args.inputs)
+            print(f"{counts['added']} added, {counts['duplicate']} already stored, {counts['skipped']} skipped.")
+        elif args.command == "sync":
+            added = history.sync(args.destination)
+            print(f"Synced to {args.destination}: {added} new record(s).")
+        else:
+            rows = history.query(since=args.since, until=args.until, limit=args.limit,
+                                 **{field: getattr(args, field) for field in GLOB_FILTERS})
+            if args.output:
+                with open(args.output, "w", newline="") as out:
+                    write_rows(rows, args.format, out)
+                print(f"{len(rows)} record(s) written to {args.output}.")
+            else:
+                write_rows(rows, args.format, sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
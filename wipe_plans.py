@@ -0,0 +1,151 @@
+# wipe_plans.py
+"""
+Declarative overwrite plans: a named list of passes that an overwrite runs
+in order, recorded in the certificate as executed.
+
+A pass is a dict:
+
+    {"type": "random"}                   the wipe's data source (AES-CTR keystream by default)
+    {"type": "zero"}                     all zeroes
+    {"type": "fixed", "pattern": "55"}   a byte pattern in hex, repeated across the device
+    {"type": "complement"}               the bitwise complement of the previous fixed pass
+
+and may add "verify": true, "sample" or "full" to read that pass back
+before the next one starts (true uses the wipe's verify mode, or sample).
+
+A plan is a name from PLANS, a list of passes, or a dict with "name",
+"passes" and optionally "standard", e.g. from a wipe_cli job file.
+"""
+import data_sources
+
+PASS_TYPES = ("random", "zero", "fixed", "complement")
+VERIFY_MODES = ("sample", "full")
+DEFAULT_PLAN = "nist-clear"
+
+# Gutmann's 27 deterministic patterns (passes 5-31), between 4 random passes
+# on each side. They are run in the published order rather than shuffled, so
+# the executed plan in the certificate is the same for every drive.
+_GUTMANN_PATTERNS = (
+    ["55", "aa", "924924", "492492", "249249"]
+    + [f"{n:x}{n:x}" for n in range(16)]
+    + ["924924", "492492", "249249", "6db6db", "b6db6d", "db6db6"]
+)
+
+PLANS = {
+    "nist-clear": {
+        "label": "NIST 800-88 Clear (1 random pass)",
+        "standard": "NIST SP 800-88 Rev. 1",
+        "passes": [{"type": "random"}],
+    },
+    "zero-fill": {
+        "label": "Zero fill (1 pass)",
+        "standard": "NIST SP 800-88 Rev. 1",
+        "passes": [{"type": "zero"}],
+    },
+    "dod-3pass": {
+        "label": "DoD 5220.22-M (3 passes, verified)",
+        "standard": "DoD 5220.22-M",
+        "passes": [{"type": "fixed", "pattern": "00"}, {"type": "complement"},
+                   {"type": "random", "verify": True}],
+    },
+    "gutmann": {
+        "label": "Gutmann (35 passes)",
+        "standard": "Gutmann",
+        "passes": ([{"type": "random"}] * 4 + [{"type": "fixed", "pattern": p} for p in _GUTMANN_PATTERNS]
+                   + [{"type": "random"}] * 4),
+    },
+}
+
+
+class WipePass:
+    """One pass of a plan. `pattern` is bytes for fixed passes (complements are resolved to fixed)."""
+
+    def __init__(self, kind, pattern=None, verify=None):
+        self.kind = kind
+        self.pattern = pattern
+        self.verify = verify
+
+    def source(self, data_source, seed=None, threads=1, chunk_size=0):
+        """A fresh data source for this pass; pattern buffers are built here, once for the whole pass."""
+        if self.kind == "random":
+            return data_sources.get_data_source(data_source, seed=seed, threads=threads)
+        if self.kind == "zero":
+            return data_sources.ZeroSource()
+        return data_sources.PatternSource(self.pattern, size=chunk_size)
+
+    @property
+    def label(self):
+        return f"pattern 0x{self.pattern.hex()}" if self.pattern is not None else self.kind
+
+    def describe(self):
+        info = {"type": self.kind}
+        if self.pattern is not None:
+            info["pattern"] = self.pattern.hex()
+        if self.verify:
+            info["verify"] = self.verify
+        return info
+
+
+class WipePlan:
+    def __init__(self, name, passes, standard=None):
+        self.name = name
+        self.passes = passes
+        self.standard = standard or "Custom"
+
+    def __len__(self):
+        return len(self.passes)
+
+    def describe(self):
+        """What the certificate and the checkpoint journal record about the plan."""
+        return {"name": self.name, "standard": self.standard, "passes": [p.describe() for p in self.passes]}
+
+
+def _parse_pass(spec, previous_pattern):
+    kind = spec.get("type")
+    if kind not in PASS_TYPES:
+        raise ValueError(f"Unknown pass type: {kind!r} (expected one of {', '.join(PASS_TYPES)})")
+    verify = spec.get("verify")
+    if verify not in (None, False, True) and verify not in VERIFY_MODES:
+        raise ValueError(f"Unknown verify mode for a pass: {verify!r}")
+    pattern = None
+    if kind == "fixed":
+        try:
+            pattern = bytes.fromhex(spec.get("pattern") or "")
+        except ValueError:
+            pattern = b""
+        if not pattern:
+            raise ValueError(f"Fixed pass needs a non-empty hex pattern, got {spec.get('pattern')!r}")
+    elif kind == "complement":
+        if previous_pattern is None:
+            raise ValueError("A complement pass must follow a fixed or zero pass.")
+        kind, pattern = "fixed", bytes(b ^ 0xFF for b in previous_pattern)
+    return WipePass(kind, pattern, verify or None)
+
+
+def parse_plan(spec, name="custom", standard=None):
+    """Builds a WipePlan from a list of pass dicts. Raises ValueError if it is not valid."""
+    if not isinstance(spec, list) or not spec:
+        raise ValueError("A wipe plan needs at least one pass.")
+    passes, previous = [], None
+    for item in spec:
+        if not isinstance(item, dict):
+            raise ValueError(f"A pass must be a dict, got {item!r}")
+        wipe_pass = _parse_pass(item, previous)
+        previous = b"\x00" if wipe_pass.kind == "zero" else wipe_pass.pattern
+        passes.append(wipe_pass)
+    return WipePlan(name, passes, standard)
+
+
+def get_plan(plan=None):
+    """A WipePlan from a plan name, a list of passes, a plan dict, or a WipePlan (None: DEFAULT_PLAN)."""
+    if isinstance(plan, WipePlan):
+        return plan
+    if plan is None:
+        plan = DEFAULT_PLAN
+    if isinstance(plan, str):
+        if plan not in PLANS:
+            raise ValueError(f"Unknown wipe plan: {plan} (known: {', '.join(PLANS)})")
+        return parse_plan(PLANS[plan]["passes"], plan, PLANS[plan]["standard"])
+    if isinstance(plan, dict):
+        return parse_plan(plan.get("passes"), plan.get("name", "custom"), plan.get("standard"))
+    return parse_plan(plan)
@@ -1,21 +1,56 @@
 # wiper_app.py
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+import os
+import sys
+import json
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
-import threading
 import wiping_core
-import certificate_generator
+import wipe_plans
+import progress_bus
+# certificate_generator (cryptography, reportlab) is imported when the first
+# certificate is produced, not at startup.
+
+_IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
+
+# If set, a JSON line with the startup timings is appended to this file and
+# the app exits once the drive list is shown (used by build.sh).
+STARTUP_PROBE_ENV = "WIPER_STARTUP_PROBE"
+
+
+def process_age():
+    """Seconds since this process was started, from /proc (None if unavailable)."""
+    try:
+        with open("/proc/self/stat") as f:
+            # Field 22 (starttime, in clock ticks since boot); the command name
+            # in field 2 may contain spaces, so count from its closing ')'.
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
 
 class WiperApp:
+    VERIFY_CHOICES = [
+        ("Sampled read-back (NIST 800-88)", "sample"),
+        ("Full read-back", "full"),
+        ("None", None),
+    ]
+
     def __init__(self, root):
         self.root = root
         self.root.title("Secure Data Wiper")
-        self.root.geometry("600x450")
+        self.root.geometry("640x620")
 
         # --- UI Elements ---
-        self.drive_frame = ttk.LabelFrame(root, text="Select Drive")
+        self.drive_frame = ttk.LabelFrame(root, text="Select Drives (Ctrl/Shift-click for several)")
         self.drive_frame.pack(padx=10, pady=10, fill="x")
 
-        self.drive_listbox = tk.Listbox(self.drive_frame, height=5)
+        self.drive_listbox = tk.Listbox(self.drive_frame, height=5, selectmode=tk.EXTENDED)
         self.drive_listbox.pack(padx=5, pady=5, fill="x", expand=True)
 
         self.refresh_button = ttk.Button(self.drive_frame, text="Refresh Drives", command=self.populate_drives)
@@ -24,10 +59,31 @@ class WiperApp:
         self.method_frame = ttk.LabelFrame(root, text="Select Wiping Method")
         self.method_frame.pack(padx=10, pady=10, fill="x")
         self.wipe_method = tk.StringVar(value="overwrite")
-        ttk.Radiobutton(self.method_frame, text="Secure Overwrite (3-Pass, NIST Clear)",
+        ttk.Radiobutton(self.method_frame, text="Secure Overwrite (pass plan below)",
                         variable=self.wipe_method, value="overwrite").pack(anchor="w", padx=10)
+        self.plan_frame = ttk.Frame(self.method_frame)
+        self.plan_frame.pack(anchor="w", padx=30, pady=2)
+        ttk.Label(self.plan_frame, text="Pass plan:").pack(side="left")
+        self.plan_choices = {spec["label"]: name for name, spec in wipe_plans.PLANS.items()}
+        self.wipe_plan = tk.StringVar(value=wipe_plans.PLANS[wipe_plans.DEFAULT_PLAN]["label"])
+        ttk.Combobox(self.plan_frame, textvariable=self.wipe_plan, state="readonly", width=36,
+                     values=list(self.plan_choices)).pack(side="left", padx=5)
+        ttk.Radiobutton(self.method_frame, text="Device-Offloaded Zeroing (NIST Clear - Fast, falls back to overwrite)",
+                        variable=self.wipe_method, value="offload").pack(anchor="w", padx=10)
         ttk.Radiobutton(self.method_frame, text="Hardware Secure Erase (NIST Purge - Advanced)",
                         variable=self.wipe_method, value="purge").pack(anchor="w", padx=10)
+        self.direct_io = tk.BooleanVar(value=True)
+        ttk.Checkbutton(self.method_frame, text="Direct I/O (bypass page cache, for RAM-backed live systems)",
+                        variable=self.direct_io).pack(anchor="w", padx=10)
+        self.tolerate_bad_sectors = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.method_frame, text="Tolerate bad sectors (skip and list them in the certificate)",
+                        variable=self.tolerate_bad_sectors).pack(anchor="w", padx=10)
+        self.verify_frame = ttk.Frame(self.method_frame)
+        self.verify_frame.pack(anchor="w", padx=10, pady=2)
+        ttk.Label(self.verify_frame, text="Verification:").pack(side="left")
+        self.verify_mode = tk.StringVar(value=self.VERIFY_CHOICES[0][0])
+        ttk.Combobox(self.verify_frame, textvariable=self.verify_mode, state="readonly", width=28,
+                     values=[label for label, _ in self.VERIFY_CHOICES]).pack(side="left", padx=5)
 
         self.progress_frame = ttk.LabelFrame(root, text="Progress")
         self.progress_frame.pack(padx=10, pady=10, fill="x")
@@ -35,18 +91,61 @@ class WiperApp:
         self.progress_bar.pack(pady=5, padx=10, fill="x")
         self.status_label = ttk.Label(self.progress_frame, text="Status: Ready")
         self.status_label.pack(pady=5, padx=10, anchor="w")
+        # One row per drive in the running batch
+        self.job_tree = ttk.Treeview(self.progress_frame, columns=("status", "progress", "message"), height=5)
+        self.job_tree.heading("#0", text="Drive")
+        self.job_tree.heading("status", text="Status")
+        self.job_tree.heading("progress", text="%")
+        self.job_tree.heading("message", text="Details")
+        self.job_tree.column("#0", width=110)
+        self.job_tree.column("status", width=80)
+        self.job_tree.column("progress", width=45, anchor="e")
+        self.job_tree.column("message", width=330)
+        self.job_tree.pack(pady=5, padx=10, fill="x")
 
-        self.wipe_button = ttk.Button(root, text="WIPE SELECTED DRIVE", command=self.confirm_and_wipe)
-        self.wipe_button.pack(pady=20)
+        self.button_frame = ttk.Frame(root)
+        self.button_frame.pack(pady=15)
+        self.wipe_button = ttk.Button(self.button_frame, text="WIPE SELECTED DRIVES", command=self.confirm_and_wipe)
+        self.wipe_button.pack(side="left", padx=5)
+        self.cancel_button = ttk.Button(self.button_frame, text="Cancel Selected Job",
+                                        command=self.cancel_selected_job, state="disabled")
+        self.cancel_button.pack(side="left", padx=5)
 
         self.drives = []
+        self.scheduler = None
+        self.certificates = []
+        self.completed_jobs = 0
+        self.pdf_worker = None  # created with the first certificates
+        self.startup_reported = False
+
+        # Worker threads post here; the main loop drains it a few times a second
+        # so widgets are only touched on the main thread.
+        self.bus = progress_bus.ProgressBus()
+        self.pump = progress_bus.TkPump(root, self.bus, {
+            "drives": lambda _, drives: self.show_drives(drives),
+            "job": lambda _, job: self.update_job(job),
+            "complete": lambda _, job: self.on_wipe_complete(job),
+        })
+        self.pump.start()
         self.populate_drives()
 
     def populate_drives(self):
+        """Detects drives on a background thread; the result arrives through the bus."""
         self.drive_listbox.delete(0, tk.END)
         self.status_label.config(text="Status: Detecting drives...")
-        self.root.update_idletasks() # Ensure the UI updates
-        self.drives = wiping_core.list_physical_drives()
+        self.refresh_button.config(state="disabled")
+        threading.Thread(target=self._detect_drives, daemon=True).start()
+
+    def _detect_drives(self):
+        try:
+            drives = wiping_core.list_physical_drives()
+        except Exception as e:
+            print(f"Drive detection failed: {e}")
+            drives = []
+        self.bus.post("drives", None, drives)
+
+    def show_drives(self, drives):
+        self.drives = drives
         if not self.drives:
             self.drive_listbox.insert(tk.END, "No drives found or an error occurred.")
             self.drive_listbox.insert(tk.END, "Ensure 'util-linux' package is loaded.")
@@ -55,24 +154,46 @@ class WiperApp:
                 display_text = f"{drive['path']} - {drive.get('model', 'N/A')} ({drive.get('size', 'N/A')})"
                 self.drive_listbox.insert(tk.END, display_text)
         self.status_label.config(text="Status: Ready")
+        if self.scheduler is None:
+            self.refresh_button.config(state="normal")
+        if not self.startup_reported:
+            self.report_startup()
+
+    def report_startup(self):
+        """Logs how long it took from launch until the drive list could be used."""
+        self.startup_reported = True
+        self.root.update_idletasks()  # make sure the list is actually drawn
+        age = process_age()
+        timing = {
+            "launchToInteractiveSeconds": round(age, 3) if age is not None else None,
+            "moduleImportSeconds": round(_IMPORT_SECONDS, 3),
+            "drivesFound": len(self.drives),
+            "frozen": bool(getattr(sys, "frozen", False)),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        print(f"Startup: drive list interactive after {timing['launchToInteractiveSeconds']}s "
+              f"(imports {timing['moduleImportSeconds']}s)", file=sys.stderr)
+        probe_path = os.environ.get(STARTUP_PROBE_ENV)
+        if probe_path:
+            with open(probe_path, "a") as f:
+                f.write(json.dumps(timing) + "\n")
+            self.root.after(0, self.root.destroy)
 
     def update_progress(self, message, value):
         self.status_label.config(text=f"Status: {message}")
         self.progress_bar['value'] = value
-        self.root.update_idletasks()
 
     def confirm_and_wipe(self):
-        try:
-            selected_index = self.drive_listbox.curselection()[0]
-            selected_drive = self.drives[selected_index]
-        except IndexError:
-            messagebox.showerror("Error", "Please select a drive to wipe.")
+        selected_drives = [self.drives[i] for i in self.drive_listbox.curselection() if i < len(self.drives)]
+        if not selected_drives:
+            messagebox.showerror("Error", "Please select at least one drive to wipe.")
             return
 
+        drive_lines = "\n".join(f"{d['path']} ({d.get('model', 'N/A')})" for d in selected_drives)
         confirm1 = messagebox.askokcancel(
             "ARE YOU SURE?",
-            f"You are about to permanently erase all data on:\n\n"
-            f"{selected_drive['path']} ({selected_drive.get('model', 'N/A')})\n\n"
+            f"You are about to permanently erase all data on {len(selected_drives)} drive(s):\n\n"
+            f"{drive_lines}\n\n"
             "This action cannot be undone."
         )
         if not confirm1:
@@ -90,46 +211,97 @@ class WiperApp:
         
         self.wipe_button.config(state="disabled")
         self.refresh_button.config(state="disabled")
-        
-        wipe_thread = threading.Thread(
-            target=self.run_wipe_thread,
-            args=(selected_drive, self.wipe_method.get())
+        self.cancel_button.config(state="normal")
+        self.job_tree.delete(*self.job_tree.get_children())
+        self.certificates = []
+        self.completed_jobs = 0
+
+        # Progress is coalesced per drive; completions have their own slot so none is lost
+        self.scheduler = wiping_core.WipeScheduler(
+            on_progress=lambda job: self.bus.post("job", job.path, job),
+            on_complete=lambda job: self.bus.post("complete", job.path, job),
         )
-        wipe_thread.start()
-
-    def run_wipe_thread(self, drive_info, method):
-        """The actual work that runs in the background thread."""
-        wipe_status = wiping_core.wipe_drive(drive_info['path'], method, self.update_progress)
-        self.root.after(100, self.on_wipe_complete, wipe_status, drive_info, method)
-
-    # ======================================================================
-    # THIS IS THE CRITICAL CHANGE
-    # ======================================================================
-    def on_wipe_complete(self, wipe_status, drive_info, method):
-        """Called on the main thread after the wipe is finished."""
-        success, message = wipe_status
-
-        # First, check if the wipe actually succeeded
-        if not success:
-            # If it failed, show an explicit error message and STOP.
+        method = self.wipe_method.get()
+        verify = dict(self.VERIFY_CHOICES)[self.verify_mode.get()]
+        for drive in selected_drives:
+            self.job_tree.insert("", tk.END, iid=drive['path'], text=drive['path'], values=("queued", 0, ""))
+            self.scheduler.submit(drive, method, direct_io=self.direct_io.get(), verify=verify,
+                                  plan=self.plan_choices[self.wipe_plan.get()],
+                                  tolerate_bad_sectors=self.tolerate_bad_sectors.get(),
+                                  resume=self.ask_resume(drive) if method != 'purge' else False)
+
+    def ask_resume(self, drive):
+        """Offers to continue an overwrite of this drive that was interrupted earlier."""
+        pending = wiping_core.pending_checkpoint(drive['path'])
+        if pending is None:
+            return False
+        return messagebox.askyesno(
+            "Resume Interrupted Wipe?",
+            f"An earlier wipe of {drive['path']} was interrupted at pass {pending['pass']}/{pending['passes']} "
+            f"({pending['percent']}% of that pass durably written, last saved {pending['updatedAt']}).\n\n"
+            "Resume from that point? Choose No to start over."
+        )
+
+    def cancel_selected_job(self):
+        if self.scheduler is None:
+            return
+        for drive_path in self.job_tree.selection():
+            self.scheduler.cancel(drive_path)
+
+    def update_job(self, job):
+        if self.scheduler is None:
+            return  # a progress event that arrived after the batch was finished
+        self.job_tree.item(job.path, values=(job.status, int(job.progress), job.message))
+        self.update_progress(f"{sum(1 for j in self.scheduler.jobs if j.finished)}/{len(self.scheduler.jobs)} drives finished",
+                             self.scheduler.aggregate_progress())
+
+    def on_wipe_complete(self, job):
+        """Called on the main thread after one drive's wipe is finished."""
+        self.update_job(job)
+        self.completed_jobs += 1
+
+        if self.completed_jobs < len(self.scheduler.jobs):
+            return
+
+        # Certificates for the whole session are signed together, once every
+        # drive is done: one signature over the Merkle root of the batch.
+        succeeded = [j for j in self.scheduler.jobs if j.result[0]]
+        report_path = None
+        if succeeded:
+            import certificate_generator
+            import pdf_reports
+            # PDFs are rendered in the background so the next wipe can start right away
+            if self.pdf_worker is None:
+                self.pdf_worker = pdf_reports.PdfWorker()
+            paths, _, report_path = certificate_generator.create_certificates(
+                [(j.drive_info, j.method, j.result) for j in succeeded],
+                session_report=len(succeeded) > 1, pdf_worker=self.pdf_worker)
+            self.certificates.extend((j.path, json_path, pdf_path)
+                                     for j, (json_path, pdf_path) in zip(succeeded, paths))
+
+        failed = [j for j in self.scheduler.jobs if not j.result[0]]
+        if failed:
+            # If any failed, show an explicit error message
             messagebox.showerror(
-                "Wipe Failed!", 
-                f"A critical error occurred during the wipe process:\n\n{message}"
+                "Wipe Failed!",
+                "A critical error occurred during the wipe process:\n\n" +
+                "\n\n".join(f"{j.path}: {j.result[1]}" for j in failed)
             )
-        else:
-            # Only if it succeeded, generate the certificate and show success.
-            self.update_progress("Generating certificate...", 100)
-            json_path, pdf_path = certificate_generator.create_certificate(drive_info, method, wipe_status)
+        if self.certificates:
             messagebox.showinfo(
-                "Success", 
-                f"Wipe completed successfully.\n\nCertificate saved to:\n{json_path}\n{pdf_path}"
+                "Success",
+                f"{len(self.certificates)} wipe(s) completed successfully.\n\nCertificates saved to:\n" +
+                "\n".join(f"{json_path}\n{pdf_path}" for _, json_path, pdf_path in self.certificates) +
+                (f"\n\nSession report:\n{report_path}" if report_path else "")
             )
 
         # Reset UI regardless of outcome
+        self.scheduler = None
         self.progress_bar['value'] = 0
         self.status_label.config(text="Status: Ready")
         self.wipe_button.config(state="normal")
         self.refresh_button.config(state="normal")
+        self.cancel_button.config(state="disabled")
 
 if __name__ == "__main__":
     root = tk.Tk()
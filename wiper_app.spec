@@ -1,5 +1,13 @@
 # -*- mode: python ; coding: utf-8 -*-
+import os
 
+# WIPER_LAYOUT=onedir (default) builds dist/wiper_app/ with the interpreter and
+# libraries as plain files: nothing is unpacked at launch, and the squashfs
+# compresses them anyway. WIPER_LAYOUT=onefile builds the single self-extracting
+# executable, which has to unpack itself into RAM on every start.
+# UPX is off in both: decompressing it costs more at startup than it saves on
+# a medium that is already compressed.
+LAYOUT = os.environ.get('WIPER_LAYOUT', 'onedir')
 
 a = Analysis(
     ['wiper_app.py'],
@@ -16,23 +24,51 @@ a = Analysis(
 )
 pyz = PYZ(a.pure)
 
-exe = EXE(
-    pyz,
-    a.scripts,
-    a.binaries,
-    a.datas,
-    [],
-    name='wiper_app',
-    debug=False,
-    bootloader_ignore_signals=False,
-    strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
-    console=False,
-    disable_windowed_traceback=False,
-    argv_emulation=False,
-    target_arch=None,
-    codesign_identity=None,
-    entitlements_file=None,
-)
+if LAYOUT == 'onefile':
+    exe = EXE(
+        pyz,
+        a.scripts,
+        a.binaries,
+        a.datas,
+        [],
+        name='wiper_app',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        upx=False,
+        upx_exclude=[],
+        runtime_tmpdir=None,
+        console=False,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
+else:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        [],
+        exclude_binaries=True,
+        name='wiper_app',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        upx=False,
+        console=False,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
+    coll = COLLECT(
+        exe,
+        a.binaries,
+        a.datas,
+        strip=False,
+        upx=False,
+        upx_exclude=[],
+        name='wiper_app',
+    )
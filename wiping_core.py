@@ -2,10 +2,23 @@ import sys
 import subprocess
 import json
 import os
+import threading
+import data_sources
+import block_io
+import wipe_engine
+import verification
+import drive_inventory
+import telemetry
+import checkpoint
+import wipe_plans
 
 def list_physical_drives():
     """Lists all physical, non-removable drives in the system."""
-    # This environment will always be linux
+    # This environment will always be linux. sysfs is read directly (and
+    # cached); lsblk is only needed if /sys/block is unavailable.
+    devices = drive_inventory.default_inventory().devices()
+    if devices:
+        return [device.as_drive_info() for device in devices]
     return _list_drives_linux()
 
 def _list_drives_linux():
@@ -34,129 +47,593 @@ def _list_drives_linux():
         print(f"Error listing drives on Linux: {e}")
         return []
 
-def wipe_drive(drive_path, method, progress_callback):
+def wipe_drive(drive_path, method, progress_callback, data_source='auto', generator_threads=1, direct_io=False,
+               producers=1, queue_depth=None, cancel_event=None, verify='sample',
+               sample_percent=verification.DEFAULT_SAMPLE_PERCENT, resume=False,
+               checkpoint_interval=checkpoint.DEFAULT_INTERVAL, chunk_size=None, plan=None,
+               tolerate_bad_sectors=False, checkpoint_dir=None):
     """
     Wipes a drive using the specified method.
+
+    Returns (success, message) or, for a completed overwrite,
+    (success, message, details) where details is recorded in the certificate.
+    `data_source` selects the generator for the random pass (see data_sources).
+    `direct_io` writes with O_DIRECT, bypassing the page cache.
+    `producers` is the number of threads generating data ahead of the writer.
+    `queue_depth` is the number of concurrent striped writes; by default it is
+    derived from the device's queue limits (1 for rotational disks).
+    `cancel_event` (a threading.Event) stops an overwrite between chunks.
+    `verify` reads the drive back after an overwrite: 'full', 'sample'
+    (`sample_percent` of the drive in evenly spread regions) or None.
+    An overwrite journals its progress every `checkpoint_interval` seconds
+    (None disables it) into `checkpoint_dir` (default: $WIPER_CHECKPOINT_DIR;
+    with neither set it is off, with a warning); `resume` continues an
+    interrupted overwrite of the same drive from its last durable checkpoint
+    (see pending_checkpoint).
+    `chunk_size` overrides the write size derived from the device.
+    `plan` is the overwrite's pass plan: a name such as 'dod-3pass', or a
+    custom list of passes (see wipe_plans); by default one random pass.
+    With `tolerate_bad_sectors`, an overwrite skips sectors that cannot be
+    written instead of failing, and lists them in the certificate; a drive
+    with more bad sectors than wipe_engine's budget still fails.
     """
-    # Check for root privileges
-    if os.geteuid() != 0:
-        return False, "This operation requires root privileges. Please run with sudo."
-    
     if not os.path.exists(drive_path):
         return False, f"Device path {drive_path} does not exist."
+
+    # Check for root privileges. Regular files (disk images, benchmark
+    # targets) only need write permission on the file.
+    if os.geteuid() != 0 and not os.path.isfile(drive_path):
+        return False, "This operation requires root privileges. Please run with sudo."
     
     # Validate progress_callback
     if progress_callback is None:
         progress_callback = lambda msg, pct: None  # No-op function if not provided
 
     if method == 'overwrite':
-        return _overwrite_drive(drive_path, passes=1, progress_callback=progress_callback) # Reduced to 1 pass for hackathon speed
+        try:
+            plan = wipe_plans.get_plan(plan)
+        except ValueError as e:
+            return False, f"Invalid wipe plan: {e}"
+        return _overwrite_drive(drive_path, plan, progress_callback=progress_callback,
+                                data_source=data_source, generator_threads=generator_threads,
+                                direct_io=direct_io, producers=producers, queue_depth=queue_depth,
+                                cancel_event=cancel_event, verify=verify, sample_percent=sample_percent,
+                                resume=resume, checkpoint_interval=checkpoint_interval, chunk_size=chunk_size,
+                                tolerate_bad_sectors=tolerate_bad_sectors, checkpoint_dir=checkpoint_dir)
+    elif method == 'offload':
+        return _offload_drive(drive_path, progress_callback, cancel_event=cancel_event, verify=verify,
+                              sample_percent=sample_percent, direct_io=direct_io, queue_depth=queue_depth,
+                              resume=resume, checkpoint_interval=checkpoint_interval, chunk_size=chunk_size,
+                              tolerate_bad_sectors=tolerate_bad_sectors, checkpoint_dir=checkpoint_dir)
     elif method == 'purge':
-        return _secure_erase_linux(drive_path, progress_callback=progress_callback)
+        return _secure_erase_linux(drive_path, progress_callback=progress_callback, cancel_event=cancel_event)
     else:
         return False, f"Unknown wipe method: {method}"
 
-def _overwrite_drive(drive_path, passes, progress_callback):
-    """Performs a multi-pass overwrite (NIST 800-88 Clear)."""
+def _checkpoint_key(drive_path, total_size):
+    device = drive_inventory.get_device(drive_path)
+    return checkpoint.journal_key(device.serial if device else None, total_size, drive_path)
+
+def pending_checkpoint(drive_path, checkpoint_dir=None):
+    """Describes an interrupted overwrite of this drive that can be resumed, or returns None."""
+    checkpoint_dir = checkpoint_dir or checkpoint.default_directory()
+    total_size, _ = _get_drive_size(drive_path)
+    if total_size is None or checkpoint_dir is None:
+        return None
+    return checkpoint.describe_pending(checkpoint.CheckpointStore(checkpoint_dir),
+                                       _checkpoint_key(drive_path, total_size))
+
+def _unmount_drive(drive_path, progress_callback):
+    """Unmounts the device and all its partitions before wiping."""
+    if os.path.isfile(drive_path):
+        return  # an image file has nothing mounted from it
+    progress_callback(f"Attempting to unmount {drive_path}...", 0)
+    device = drive_inventory.get_device(drive_path)
+    # The device itself, then any partitions (e.g., /dev/sda1, /dev/sda2, etc.)
+    for path in [drive_path] + (device.partitions if device else []):
+        subprocess.run(['umount', path], stderr=subprocess.DEVNULL)
+
+def _get_drive_size(drive_path):
+    """Returns (size_in_bytes, None) or (None, error_message)."""
+    device = drive_inventory.get_device(drive_path)
+    if device is not None:
+        return device.size, None
+    # Not a whole disk known to sysfs (image file, partition): seek to the end
     try:
-        # Unmount the device and all its partitions before wiping
-        progress_callback(f"Attempting to unmount {drive_path}...", 0)
-        # Unmount the device itself
-        subprocess.run(['umount', drive_path], stderr=subprocess.DEVNULL)
-        # Unmount any partitions (e.g., /dev/sda1, /dev/sda2, etc.)
-        result = subprocess.run(['lsblk', '-ln', '-o', 'NAME', drive_path], 
-                              capture_output=True, text=True)
-        if result.returncode == 0:
-            for line in result.stdout.strip().split('\n')[1:]:  # Skip the first line (device itself)
-                partition_path = f"/dev/{line.strip()}"
-                subprocess.run(['umount', partition_path], stderr=subprocess.DEVNULL)
-
-        # Get the correct size of the block device
+        with open(drive_path, 'rb') as f:
+            f.seek(0, 2)  # Seek to end
+            total_size = f.tell()
+            if total_size == 0:
+                return None, "Unable to determine device size. Device may be empty or inaccessible."
+            return total_size, None
+    except IOError as e:
+        return None, f"Unable to determine device size: {e}"
+
+def _overwrite_drive(drive_path, plan, progress_callback, data_source='auto', generator_threads=1,
+                     direct_io=False, producers=1, queue_depth=None, cancel_event=None, verify=None,
+                     sample_percent=verification.DEFAULT_SAMPLE_PERCENT, chunk_size=None, resume=False,
+                     checkpoint_interval=checkpoint.DEFAULT_INTERVAL, tolerate_bad_sectors=False,
+                     checkpoint_dir=None):
+    """
+    Runs the passes of `plan` (a wipe_plans.WipePlan) over the drive.
+    `data_source` feeds its random passes.
+    """
+    passes = len(plan)
+    checkpoint_dir = checkpoint_dir or checkpoint.default_directory()
+    if checkpoint_interval is not None and checkpoint_dir is None:
+        # Journaling to RAM would not survive the crash it is there for
+        print(f"⚠️  {checkpoint.NOT_CONFIGURED}", file=sys.stderr)
+        progress_callback(f"Warning: {checkpoint.NOT_CONFIGURED}", 0)
+        checkpoint_interval = None
+    try:
+        _unmount_drive(drive_path, progress_callback)
+        total_size, error = _get_drive_size(drive_path)
+        if total_size is None:
+            return False, error
+
+        # Chunk size and concurrency come from the device's queue limits when
+        # it is a known disk; image files get 1MB chunks written sequentially.
+        device = drive_inventory.get_device(drive_path)
+        tuning = device.tune() if device else {"chunk_size": 1024 * 1024, "queue_depth": 1}
+        chunk_size = chunk_size or tuning["chunk_size"]
+        if queue_depth is None:
+            queue_depth = tuning["queue_depth"]
+        pass_details = []
+
+        # With direct I/O the page cache is bypassed: nothing piles up as dirty
+        # pages, and a completed write means the data has reached the device.
+        fd, direct_used = block_io.open_for_write(drive_path, direct=direct_io)
+        ring = None
+        sink = telemetry.sink_from_env()
         try:
-            # Method 1: Use blockdev command (most reliable for block devices)
-            result = subprocess.run(['blockdev', '--getsize64', drive_path],
-                                  capture_output=True, text=True, check=True)
-            total_size = int(result.stdout.strip())
-        except (subprocess.CalledProcessError, ValueError):
-            # Fallback: Use seek method
-            try:
-                with open(drive_path, 'rb') as f:
-                    f.seek(0, 2)  # Seek to end
-                    total_size = f.tell()
-                    if total_size == 0:
-                        return False, "Unable to determine device size. Device may be empty or inaccessible."
-            except IOError as e:
-                return False, f"Unable to determine device size: {e}"
-
-        chunk_size = 1024 * 1024  # 1MB chunks
-
-        with open(drive_path, 'wb') as f:
-            for i in range(passes):
-                progress_callback(f"Starting Pass {i + 1}/{passes}...", 0)
-                f.seek(0)
-                written_bytes = 0
-                while written_bytes < total_size:
-                    # Calculate remaining bytes to avoid writing past the end
-                    remaining_bytes = total_size - written_bytes
-                    current_chunk_size = min(chunk_size, remaining_bytes)
-                    
-                    # Write with random data for the first pass for better security
-                    data = os.urandom(current_chunk_size) if i == 0 else bytes(current_chunk_size)
-                    try:
-                        bytes_written = f.write(data)
-                        if bytes_written is None:
-                            bytes_written = current_chunk_size  # Assume full write if None returned
-                        written_bytes += bytes_written
-                        
-                        # Handle partial writes
-                        if bytes_written < current_chunk_size:
-                            f.flush()  # Ensure data is written
-                            os.fsync(f.fileno())  # Force write to disk
-                        
-                        progress = min(100, int((written_bytes / total_size) * 100))
-                        if written_bytes % (chunk_size * 10) == 0: # Update progress every 10MB
-                            progress_callback(f"Pass {i+1}: {progress}%", progress)
-                    except IOError as e:
-                        return False, f"IO Error during write: {e}. Is drive in use or failing?"
-                
+            logical_block, physical_block = block_io.get_block_sizes(fd)
+            chunk_size = block_io.align_up(chunk_size, physical_block)
+            # The aligned part of the device goes through fd; a tail that is not a
+            # whole logical block is written separately with a buffered descriptor.
+            aligned_size = block_io.align_down(total_size, logical_block) if direct_used else total_size
+            # One map for the whole wipe: the bad-sector budget covers all passes.
+            bad_sectors = wipe_engine.BadSectorMap(logical_block) if tolerate_bad_sectors else None
+            journal = None
+            if checkpoint_interval is not None:
+                journal = checkpoint.CheckpointJournal.start(
+                    checkpoint.CheckpointStore(checkpoint_dir), _checkpoint_key(drive_path, total_size),
+                    drive_path, total_size,
+                    passes, data_source, chunk_size, interval=checkpoint_interval, resume=resume,
+                    plan=plan.describe())
+                # A resumed pass keeps its chunk grid so written ranges line up with the plan.
+                chunk_size = journal.record["chunkSize"]
+            first_pass = journal.record["pass"] if journal is not None else 1
+            # A few reusable buffers for the whole wipe: producers generate into
+            # them while the writer drains, and nothing is allocated per chunk.
+            ring = wipe_engine.BufferRing(max(wipe_engine.DEFAULT_RING_SIZE, producers + queue_depth + 1),
+                                          chunk_size, physical_block)
+
+            for i in range(first_pass - 1):
+                pass_details.append({"completedInEarlierSession": True})
+            pass_verification = None
+            for i in range(first_pass - 1, passes):
+                wipe_pass = plan.passes[i]
+                done_ranges = journal.done_ranges(i + 1) if journal is not None else []
+                if done_ranges:
+                    progress_callback(f"Resuming Pass {i + 1}/{passes} ({wipe_pass.label}) from the last checkpoint...", 0)
+                else:
+                    progress_callback(f"Starting Pass {i + 1}/{passes} ({wipe_pass.label})...", 0)
+                # Random passes are seeded once per pass; a resumed pass continues
+                # the keystream it was written with. Pattern passes build their
+                # buffer here, once, and every chunk of the pass is copied from it.
+                seed = journal.seed_for(i + 1) if journal is not None else None
+                source = wipe_pass.source(data_source, seed=seed, threads=generator_threads, chunk_size=chunk_size)
+                seed = getattr(source, "seed", None)
+                if journal is not None:
+                    # The seed must be durable before any data written with it.
+                    journal.mark(i + 1, done_ranges, seed, force=True)
+                profile = {}
+                pass_telemetry = telemetry.PassTelemetry(total_size, label=f"{drive_path} pass {i + 1}", sink=sink,
+                                                         start_bytes=sum(end - start for start, end in done_ranges))
+
+                def save_checkpoint(force=False, i=i, seed=seed):
+                    # Ranges are taken before the fsync, so all of them are on the medium afterwards.
+                    ranges = pipeline.coverage.ranges()
+                    os.fsync(fd)
+                    journal.mark(i + 1, ranges, seed, force=force)
+
+                def report(written_bytes, i=i, pass_telemetry=pass_telemetry):
+                    # Time-based: a sample every half second or so, and one at the end.
+                    sample = pass_telemetry.update(written_bytes)
+                    if sample is not None:
+                        progress = min(100, int(sample["percent"]))
+                        progress_callback(f"Pass {i+1}: {progress}% - {sample['averageMBps']:.0f} MB/s, "
+                                          f"ETA {telemetry.format_eta(sample['etaSeconds'])}", progress)
+                    if journal is not None and journal.due():
+                        save_checkpoint()
+
+                pipeline = wipe_engine.PassPipeline(
+                    fd, total_size, source, ring,
+                    aligned_size=aligned_size,
+                    write_tail=lambda view, offset: block_io.write_unaligned_tail(drive_path, view, offset),
+                    producers=producers,
+                    progress=report,
+                    queue_depth=queue_depth,
+                    cancel_event=cancel_event,
+                    telemetry=pass_telemetry,
+                    done_ranges=done_ranges,
+                    bad_sectors=bad_sectors,
+                )
+                try:
+                    with telemetry.profiled(f"{os.path.basename(drive_path)}-pass{i + 1}", profile):
+                        pipeline.run()
+                except wipe_engine.TooManyBadSectors as e:
+                    if journal is not None:
+                        try:
+                            save_checkpoint(force=True)
+                        except OSError:
+                            pass
+                    return (False, f"Too many bad sectors during pass {i + 1} ({e.strerror}); the drive is "
+                                   "failing and was not fully overwritten.",
+                            {"passes": pass_details, "badSectors": bad_sectors.describe()})
+                except IOError as e:
+                    if journal is not None:
+                        try:
+                            save_checkpoint(force=True)
+                        except OSError:
+                            pass  # the last periodic checkpoint stands
+                    return False, f"IO Error during write: {e}. Is drive in use or failing?"
+                except wipe_engine.WipeCancelled:
+                    if journal is not None:
+                        save_checkpoint(force=True)
+                        return False, (f"Wipe cancelled during pass {i + 1}; the drive is only partially "
+                                       "overwritten. It can be resumed from where it stopped.")
+                    return False, f"Wipe cancelled during pass {i + 1}; the drive is only partially overwritten."
+                except wipe_engine.CoverageError as e:
+                    return False, f"Coverage check failed: {e}"
+                finally:
+                    source.close()
+
                 # Ensure all data is written to disk at the end of each pass
-                f.flush()
-                os.fsync(f.fileno())
-        
-        progress_callback("Overwrite complete. Verifying...", 100)
-        # A final verification step could be added here in a real product
-        return True, "Overwrite successful."
+                os.fsync(fd)
+                pass_info = source.describe()
+                pass_info["type"] = wipe_pass.kind
+                pass_info["coverage"] = pipeline.coverage.check_complete()
+                pass_info["telemetry"] = pass_telemetry.summary(pass_info["generatorSeconds"])
+                if profile:
+                    pass_info["profile"] = profile
+                if done_ranges:
+                    pass_info["resumedRanges"] = [list(r) for r in done_ranges]
+                if bad_sectors is not None:
+                    pass_info["unwritableBytes"] = bad_sectors.bad_bytes()
+                pass_details.append(pass_info)
+                pass_verification = None
+                if wipe_pass.verify:
+                    mode = (verify or 'sample') if wipe_pass.verify is True else wipe_pass.verify
+                    progress_callback(f"Pass {i + 1} complete. Verifying ({mode})...", 0)
+                    pass_info["verification"] = pass_verification = _verify_overwrite(
+                        drive_path, total_size, source, mode, sample_percent, progress_callback, cancel_event,
+                        skip_ranges=bad_sectors.ranges() if bad_sectors is not None else None)
+                    if pass_verification.get("mismatchedRegions") or not pass_verification.get("complete", True):
+                        # Stop here: the plan requires this pass to be on the medium before the next
+                        break
+                if journal is not None and i + 1 < passes:
+                    journal.mark(i + 2, [], force=True)
+        finally:
+            if ring is not None:
+                ring.close()
+            os.close(fd)
+            if sink is not None:
+                sink.close()
+
+        io_details = {
+            "mode": "direct" if direct_used else "buffered",
+            "logicalBlockSize": logical_block,
+            "physicalBlockSize": physical_block,
+            "chunkSize": chunk_size,
+            "producers": producers,
+            "queueDepth": queue_depth,
+        }
+        # The plan's own standard (e.g. DoD 5220.22-M) stays inside "plan"
+        details = {"plan": plan.describe(), "passes": pass_details, "io": io_details}
+        if bad_sectors is not None:
+            # Partial coverage is explicit: these sectors still hold whatever they held before
+            details["badSectors"] = bad_sectors.describe()
+        if pass_verification is not None and (pass_verification.get("mismatchedRegions")
+                                               or not pass_verification.get("complete", True)):
+            if not pass_verification.get("complete", True):
+                return False, f"Verification of pass {len(pass_details)} cancelled.", details
+            return (False, f"Verification of pass {len(pass_details)} failed: "
+                           f"{pass_verification['mismatchedRegions']} of {pass_verification['regionsChecked']} "
+                           "regions do not match the written data.", details)
+        if journal is not None:
+            if journal.resumed:
+                details["resume"] = journal.summary()
+            journal.finish()
+        if pass_verification is not None:
+            # The plan already read back its final pass
+            details["verification"] = pass_verification
+        elif verify:
+            progress_callback(f"Overwrite complete. Verifying ({verify})...", 0)
+            details["verification"] = verify_result = _verify_overwrite(
+                drive_path, total_size, source, verify, sample_percent, progress_callback, cancel_event,
+                skip_ranges=bad_sectors.ranges() if bad_sectors is not None else None)
+            if verify_result.get("mismatchedRegions"):
+                return (False, f"Verification failed: {verify_result['mismatchedRegions']} of "
+                               f"{verify_result['regionsChecked']} regions do not match the written data.", details)
+            if not verify_result.get("complete", True):
+                return False, "Verification cancelled.", details
+        progress_callback("Overwrite complete.", 100)
+        if bad_sectors is not None and bad_sectors.bad_bytes():
+            bad = details["badSectors"]
+            return True, (f"Overwrite completed except for {sum(r['sectors'] for r in bad['badRanges'])} "
+                          f"unwritable sector(s) in {len(bad['badRanges'])} range(s), listed in the "
+                          "certificate."), details
+        return True, "Overwrite successful.", details
     except PermissionError:
         return False, "Permission denied. Please run with sudo."
     except Exception as e:
         return False, f"An unexpected error occurred: {e}"
 
-def _secure_erase_linux(drive_path, progress_callback):
+def _offload_drive(drive_path, progress_callback, cancel_event=None, verify=None,
+                   sample_percent=verification.DEFAULT_SAMPLE_PERCENT, **overwrite_options):
+    """
+    Zeroes a drive inside the device (NIST 800-88 Clear) with BLKZEROOUT,
+    BLKSECDISCARD/BLKDISCARD or, for image files, fallocate punch-hole.
+    Falls back to a streaming zero overwrite when no primitive is usable.
+    """
+    try:
+        _unmount_drive(drive_path, progress_callback)
+        total_size, error = _get_drive_size(drive_path)
+        if total_size is None:
+            return False, error
+
+        reported = [-1]
+
+        def report(done_bytes):
+            progress = min(100, int(done_bytes / total_size * 100))
+            if progress != reported[0]:
+                reported[0] = progress
+                progress_callback(f"Device-offloaded zeroing: {progress}%", progress)
+
+        import device_offload  # only needed by this method; keeps startup light
+        progress_callback("Issuing device-offloaded zeroing...", 0)
+        offload = device_offload.offload_wipe(drive_path, total_size, report, cancel_event)
+        if cancel_event is not None and cancel_event.is_set():
+            return False, "Wipe cancelled; the drive is only partially cleared."
+
+        primitive = offload["offloadMethod"]
+        if primitive is not None:
+            covered = offload["bytesCovered"]
+            if covered < total_size:
+                # A sub-sector tail the ioctls cannot address
+                block_io.write_unaligned_tail(drive_path, memoryview(bytes(total_size - covered)), covered)
+            details = {"offload": offload}
+            # Discards do not promise zeroes, so they are always checked.
+            check = verify or (None if offload["deterministicZeroes"] else 'sample')
+            if not check:
+                progress_callback("Device-offloaded zeroing complete.", 100)
+                return True, f"Device-offloaded wipe ({primitive}) successful.", details
+            progress_callback(f"Zeroing complete. Verifying ({check})...", 0)
+            details["verification"] = verify_result = _verify_overwrite(
+                drive_path, total_size, data_sources.ZeroSource(), check, sample_percent, progress_callback, cancel_event)
+            if not verify_result["mismatchedRegions"]:
+                progress_callback("Device-offloaded zeroing complete.", 100)
+                return True, f"Device-offloaded wipe ({primitive}) successful.", details
+            if offload["deterministicZeroes"]:
+                return (False, f"Verification failed after {primitive}: {verify_result['mismatchedRegions']} of "
+                               f"{verify_result['regionsChecked']} regions are not zero.", details)
+            offload["rejected"].append(f"{primitive}: device did not return zeroes afterwards")
+            offload["offloadMethod"] = None
+
+        progress_callback("Device offload not available; falling back to streaming overwrite...", 0)
+        result = _overwrite_drive(drive_path, wipe_plans.get_plan('zero-fill'), progress_callback,
+                                  data_source='zero', cancel_event=cancel_event,
+                                  verify=verify, sample_percent=sample_percent, **overwrite_options)
+        if len(result) > 2:
+            result[2]["offload"] = dict(offload, offloadMethod="streaming-overwrite")
+        return result
+    except PermissionError:
+        return False, "Permission denied. Please run with sudo."
+    except OSError as e:
+        return False, f"IO Error during device-offloaded zeroing: {e}. Is drive in use or failing?"
+
+def _verify_overwrite(drive_path, total_size, final_source, mode, sample_percent, progress_callback, cancel_event,
+                      skip_ranges=None):
+    """Reads the device back and checks it against the final pass's data."""
+    expected = final_source.replica()
+    if expected is None:
+        return {"mode": mode, "status": "skipped",
+                "reason": f"Data written by '{final_source.name}' cannot be regenerated for comparison."}
+    checked_total = total_size if mode == 'full' else max(1, total_size * sample_percent / 100)
+    reported = [-1]
+
+    def report(checked_bytes):
+        progress = min(100, int(checked_bytes / checked_total * 100))
+        if progress != reported[0]:
+            reported[0] = progress
+            progress_callback(f"Verifying ({mode}): {progress}%", progress)
+
+    try:
+        result = verification.verify_device(drive_path, total_size, expected, mode=mode, sample_percent=sample_percent,
+                                            progress=report, cancel_event=cancel_event, skip_ranges=skip_ranges)
+    finally:
+        expected.close()
+    result["status"] = "passed" if not result["mismatchedRegions"] else "failed"
+    return result
+
+def _secure_erase_linux(drive_path, progress_callback, cancel_event=None):
     """
     Issues hardware secure erase commands (NIST 800-88 Purge).
     """
     progress_callback("Attempting Hardware Secure Erase...", 0)
+    # Imported here rather than at the top: ata_erase pulls in asyncio, which
+    # is a noticeable share of the GUI's cold start and only needed for a purge.
+    import nvme_sanitize
+    import ata_erase
     try:
         if 'nvme' in drive_path:
-            return False, "NVMe Sanitize not implemented in this demo."
+            try:
+                details = nvme_sanitize.purge(drive_path, progress_callback, cancel_event=cancel_event)
+            except nvme_sanitize.NvmeError as e:
+                return False, f"NVMe purge failed: {e}"
+            except OSError as e:
+                return False, f"NVMe admin command could not be issued: {e}"
+            return True, "NVMe purge completed successfully.", details
         else:
-            progress_callback("Setting security password...", 25)
-            # Using 'p' as the password for simplicity. NULL can be problematic.
-            result = subprocess.run(['hdparm', '--user-master', 'u', '--security-set-pass', 'p', drive_path], 
-                                  check=True, capture_output=True, text=True)
-            
-            progress_callback("Issuing secure erase command...", 50)
-            # Note: This can take a very long time on real hardware.
-            result = subprocess.run(['hdparm', '--user-master', 'u', '--security-erase', 'p', drive_path], 
-                                  check=True, capture_output=True, text=True)
-
-        progress_callback("Hardware erase command sent.", 100)
-        return True, "Hardware secure erase command completed successfully."
+            try:
+                details = ata_erase.secure_erase(drive_path, progress_callback, cancel_event=cancel_event)
+            except ata_erase.AtaEraseError as e:
+                return False, f"Hardware command failed. {e}"
+            return True, "Hardware secure erase command completed successfully.", details
     except FileNotFoundError:
         return False, "Command not found (hdparm/nvme). Is 'hdparm' package loaded?"
-    except subprocess.CalledProcessError as e:
-        error_output = e.stderr if isinstance(e.stderr, str) else e.stderr.decode() if e.stderr else "No error details"
-        error_msg = f"Hardware command failed. Drive may not support it or is frozen.\n\nSTDERR:\n{error_output}"
-        return False, error_msg
     except PermissionError:
-        return False, "Permission denied. Please run with sudo."
\ No newline at end of file
+        return False, "Permission denied. Please run with sudo."
+
+
+# ----------------------------------------------------------------------
+# Concurrent multi-drive scheduling
+# ----------------------------------------------------------------------
+
+# Concurrent wipes allowed behind one host controller (HBA, SATA/USB host, ...)
+DEFAULT_WIPES_PER_CONTROLLER = 4
+
+def host_controller(drive_path, sys_root='/sys'):
+    """
+    Returns a key identifying the host controller a drive hangs off, taken
+    from its sysfs topology: the PCI function nearest to the block device
+    (the HBA, AHCI or USB host controller; every NVMe drive is its own).
+    """
+    name = os.path.basename(os.path.realpath(drive_path))
+    return drive_inventory.controller_key(name, os.path.realpath(os.path.join(sys_root, 'class', 'block', name)))
+
+
+class WipeJob:
+    """One drive in a WipeScheduler batch."""
+
+    def __init__(self, drive_info, method, options, controller):
+        self.drive_info = drive_info
+        self.path = drive_info['path']
+        self.method = method
+        self.options = options
+        self.controller = controller
+        self.status = 'queued'  # queued -> running -> done | failed | cancelled
+        self.progress = 0
+        self.message = 'Queued'
+        self.result = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed', 'cancelled')
+
+    def cancel(self):
+        self.cancel_event.set()
+
+
+class WipeScheduler:
+    """
+    Runs a batch of wipes concurrently, at most `per_controller` at a time
+    behind any one host controller so shared HBAs are not oversubscribed.
+
+    `on_progress(job)` is called from worker threads whenever a job reports
+    progress; `on_complete(job)` when it finishes. Both must be thread-safe;
+    they run without the scheduler's lock held, so they may call back into it.
+    """
+
+    def __init__(self, per_controller=DEFAULT_WIPES_PER_CONTROLLER, max_workers=None,
+                 on_progress=None, on_complete=None, sys_root='/sys'):
+        self.per_controller = max(1, per_controller)
+        self.max_workers = max_workers
+        self.on_progress = on_progress
+        self.on_complete = on_complete
+        self.sys_root = sys_root
+        self.jobs = []
+        self._lock = threading.Condition()
+
+    def submit(self, drive_info, method, **options):
+        """Queues a wipe of `drive_info` (a dict from list_physical_drives) and returns its job."""
+        job = WipeJob(drive_info, method, options, host_controller(drive_info['path'], self.sys_root))
+        with self._lock:
+            self.jobs.append(job)
+            cancelled = self._dispatch()
+        self._report(cancelled)
+        return job
+
+    def _dispatch(self):
+        """
+        Starts the queued jobs that fit under the limits. Caller holds
+        self._lock; the queued jobs found cancelled are returned so the caller
+        can report them once it has released the lock.
+        """
+        running = [j for j in self.jobs if j.status == 'running']
+        cancelled = []
+        for job in self.jobs:
+            if job.status != 'queued':
+                continue
+            if job.cancel_event.is_set():
+                job.status, job.message = 'cancelled', 'Cancelled before start'
+                job.result = (False, 'Wipe cancelled before it started.')
+                cancelled.append(job)
+                continue
+            if self.max_workers is not None and len(running) >= self.max_workers:
+                continue
+            if sum(1 for j in running if j.controller == job.controller) >= self.per_controller:
+                continue
+            job.status, job.message = 'running', 'Starting...'
+            running.append(job)
+            threading.Thread(target=self._run, args=(job,), daemon=True).start()
+        self._lock.notify_all()
+        return cancelled
+
+    def _run(self, job):
+        def progress(message, value):
+            job.message, job.progress = message, value
+            self._notify(self.on_progress, job)
+
+        try:
+            result = wipe_drive(job.path, job.method, progress, cancel_event=job.cancel_event, **job.options)
+        except Exception as e:
+            result = (False, f"An unexpected error occurred: {e}")
+        with self._lock:
+            job.result = result
+            if result[0]:
+                job.status, job.progress = 'done', 100
+            else:
+                job.status = 'cancelled' if job.cancel_event.is_set() else 'failed'
+            job.message = result[1]
+            cancelled = self._dispatch()
+        self._report([job] + cancelled)
+
+    @staticmethod
+    def _notify(callback, job):
+        if callback is not None:
+            callback(job)
+
+    def _report(self, jobs):
+        for job in jobs:
+            self._notify(self.on_complete, job)
+
+    def cancel(self, drive_path):
+        """Cancels the job for `drive_path` without affecting the others."""
+        with self._lock:
+            for job in self.jobs:
+                if job.path == drive_path and not job.finished:
+                    job.cancel()
+            cancelled = self._dispatch()
+        self._report(cancelled)
+
+    def cancel_all(self):
+        with self._lock:
+            for job in self.jobs:
+                job.cancel()
+            cancelled = self._dispatch()
+        self._report(cancelled)
+
+    def aggregate_progress(self):
+        """Mean progress over all jobs in the batch, 0-100."""
+        with self._lock:
+            if not self.jobs:
+                return 0
+            return sum(100 if j.finished else j.progress for j in self.jobs) / len(self.jobs)
+
+    def wait(self, timeout=None):
+        """Blocks until every submitted job has finished. Returns True if they all did."""
+        with self._lock:
+            return self._lock.wait_for(lambda: all(j.finished for j in self.jobs), timeout)